@@ -2,9 +2,15 @@ from django.contrib import admin
 
 from .models import Asset
 from .models import AssetPrice
+from .models import AssetBar
+from .models import AssetIndicator
+from .models import IngestionJob
 
 # Register your models here.
 
 admin.site.register(Asset)
 admin.site.register(AssetPrice)
+admin.site.register(AssetBar)
+admin.site.register(AssetIndicator)
+admin.site.register(IngestionJob)
 
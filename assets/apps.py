@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class AssetsConfig(AppConfig):
     name = 'assets'
     verbose_name = 'Assets'
+
+    def ready(self):
+        from . import asset_index
+        from . import db
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Asset
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MARKET_SYMBOL = '^GSPC'
+# seconds an unknown symbol is answered from memory before the index is
+# reloaded for it again
+MISSING_SYMBOL_TTL = 60
+
+
+class AssetIndex:
+    """
+    In-memory index of (symbol, market_symbol) to asset id, loaded with a
+    single query the first time it is used and reloaded after invalidate().
+    A symbol listed in several markets resolves to its DEFAULT_MARKET_SYMBOL
+    listing when no market is given
+    """
+
+    def __init__(self, missing_ttl=MISSING_SYMBOL_TTL):
+        self.asset_ids = None
+        self.market_symbols = None
+        self.missing_ttl = missing_ttl
+        self.missing = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        asset_ids = {}
+        market_symbols = {}
+        for asset_id, symbol, market_symbol in Asset.objects.values_list(
+                'id', 'symbol', 'market_symbol'):
+            asset_ids[(symbol, market_symbol)] = asset_id
+            market_symbols.setdefault(symbol, []).append(market_symbol)
+        with self.lock:
+            self.asset_ids = asset_ids
+            self.market_symbols = market_symbols
+            self.missing = {}
+        logger.debug(f'loaded {len(asset_ids)} assets in the asset index')
+
+    def invalidate(self):
+        with self.lock:
+            self.asset_ids = None
+            self.market_symbols = None
+            self.missing = {}
+
+    def lookup(self, symbol, market_symbol=None):
+        with self.lock:
+            if self.asset_ids is None:
+                return None
+            if market_symbol is None:
+                listings = self.market_symbols.get(symbol, [])
+                if len(listings) == 1:
+                    market_symbol = listings[0]
+                elif DEFAULT_MARKET_SYMBOL in listings:
+                    market_symbol = DEFAULT_MARKET_SYMBOL
+                elif listings:
+                    raise Asset.MultipleObjectsReturned(
+                        f'{symbol} is listed in {listings}, a market symbol is needed')
+            asset_id = self.asset_ids.get((symbol, market_symbol))
+            if asset_id is None:
+                return None
+            return asset_id, market_symbol
+
+    def get(self, symbol, market_symbol=None):
+        """
+        Return (asset id, market symbol) of the asset. Unknown symbols reload
+        the index once, in case the asset was added by another process, and
+        are then remembered as missing for missing_ttl seconds
+        """
+        found = self.lookup(symbol, market_symbol)
+        if found is None and not self.is_missing(symbol, market_symbol):
+            self.load()
+            found = self.lookup(symbol, market_symbol)
+            if found is None:
+                with self.lock:
+                    self.missing[(symbol, market_symbol)] = time.monotonic()
+        if found is None:
+            raise Asset.DoesNotExist(f'Asset {symbol} does not exist')
+        return found
+
+    def is_missing(self, symbol, market_symbol=None):
+        with self.lock:
+            missed_at = self.missing.get((symbol, market_symbol))
+        return missed_at is not None and time.monotonic() - missed_at < self.missing_ttl
+
+    def get_asset_id(self, symbol, market_symbol=None):
+        return self.get(symbol, market_symbol)[0]
+
+    def get_market_symbol(self, symbol):
+        return self.get(symbol)[1]
+
+    def get_symbols(self):
+        if self.asset_ids is None:
+            self.load()
+        with self.lock:
+            return sorted(self.market_symbols or {})
+
+    def get_symbols_by_id(self, symbols):
+        """
+        Return a dict of asset id to symbol for the listings the symbols
+        resolve to. Unknown symbols are left out
+        """
+        asset_ids = {}
+        for symbol in symbols:
+            try:
+                asset_ids[self.get_asset_id(symbol)] = symbol
+            except Asset.DoesNotExist:
+                logger.debug(f'Asset {symbol} does not exist')
+        return asset_ids
+
+
+asset_index = AssetIndex()
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+def invalidate_asset_index(sender, **kwargs):
+    asset_index.invalidate()
@@ -0,0 +1,139 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+
+from .asset_index import asset_index
+from .metrics import timed
+from .models import AssetBar, AssetPrice
+from .price_store import PRICE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BAR_TIMEFRAMES = [AssetBar.TIMEFRAME_WEEKLY, AssetBar.TIMEFRAME_MONTHLY]
+# pandas periods of each timeframe, weeks run from Monday to Sunday
+TIMEFRAME_PERIODS = {
+    AssetBar.TIMEFRAME_WEEKLY: 'W-SUN',
+    AssetBar.TIMEFRAME_MONTHLY: 'M',
+}
+# number of weeks covered by a bar of each timeframe
+TIMEFRAME_WEEKS = {
+    AssetBar.TIMEFRAME_WEEKLY: 1.0,
+    AssetBar.TIMEFRAME_MONTHLY: 52 / 12,
+}
+BAR_COLUMNS = ['period_start', 'datetime'] + PRICE_COLUMNS
+
+
+def get_timeframes():
+    return getattr(settings, 'BAR_TIMEFRAMES', DEFAULT_BAR_TIMEFRAMES)
+
+
+def get_period_starts(index, timeframe):
+    """
+    Start of the period of the timeframe containing each datetime, in the
+    time zone of the index
+    """
+    naive_index = index.tz_convert(None) if index.tz is not None else index
+    period_starts = naive_index.to_period(TIMEFRAME_PERIODS[timeframe]).start_time
+    return period_starts.tz_localize(index.tz) if index.tz is not None else period_starts
+
+
+def resample_prices(df_prices, timeframe):
+    """
+    Aggregate daily prices sorted by datetime into OHLCV bars of the
+    timeframe, indexed by the start of their period. The datetime of a bar
+    is that of its last daily price
+    """
+    if df_prices.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS[1:],
+                            index=pd.DatetimeIndex([], name='period_start', tz='UTC'))
+    period_starts = get_period_starts(df_prices.index, timeframe)
+    # positions of the first and last daily price of each period
+    firsts = np.flatnonzero(np.r_[True, period_starts[1:] != period_starts[:-1]])
+    lasts = np.r_[firsts[1:], len(df_prices)] - 1
+    values = {column: df_prices[column].to_numpy(dtype='float64') for column in PRICE_COLUMNS}
+    return pd.DataFrame({
+        'datetime': df_prices.index[lasts],
+        'high': np.maximum.reduceat(values['high'], firsts),
+        'low': np.minimum.reduceat(values['low'], firsts),
+        'open': values['open'][firsts],
+        'close': values['close'][lasts],
+        'volume': np.add.reduceat(values['volume'], firsts),
+        'adj_close': values['adj_close'][lasts],
+    }, index=period_starts[firsts].rename('period_start'))
+
+
+def read_daily_prices(asset_id, start_datetime=None):
+    prices = AssetPrice.objects.filter(asset_id=asset_id)
+    if start_datetime is not None:
+        prices = prices.filter(datetime__gte=start_datetime)
+    rows = prices.order_by('datetime').values_list('datetime', *PRICE_COLUMNS)
+    df_prices = pd.DataFrame.from_records(rows, columns=['datetime'] + PRICE_COLUMNS,
+                                          coerce_float=True)
+    df_prices.index = pd.DatetimeIndex(df_prices.pop('datetime'), name='datetime')
+    return df_prices
+
+
+def iter_asset_bars(asset_id, timeframe, df_bars):
+    for period_start, row in zip(df_bars.index, df_bars.itertuples(index=False)):
+        yield AssetBar(asset_id=asset_id, timeframe=timeframe,
+                       period_start=period_start.to_pydatetime(),
+                       datetime=row.datetime.to_pydatetime(), high=row.high, low=row.low,
+                       open=row.open, close=row.close, volume=row.volume,
+                       adj_close=row.adj_close)
+
+
+@timed('bars_update')
+def update_bars(asset_id, start_datetime=None, timeframes=None):
+    """
+    Rebuild the bars of the asset from the stored daily prices, from the
+    period containing start_datetime on, or all of them without it. Only
+    the daily prices of those periods are read, so appending a day of
+    prices rewrites the last bar of each timeframe. Returns the number of
+    bars written
+    """
+    if timeframes is None:
+        timeframes = get_timeframes()
+    if not timeframes:
+        return 0
+    period_starts = {timeframe: None for timeframe in timeframes}
+    if start_datetime is not None:
+        start_index = pd.DatetimeIndex([start_datetime])
+        period_starts = {timeframe: get_period_starts(start_index, timeframe)[0]
+                         for timeframe in timeframes}
+    first_period_start = None
+    if start_datetime is not None:
+        first_period_start = min(period_starts.values()).to_pydatetime()
+    df_prices = read_daily_prices(asset_id, first_period_start)
+
+    num_bars = 0
+    for timeframe, period_start in period_starts.items():
+        bars = AssetBar.objects.filter(asset_id=asset_id, timeframe=timeframe)
+        df_timeframe_prices = df_prices
+        if period_start is not None:
+            bars = bars.filter(period_start__gte=period_start.to_pydatetime())
+            df_timeframe_prices = df_prices[df_prices.index >= period_start]
+        bars.delete()
+        df_bars = resample_prices(df_timeframe_prices, timeframe)
+        AssetBar.objects.bulk_create(iter_asset_bars(asset_id, timeframe, df_bars))
+        num_bars += len(df_bars)
+    return num_bars
+
+
+@timed('db_bars')
+def get_bars(ticker, timeframe, start_datetime=None):
+    """
+    Read the stored bars of the ticker as a float64 frame indexed by the
+    datetime of their last daily price, with the start of their period in
+    the period_start column
+    """
+    bars = AssetBar.objects.filter(asset_id=asset_index.get_asset_id(ticker), timeframe=timeframe)
+    if start_datetime is not None:
+        bars = bars.filter(datetime__gte=start_datetime)
+    rows = bars.order_by('period_start').values_list(*BAR_COLUMNS)
+    df_bars = pd.DataFrame.from_records(rows, columns=BAR_COLUMNS, coerce_float=True)
+    df_bars.index = pd.DatetimeIndex(df_bars.pop('datetime'), name='datetime')
+    df_bars['period_start'] = pd.to_datetime(df_bars['period_start'], utc=True)
+    return df_bars
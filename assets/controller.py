@@ -1,12 +1,25 @@
 import logging
 import datetime
+from itertools import islice
+import numpy as np
 import pandas as pd
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery
 from django_pandas.io import read_frame
 
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 
 from .models import Asset, AssetPrice
+from . import bars
 from . import data_collection as dc
+from . import price_store
+from . import signals
+from .asset_index import asset_index
+from .frame_cache import price_frame_cache
+from .index_registry import index_series_registry
+from .metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -19,19 +32,61 @@ COL_MAPPING_YAHOO_DATABASE = {
     'Adj Close': 'adj_close',
 }
 
+PRICE_COLUMNS = price_store.PRICE_COLUMNS
+PRICE_BATCH_SIZE = getattr(settings, 'PRICE_BATCH_SIZE', 1000)
+ASSET_METADATA_FIELDS = ['security_name', 'gics_industry', 'gics_sub_industry']
+
 def update_asset_data_for_sp500():
     df_sp500_metadata = dc.get_SP500_info()
     number_of_records = 0
     asset_list = get_asset_list(df_sp500_metadata)
     try:
         logger.debug(f'storing Asset list')
-        Asset.objects.bulk_create(asset_list)
-        number_of_records = len(asset_list)
+        counts = upsert_assets(asset_list)
+        logger.info(f'Asset list: {counts}')
+        number_of_records = counts['inserted'] + counts['updated']
     except Exception as e:
         logger.error(f"Error {e} saving asset list")
     return number_of_records
 
 
+def upsert_assets(asset_list, update_changed=True):
+    """
+    Insert the assets that are not stored yet and, if update_changed,
+    update the metadata of the stored ones that changed. Assets are matched
+    on (symbol, market_symbol). Returns inserted/updated/skipped counts
+    """
+    stored_assets = {(asset.symbol, asset.market_symbol): asset
+                     for asset in Asset.objects.all()}
+    new_assets = {}
+    changed_assets = {}
+    num_skipped = 0
+    for asset in asset_list:
+        key = (asset.symbol, asset.market_symbol)
+        stored_asset = stored_assets.get(key)
+        if stored_asset is None:
+            new_assets[key] = asset
+            continue
+        changed = any(getattr(stored_asset, field) != getattr(asset, field)
+                      for field in ASSET_METADATA_FIELDS)
+        if not (update_changed and changed):
+            num_skipped += 1
+            continue
+        for field in ASSET_METADATA_FIELDS:
+            setattr(stored_asset, field, getattr(asset, field))
+        changed_assets[key] = stored_asset
+
+    with transaction.atomic():
+        Asset.objects.bulk_create(list(new_assets.values()))
+        Asset.objects.bulk_update(list(changed_assets.values()), ASSET_METADATA_FIELDS)
+    asset_index.invalidate()
+    return {
+        'inserted': len(new_assets),
+        'updated': len(changed_assets),
+        'skipped': num_skipped,
+    }
+
+
 def get_asset_list(df_sp500_metadata):
     asset_list = []
     if df_sp500_metadata.empty:
@@ -50,14 +105,20 @@ def get_asset_list(df_sp500_metadata):
     return asset_list
 
     
+def get_sp500_ticker_list():
+    df_sp500_metadata = dc.get_SP500_info()
+    ticker_list = df_sp500_metadata['Symbol'].to_list()
+    ticker_list.sort()
+    # the index goes first so that indicators of the stocks can use its new prices
+    ticker_list.insert(0, dc.SP500_INDEX_TICKER)
+    return ticker_list
+
+
 def update_asset_price_data_for_sp500():
     number_of_tickers = 0
     num_price_points = 0
 
-    df_sp500_metadata = dc.get_SP500_info()
-    ticker_list = df_sp500_metadata['Symbol'].to_list()
-    ticker_list.append(dc.SP500_INDEX_TICKER)
-    ticker_list.sort()
+    ticker_list = get_sp500_ticker_list()
 
     for ticker in ticker_list:
         num_price_points += update_asset_price_for_sp500_ticker(ticker)
@@ -70,16 +131,200 @@ def update_asset_price_data_for_sp500():
 def update_asset_price_for_sp500_ticker(ticker):
     num_price_points = 0
     df_ticker_data = get_data_for_ticker(ticker, dataset='new')
-    asset_price_list = get_asset_price_list(ticker, df_ticker_data)
     try:
-        logger.debug(f'storing Asset Prices for {ticker}')
-        AssetPrice.objects.bulk_create(asset_price_list)
-        num_price_points = len(asset_price_list)
+        num_price_points = save_asset_prices_for_ticker(ticker, df_ticker_data)
     except Exception as e:
         logger.error(f"{ticker}: Error {e} occured")
     return num_price_points
 
 
+def save_asset_prices_for_ticker(ticker, df_ticker_data, update_changed=None):
+    """
+    Store freshly downloaded prices of a ticker and return the number of
+    price points inserted or updated. Errors are raised to the caller
+    """
+    counts = upsert_asset_prices_for_ticker(ticker, df_ticker_data, update_changed)
+    return counts['inserted'] + counts['updated']
+
+
+@timed('price_upsert')
+def upsert_asset_prices_for_ticker(ticker, df_ticker_data, update_changed=None):
+    """
+    Insert the prices of the ticker at datetimes not stored yet and, if
+    update_changed (PRICE_UPSERT_UPDATE_CHANGED by default), update the
+    stored prices whose OHLCV changed. Prices stored unchanged are skipped,
+    so overlapping or repeated downloads are cheap to store again.
+    Returns inserted/updated/skipped counts
+    """
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    if df_ticker_data.empty:
+        return counts
+    if update_changed is None:
+        update_changed = getattr(settings, 'PRICE_UPSERT_UPDATE_CHANGED', False)
+    asset_id = asset_index.get_asset_id(ticker)
+    df_prices = get_price_frame(df_ticker_data)
+    df_prices = df_prices[~df_prices.index.duplicated(keep='last')]
+
+    df_stored = get_stored_prices(asset_id, df_prices.index.min(), df_prices.index.max())
+    is_new = ~df_prices.index.isin(df_stored.index)
+    df_new = df_prices[is_new]
+    df_overlap = df_prices[~is_new]
+    df_changed = df_overlap.iloc[0:0]
+    if update_changed and not df_overlap.empty:
+        stored_values = df_stored.loc[df_overlap.index, PRICE_COLUMNS].to_numpy(dtype='float64')
+        unchanged = np.isclose(df_overlap.to_numpy(), stored_values,
+                               rtol=1e-9, atol=0, equal_nan=True).all(axis=1)
+        df_changed = df_overlap[~unchanged]
+
+    df_written = pd.concat([df_new, df_changed]).sort_index()
+    logger.debug(f'storing Asset Prices for {ticker}')
+    with transaction.atomic():
+        counts['inserted'] = bulk_create_in_chunks(AssetPrice, iter_asset_prices(asset_id, df_new))
+        changed_prices = iter_asset_prices(asset_id, df_changed,
+                                           df_stored.loc[df_changed.index, 'id'].tolist())
+        counts['updated'] = bulk_update_in_chunks(AssetPrice, changed_prices, PRICE_COLUMNS)
+        if counts['updated']:
+            Asset.objects.filter(pk=asset_id).update(prices_revised_at=timezone.now())
+        if not df_written.empty:
+            bars.update_bars(asset_id, df_written.index.min())
+    counts['skipped'] = len(df_overlap) - len(df_changed)
+    logger.debug(f'{ticker}: {counts}')
+
+    if df_written.empty:
+        return counts
+    if price_store.is_enabled():
+        price_store.append_prices(ticker, df_written)
+    price_frame_cache.extend(ticker, df_written)
+    index_series_registry.refresh(ticker)
+    signals.asset_prices_saved.send(sender=AssetPrice, ticker=ticker, df_prices=df_written,
+                                    revised=not df_changed.empty)
+    return counts
+
+
+@timed('db_stored_prices')
+def get_stored_prices(asset_id, start_datetime, end_datetime):
+    """
+    Return the ids and prices stored for the asset between the two datetimes
+    as a float64 frame indexed by datetime
+    """
+    rows = (AssetPrice.objects
+            .filter(asset_id=asset_id, datetime__gte=start_datetime, datetime__lte=end_datetime)
+            .values_list('datetime', 'id', *PRICE_COLUMNS))
+    df_stored = pd.DataFrame.from_records(rows, columns=['datetime', 'id'] + PRICE_COLUMNS,
+                                          coerce_float=True)
+    df_stored.index = pd.DatetimeIndex(df_stored.pop('datetime'), name='datetime')
+    return df_stored
+
+
+@timed('db_bulk_create')
+def bulk_create_in_chunks(model, objs, batch_size=PRICE_BATCH_SIZE):
+    """
+    Consume an iterable of model instances and insert them in chunks of
+    batch_size so that only one chunk is held in memory at a time
+    """
+    objs = iter(objs)
+    num_created = 0
+    while True:
+        chunk = list(islice(objs, batch_size))
+        if not chunk:
+            break
+        model.objects.bulk_create(chunk, batch_size=batch_size)
+        num_created += len(chunk)
+    return num_created
+
+
+@timed('db_bulk_update')
+def bulk_update_in_chunks(model, objs, fields, batch_size=PRICE_BATCH_SIZE):
+    objs = iter(objs)
+    num_updated = 0
+    while True:
+        chunk = list(islice(objs, batch_size))
+        if not chunk:
+            break
+        model.objects.bulk_update(chunk, fields, batch_size=batch_size)
+        num_updated += len(chunk)
+    return num_updated
+
+
+def get_last_price_datetimes():
+    """
+    Return a dict of ticker symbol to the datetime of its latest stored price
+    using a single query. The latest bar of each asset is a backwards seek
+    on the (asset, datetime) index instead of a scan of all the prices
+    """
+    latest_prices = (AssetPrice.objects
+                     .filter(asset_id=OuterRef('pk'))
+                     .order_by('-datetime')
+                     .values('datetime')[:1])
+    last_prices = (Asset.objects
+                   .annotate(last_datetime=Subquery(latest_prices))
+                   .values_list('symbol', 'last_datetime'))
+    last_price_datetimes = {}
+    for symbol, last_datetime in last_prices:
+        if last_datetime is None:
+            continue
+        if symbol not in last_price_datetimes or last_price_datetimes[symbol] < last_datetime:
+            last_price_datetimes[symbol] = last_datetime
+    return last_price_datetimes
+
+
+def get_last_price_datetime(ticker):
+    try:
+        asset_id = asset_index.get_asset_id(ticker)
+    except ObjectDoesNotExist:
+        return None
+    last_prices = (AssetPrice.objects
+                   .filter(asset_id=asset_id)
+                   .aggregate(last_datetime=Max('datetime')))
+    return last_prices['last_datetime']
+
+
+def get_price_version(ticker):
+    """
+    Return the datetime of the latest stored price of the ticker and the
+    time its stored prices were last revised, using a single query
+    """
+    try:
+        asset_id = asset_index.get_asset_id(ticker)
+    except ObjectDoesNotExist:
+        return None, None
+    version = (AssetPrice.objects
+               .filter(asset_id=asset_id)
+               .order_by('-datetime')
+               .values_list('datetime', 'asset__prices_revised_at')
+               .first())
+    return version or (None, None)
+
+
+def get_last_prices_revised_at():
+    """
+    Return the time the stored prices of any asset were last revised
+    """
+    return Asset.objects.aggregate(revised_at=Max('prices_revised_at'))['revised_at']
+
+
+def get_prices_revised_at(tickers):
+    """
+    Return a dict of ticker symbol to the time its stored prices were last
+    revised, leaving out unknown tickers and tickers never revised
+    """
+    symbols_by_id = asset_index.get_symbols_by_id(tickers)
+    revised_at = (Asset.objects
+                  .filter(pk__in=list(symbols_by_id), prices_revised_at__isnull=False)
+                  .values_list('pk', 'prices_revised_at'))
+    return {symbols_by_id[asset_id]: revised for asset_id, revised in revised_at}
+
+
+def get_fetch_dates_for_ticker(last_datetime=None):
+    """
+    Get the start and end dates of the data still to be fetched for a ticker
+    given the datetime of its latest stored price
+    """
+    if last_datetime is None:
+        return dc.get_start_and_end_dates()
+    return dc.get_start_and_end_dates(last_datetime + datetime.timedelta(days=1))
+
+
 def get_data_for_ticker(ticker, dataset='all'):
     logger.debug(f'retrieving EXISTING for {ticker} from DB')
     df_prev_data = get_existing_data_for_ticker(ticker)
@@ -104,13 +349,49 @@ def get_data_for_ticker(ticker, dataset='all'):
 
 
 def get_existing_data_for_ticker(ticker):
+    """
+    Return the stored prices of a ticker, served from the in-process frame
+    cache as long as no newer bar has been stored and no stored bar has been
+    revised since it was cached
+    """
+    last_bar, revised_at = get_price_version(ticker)
+    df_result = price_frame_cache.get(ticker, last_bar, revised_at)
+    if df_result is not None:
+        return df_result
+    df_result = load_existing_data_for_ticker(ticker, last_bar)
+    if not df_result.empty:
+        price_frame_cache.put(ticker, df_result, last_bar, revised_at)
+    return df_result
+
+
+def load_existing_data_for_ticker(ticker, last_bar=None):
+    """
+    Read the prices of the ticker from the price store, or from the DB when
+    the store is disabled, misses the ticker or does not end at last_bar,
+    the latest bar in the DB. The stored file is then rewritten from the DB
+    """
+    if price_store.is_enabled():
+        df_result = price_store.read_prices(ticker)
+        if df_result is not None:
+            stored_last_bar = df_result.index.max() if not df_result.empty else None
+            if last_bar is None or stored_last_bar == last_bar:
+                return df_result
+            logger.warning(f'price store of {ticker} does not end at {last_bar}, reloading it')
+    df_result = get_existing_data_for_ticker_from_db(ticker)
+    if price_store.is_enabled() and not df_result.empty:
+        price_store.write_prices(ticker, df_result)
+    return df_result
+
+
+@timed('db_read_frame')
+def get_existing_data_for_ticker_from_db(ticker):
     df_result = pd.DataFrame()
     try:
-        ticker_asset = Asset.objects.get(symbol=ticker)
-        ticker_prices = AssetPrice.objects.filter(asset_id=ticker_asset.id)
+        ticker_prices = AssetPrice.objects.filter(asset_id=asset_index.get_asset_id(ticker))
         if ticker_prices:
-            df_result = read_frame(ticker_prices, index_col='datetime')
-            df_result.drop(['id', 'asset'], axis=1, inplace=True)
+            df_result = read_frame(ticker_prices, fieldnames=['datetime'] + PRICE_COLUMNS,
+                                   index_col='datetime')
+            df_result = df_result.astype('float64')
     except ObjectDoesNotExist:
         logger.error(f'Asset {ticker} does not Exist')
     except Exception as e:
@@ -123,12 +404,16 @@ def get_new_data_for_ticker(ticker, start_date, end_date):
     try:
         if start_date != end_date:
             df_new_data = dc.ping_yahoo_for_ticker(ticker, start_date, end_date)
-        if not(df_new_data.empty):
-            
-            df_new_data.rename(columns=COL_MAPPING_YAHOO_DATABASE, inplace=True)
-            df_new_data.index.name = 'datetime'
+        df_new_data = rename_yahoo_columns(df_new_data)
     except Exception as e:
-        logger(f'Error {e} occured when getting new date for {ticker}')
+        logger.error(f'Error {e} occured when getting new date for {ticker}')
+    return df_new_data
+
+
+def rename_yahoo_columns(df_new_data):
+    if not(df_new_data.empty):
+        df_new_data.rename(columns=COL_MAPPING_YAHOO_DATABASE, inplace=True)
+        df_new_data.index.name = 'datetime'
     return df_new_data
 
 
@@ -137,34 +422,176 @@ def get_asset_price_list(ticker, df_ticker_data):
     if df_ticker_data.empty:
         return asset_price_list
     try:
-        asset = Asset.objects.get(symbol=ticker)
-        for i in range(len(df_ticker_data.index)):
-            data = df_ticker_data.iloc[i].to_dict()
-            date = pd.to_datetime(df_ticker_data.index[i])
-            date = date.replace(tzinfo=datetime.timezone.utc)
-            asset_price = AssetPrice(
-                                     asset = asset,
-                                     datetime = date,
-                                     high = data['high'],
-                                     low = data['low'],
-                                     open = data['open'],
-                                     close = data['close'],
-                                     volume = data['volume'],
-                                     adj_close = data['adj_close'],
-                                     )
-            asset_price_list.append(asset_price)
+        asset_id = asset_index.get_asset_id(ticker)
+        asset_price_list = list(iter_asset_prices(asset_id, df_ticker_data))
     except ObjectDoesNotExist:
         logger.error(f'Asset not found. Skipping {ticker}')
     except Exception as e:
         logger.error(f'Error {e} processing {ticker}. Skipping')
     return asset_price_list
 
+
+def get_price_index(index):
+    """
+    Convert a price index to a UTC DatetimeIndex in one pass. Any timezone
+    already set is replaced, not converted
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(index), name='datetime')
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return dates.tz_localize(datetime.timezone.utc)
+
+
+def get_price_datetimes(index):
+    return get_price_index(index).to_pydatetime()
+
+
+def get_price_frame(df_ticker_data):
+    """
+    Shape new prices like the frames read back from the DB
+    """
+    df_prices = df_ticker_data[PRICE_COLUMNS].astype('float64')
+    df_prices.index = get_price_index(df_ticker_data.index)
+    return df_prices
+
+
+def iter_asset_prices(asset_id, df_ticker_data, ids=None):
+    """
+    Yield AssetPrice instances for the rows of the DataFrame. The columns
+    are converted once as whole arrays instead of row by row. Pass the ids
+    of stored rows to build instances for an update
+    """
+    dates = get_price_datetimes(df_ticker_data.index)
+    columns = [df_ticker_data[col].to_numpy(dtype='float64').tolist()
+               for col in PRICE_COLUMNS]
+    if ids is None:
+        ids = [None] * len(dates)
+    for price_id, date, high, low, open_, close, volume, adj_close in zip(ids, dates, *columns):
+        yield AssetPrice(
+                         id = price_id,
+                         asset_id = asset_id,
+                         datetime = date,
+                         high = high,
+                         low = low,
+                         open = open_,
+                         close = close,
+                         volume = volume,
+                         adj_close = adj_close,
+                         )
+
 def get_index_ticker(ticker):
     index_ticker = ''
     try:
-        asset = Asset.objects.get(symbol=ticker)
-        index_ticker = asset.market_symbol
+        index_ticker = asset_index.get_market_symbol(ticker)
     except Exception as e:
         logger.error(f'Exception {e} occured when retrieving index ticker for {ticker}')
     return index_ticker
  
+
+
+def get_market_symbols(tickers=None):
+    """
+    Return a dict of ticker symbol to the symbol of its index
+    """
+    assets = Asset.objects.all()
+    if tickers is not None:
+        assets = assets.filter(symbol__in=list(tickers))
+    return dict(assets.values_list('symbol', 'market_symbol'))
+
+
+@timed('db_price_panel')
+def get_price_panel(tickers=None, start_datetime=None, end_datetime=None,
+                    columns=None, layout='long'):
+    """
+    Load the prices of many tickers between two datetimes with a single
+    query, building float64 arrays straight from the cursor rows without
+    creating model instances.
+
+    The long layout is indexed by (symbol, datetime) with one column per
+    price column, the wide layout is indexed by datetime with (column,
+    symbol) columns
+    """
+    if columns is None:
+        columns = PRICE_COLUMNS
+    columns = list(columns)
+    unknown_columns = set(columns) - set(PRICE_COLUMNS)
+    if unknown_columns:
+        raise ValueError(f'Unknown price columns {sorted(unknown_columns)}')
+    if layout not in ('long', 'wide'):
+        raise ValueError(f'Unknown panel layout {layout}')
+    if tickers is None:
+        tickers = asset_index.get_symbols()
+    symbols = asset_index.get_symbols_by_id(tickers)
+
+    rows = []
+    if symbols:
+        rows = fetch_price_rows(list(symbols), start_datetime, end_datetime, columns)
+    if not rows:
+        return get_empty_price_panel(columns, layout)
+
+    asset_ids, dates, *values = zip(*rows)
+    index = pd.MultiIndex.from_arrays(
+        [[symbols[asset_id] for asset_id in asset_ids], pd.to_datetime(dates, utc=True)],
+        names=['symbol', 'datetime'])
+    df_result = pd.DataFrame({column: np.asarray(column_values, dtype='float64')
+                              for column, column_values in zip(columns, values)},
+                             index=index).sort_index()
+    if layout == 'long':
+        return df_result
+    df_result = df_result.unstack('symbol')
+    df_result.columns.names = [None, None]
+    return df_result
+
+
+def fetch_price_rows(asset_ids, start_datetime, end_datetime, columns):
+    """
+    Run the panel query on a raw cursor and return its (asset id, datetime,
+    *columns) rows
+    """
+    table = connection.ops.quote_name(AssetPrice._meta.db_table)
+    quote = connection.ops.quote_name
+    conditions = [f'{quote("asset_id")} IN ({", ".join(["%s"] * len(asset_ids))})']
+    params = list(asset_ids)
+    if start_datetime is not None:
+        conditions.append(f'{quote("datetime")} >= %s')
+        params.append(connection.ops.adapt_datetimefield_value(start_datetime))
+    if end_datetime is not None:
+        conditions.append(f'{quote("datetime")} <= %s')
+        params.append(connection.ops.adapt_datetimefield_value(end_datetime))
+    selected_datetime = quote('datetime')
+    if connection.vendor == 'sqlite':
+        # keep the datetimes as text, pandas parses them all at once much
+        # faster than the driver converts them one by one
+        selected_datetime = f'CAST({selected_datetime} AS TEXT)'
+    selected = ', '.join([quote('asset_id'), selected_datetime]
+                         + [quote(column) for column in columns])
+    query = f'SELECT {selected} FROM {table} WHERE {" AND ".join(conditions)}'
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def get_empty_price_panel(columns, layout):
+    if layout == 'long':
+        index = pd.MultiIndex.from_arrays(
+            [pd.Index([], dtype=object), pd.DatetimeIndex([], tz='UTC')],
+            names=['symbol', 'datetime'])
+        return pd.DataFrame({column: pd.Series(dtype='float64') for column in columns},
+                            index=index)
+    return pd.DataFrame(dtype='float64',
+                        index=pd.DatetimeIndex([], tz='UTC', name='datetime'),
+                        columns=pd.MultiIndex.from_arrays([[], []]))
+
+
+def get_price_matrix(tickers=None, column='adj_close', start_datetime=None, end_datetime=None):
+    """
+    Load one price column of many tickers with a single query and return it
+    as a wide date x ticker float64 DataFrame
+    """
+    df_panel = get_price_panel(tickers, start_datetime, end_datetime,
+                               columns=[column], layout='wide')
+    if df_panel.empty:
+        return pd.DataFrame(dtype='float64')
+    df_result = df_panel[column]
+    df_result.columns.name = None
+    return df_result
@@ -1,4 +1,8 @@
 import os
+import re
+import html
+import time
+import threading
 import requests
 import logging
 from datetime import datetime, date, timedelta, timezone
@@ -8,19 +12,33 @@ import pandas_datareader.data as web
 
 from django.conf import settings
 
+from .metrics import timed
+
 logger = logging.getLogger(__name__)
 
 SP500_WIKI_PAGE = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
 DATA_DIR = os.path.join(settings.BASE_DIR, "data", "stock_dfs")
 ANALYSIS_PERIOD = 5
 SP500_INDEX_TICKER = '^GSPC'
+SP500_INFO_TTL = 24 * 60 * 60
+# seconds to wait for the wiki to connect and for each read of its answer
+SP500_WIKI_TIMEOUT = 10
+
+TABLE_ROW_PATTERN = re.compile(r'<tr\b[^>]*>(.*?)</tr>', re.S | re.I)
+TABLE_CELL_PATTERN = re.compile(r'<(t[dh])\b[^>]*>(.*?)</\1>', re.S | re.I)
+HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+_sp500_info = {'df': None, 'loaded_at': 0.0}
+_sp500_info_lock = threading.Lock()
 
 
+@timed('wiki_fetch')
 def read_sp500_wiki_page(): 
     """
     Read the wiki page and return the content in HTML
     """
-    response  = requests.get(SP500_WIKI_PAGE)
+    timeout = getattr(settings, 'SP500_WIKI_TIMEOUT', SP500_WIKI_TIMEOUT)
+    response  = requests.get(SP500_WIKI_PAGE, timeout=timeout)
     if not (response.status_code >= 200 and response.status_code < 300):
         return pd.DataFrame()
     
@@ -43,18 +61,121 @@ def parse_sp500_wiki_page(html_page):
             data.append(data_row)
     return data, column_names
 
-    
-def get_SP500_info():
+
+@timed('wiki_parse')
+def parse_sp500_wiki_page_fast(html_page):
     """
-    Retrieve the html, parse it and return the data as a pandas DataFrame
+    Same result as parse_sp500_wiki_page, but only the constituents table is
+    cut out of the page and its cells are extracted with regular expressions
+    instead of building a document tree. Falls back to parse_sp500_wiki_page
+    when the table cannot be cut out cleanly
     """
-    html_page = read_sp500_wiki_page()
-    data, column_names = parse_sp500_wiki_page(html_page)
-    
-    sp_stock_dataframe = pd.DataFrame(data, columns=column_names)
+    if isinstance(html_page, bytes):
+        html_page = html_page.decode('utf-8')
+    marker = html_page.find('id="constituents"')
+    start = html_page.rfind('<table', 0, marker)
+    end = html_page.find('</table>', marker)
+    if marker == -1 or start == -1 or end == -1 or '<table' in html_page[start + 1:end]:
+        return parse_sp500_wiki_page(html_page)
+
+    data = []
+    column_names = []
+    for row in TABLE_ROW_PATTERN.findall(html_page[start:end]):
+        data_row = []
+        for tag, cell in TABLE_CELL_PATTERN.findall(row):
+            text = html.unescape(HTML_TAG_PATTERN.sub('', cell)).strip()
+            if tag.lower() == 'th':
+                column_names.append(text)
+            else:
+                data_row.append(text)
+        if data_row:
+            data.append(data_row)
+    return data, column_names
+
+
+def download_SP500_info():
+    """
+    Retrieve the html, parse it and return the data as a pandas DataFrame.
+    Returns an empty DataFrame when the page cannot be downloaded or parsed
+    """
+    try:
+        html_page = read_sp500_wiki_page()
+        if not isinstance(html_page, (bytes, str)):
+            return pd.DataFrame()
+        data, column_names = parse_sp500_wiki_page_fast(html_page)
+        sp_stock_dataframe = pd.DataFrame(data, columns=column_names)
+    except requests.RequestException as e:
+        logger.error(f'Error {e} downloading the S&P 500 constituents')
+        return pd.DataFrame()
+    except Exception as e:
+        logger.error(f'Error {e} parsing the S&P 500 constituents')
+        return pd.DataFrame()
+    if 'Symbol' not in sp_stock_dataframe.columns:
+        logger.error('The S&P 500 constituents table has no Symbol column')
+        return pd.DataFrame()
     return sp_stock_dataframe
 
 
+def get_sp500_info_filename():
+    return getattr(settings, 'SP500_INFO_FILE',
+                   os.path.join(settings.BASE_DIR, "data", "sp500_constituents.csv"))
+
+
+def read_sp500_info_file():
+    """
+    Return the constituents saved by the last download and the time they
+    were saved at, or (None, 0) when there is no saved list
+    """
+    filename = get_sp500_info_filename()
+    try:
+        df_sp500_info = pd.read_csv(filename, dtype=str, keep_default_na=False)
+        return df_sp500_info, os.path.getmtime(filename)
+    except FileNotFoundError:
+        return None, 0.0
+    except Exception as e:
+        logger.error(f'Error {e} reading {filename}')
+        return None, 0.0
+
+
+def write_sp500_info_file(df_sp500_info):
+    filename = get_sp500_info_filename()
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    df_sp500_info.to_csv(tmp_filename, index=False)
+    os.replace(tmp_filename, filename)
+
+
+def get_SP500_info(max_age=None):
+    """
+    Return the S&P 500 constituents as a pandas DataFrame. The list is
+    served from memory or from the file saved by the last download while it
+    is younger than max_age seconds (SP500_INFO_TTL by default), and
+    downloaded again otherwise. A stale list is used when the download fails
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'SP500_INFO_TTL', SP500_INFO_TTL)
+    with _sp500_info_lock:
+        df_sp500_info = _sp500_info['df']
+        loaded_at = _sp500_info['loaded_at']
+        if df_sp500_info is None or time.time() - loaded_at >= max_age:
+            df_sp500_info, loaded_at = read_sp500_info_file()
+
+        if df_sp500_info is None or time.time() - loaded_at >= max_age:
+            logger.debug('downloading S&P 500 constituents')
+            df_new_info = download_SP500_info()
+            if not df_new_info.empty:
+                write_sp500_info_file(df_new_info)
+                df_sp500_info, loaded_at = df_new_info, time.time()
+            elif df_sp500_info is None:
+                return df_new_info
+            else:
+                logger.error('Could not download the S&P 500 constituents, using the saved list')
+
+        _sp500_info['df'] = df_sp500_info
+        _sp500_info['loaded_at'] = loaded_at
+        return df_sp500_info.copy()
+
+
 def get_start_date(end_date=datetime.now(), num_years=ANALYSIS_PERIOD):
     """
     Get the start date of the analysis period based on an end date
@@ -121,15 +242,23 @@ def get_ticker_start_and_end_dates(df_data):
     return start_date, end_date
 
 
+@timed('yahoo_fetch')
+def fetch_yahoo_prices(ticker, start_date, end_date):
+    """
+    Retrieve data from yahoo, raising network and HTTP errors to the caller
+    """
+    logger.debug(f'retrieving for {ticker} from yahoo between {start_date} and {end_date}')
+    df = web.DataReader(ticker, 'yahoo', start_date, end_date)
+    logger.debug('Successfully retrieved data for {}'.format(ticker))
+    return df
+
+
 def ping_yahoo_for_ticker(ticker, start_date, end_date):
     """
     retrieve date from yahoo
     """
-    logger.debug(f'retrieving for {ticker} from yahoo between {start_date} and {end_date}')
     try:
-        df = web.DataReader(ticker, 'yahoo', start_date, end_date)
-        logger.debug('Successfully retrieved data for {}'.format(ticker))
-        return df
+        return fetch_yahoo_prices(ticker, start_date, end_date)
     except Exception as e:
         logging.error('Error while accessing Yahoo - {}'.format(str(e)))
         return pd.DataFrame()
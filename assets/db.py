@@ -0,0 +1,37 @@
+import logging
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 30000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def get_sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Apply the SQLite pragmas to every new connection. WAL lets the page
+    views read while an ingestion run writes, and the busy timeout makes
+    concurrent writers wait for the lock instead of failing
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in get_sqlite_pragmas().items():
+            try:
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+            except Exception as e:
+                logger.error(f'Error {e} setting PRAGMA {pragma} = {value}')
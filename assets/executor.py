@@ -0,0 +1,48 @@
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_max_workers():
+    return getattr(settings, 'ASYNC_EXECUTOR_MAX_WORKERS', None) or (os.cpu_count() or 1) + 4
+
+
+def get_executor():
+    """
+    Thread pool shared by the async views for DB reads, pandas and chart
+    rendering. Its size bounds the blocking work a worker process runs at
+    once, however many requests are waiting on it
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(get_max_workers(), thread_name_prefix='pystockbot-async')
+        return _executor
+
+
+def call_and_close_connections(function, *args, **kwargs):
+    try:
+        return function(*args, **kwargs)
+    finally:
+        # the pool threads are not request threads, release their DB
+        # connections like Django does at the end of a request
+        close_old_connections()
+
+
+async def run_in_executor(function, *args, **kwargs):
+    """
+    Await a blocking function run in the shared executor
+    """
+    call = functools.partial(call_and_close_connections, function, *args, **kwargs)
+    return await sync_to_async(call, thread_sensitive=False, executor=get_executor())()
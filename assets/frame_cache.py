@@ -0,0 +1,55 @@
+import logging
+
+import pandas as pd
+
+from django.conf import settings
+
+from .lru_cache import SizedLRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def get_frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache(SizedLRUCache):
+    """
+    Memory bounded LRU cache of per-ticker price frames. Each entry remembers
+    the last stored bar and the last revision of the stored prices it was
+    built from and is only served to callers asking for those same ones
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(max_bytes)
+
+    def get_size(self, value):
+        return get_frame_size(value[0])
+
+    def get(self, ticker, last_bar, revised_at=None):
+        value = super().get(ticker, lambda value: value[1:] == (last_bar, revised_at))
+        return None if value is None else value[0].copy()
+
+    def put(self, ticker, df, last_bar, revised_at=None):
+        super().put(ticker, (df.copy(), last_bar, revised_at))
+
+    def extend(self, ticker, df_new):
+        """
+        Append freshly stored bars to a cached frame. The entry is dropped
+        instead when the new bars do not strictly follow the cached ones
+        """
+        value = self.peek(ticker)
+        if value is None or df_new.empty:
+            return
+        df_cached, last_bar, revised_at = value
+        if last_bar is not None and df_new.index.min() <= last_bar:
+            self.invalidate(ticker)
+            return
+        df_extended = pd.concat([df_cached, df_new])
+        self.put(ticker, df_extended, df_extended.index.max(), revised_at)
+
+
+price_frame_cache = FrameCache(
+    getattr(settings, 'PRICE_FRAME_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 15 * 60
+MAX_ALIGNED_SERIES = 64
+
+
+def load_index_series(market_symbol):
+    from .controller import get_existing_data_for_ticker
+    df_index_prices = get_existing_data_for_ticker(market_symbol)
+    if df_index_prices.empty:
+        return pd.Series(dtype='float64', name='adj_close')
+    return df_index_prices['adj_close'].astype('float64')
+
+
+class IndexSeriesRegistry:
+    """
+    Process wide registry of benchmark index price series keyed by
+    Asset.market_symbol. Each index is loaded once and refreshed when its
+    prices are ingested, or after max_age seconds for ingestion running in
+    another process. Alignments to stock date indexes are kept as well, so
+    stocks sharing trading days share one aligned series
+    """
+
+    def __init__(self, loader=load_index_series, max_age=DEFAULT_MAX_AGE):
+        self.loader = loader
+        self.max_age = max_age
+        self.series = {}
+        self.aligned = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_series(self, market_symbol):
+        with self.lock:
+            entry = self.series.get(market_symbol)
+            if entry is not None and time.monotonic() - entry[1] < self.max_age:
+                return entry[0]
+        logger.debug(f'loading index series for {market_symbol}')
+        series = self.loader(market_symbol)
+        with self.lock:
+            self._drop(market_symbol)
+            self.series[market_symbol] = (series, time.monotonic())
+        return series
+
+    def get_aligned(self, market_symbol, index):
+        """
+        Return the index series reindexed to the given stock dates. The
+        result is shared between callers and must not be modified
+        """
+        series = self.get_series(market_symbol)
+        key = (market_symbol, len(index), hash(index.asi8.tobytes()))
+        with self.lock:
+            aligned = self.aligned.get(key)
+            if aligned is not None:
+                self.aligned.move_to_end(key)
+                return aligned
+        aligned = series.reindex(index)
+        with self.lock:
+            if self.series.get(market_symbol, (None,))[0] is series:
+                self.aligned[key] = aligned
+                while len(self.aligned) > MAX_ALIGNED_SERIES:
+                    self.aligned.popitem(last=False)
+        return aligned
+
+    def refresh(self, market_symbol=None):
+        with self.lock:
+            if market_symbol is None:
+                self.series.clear()
+                self.aligned.clear()
+            else:
+                self._drop(market_symbol)
+
+    def _drop(self, market_symbol):
+        self.series.pop(market_symbol, None)
+        for key in [key for key in self.aligned if key[0] == market_symbol]:
+            del self.aligned[key]
+
+
+index_series_registry = IndexSeriesRegistry(
+    max_age=getattr(settings, 'INDEX_SERIES_MAX_AGE', DEFAULT_MAX_AGE))
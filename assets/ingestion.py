@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+
+from . import controller as co
+from . import data_collection as dc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SOURCE = 'yahoo'
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the number of requests per second made to a
+    quote source. Shared by all the worker threads fetching from it
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst,
+                                  self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+def get_rate_limiter(source):
+    """
+    Return the process wide rate limiter of a quote source, configured
+    through the INGESTION_RATE_LIMITS setting (requests per second)
+    """
+    with _rate_limiters_lock:
+        if source not in _rate_limiters:
+            rate_limits = getattr(settings, 'INGESTION_RATE_LIMITS', {})
+            _rate_limiters[source] = RateLimiter(rate_limits.get(source, 0))
+        return _rate_limiters[source]
+
+
+def fetch_new_data_for_ticker(ticker, start_date, end_date, fetch, rate_limiter):
+    """
+    Runs in a worker thread: only talks to the quote source, never to the DB
+    """
+    if start_date == end_date:
+        return None
+    rate_limiter.acquire()
+    df_new_data = fetch(ticker, start_date, end_date)
+    return co.rename_yahoo_columns(df_new_data)
+
+
+def iter_fetched_tickers(executor, ticker_list, last_price_datetimes, fetch,
+                         rate_limiter, max_in_flight):
+    """
+    Submit the fetches of the tickers to the executor, keeping at most
+    max_in_flight of them pending, and yield (ticker, future) as they complete
+    """
+    pending = {}
+    tickers = iter(ticker_list)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_in_flight:
+            ticker = next(tickers, None)
+            if ticker is None:
+                exhausted = True
+                break
+            start_date, end_date = co.get_fetch_dates_for_ticker(
+                last_price_datetimes.get(ticker))
+            future = executor.submit(fetch_new_data_for_ticker, ticker,
+                                     start_date, end_date, fetch, rate_limiter)
+            pending[future] = ticker
+        if not pending:
+            break
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
+def update_asset_price_data_concurrently(ticker_list=None, max_workers=None,
+                                         fetch=None, source=DEFAULT_SOURCE,
+                                         rate_limiter=None, progress=None):
+    """
+    Fetch the new prices of the tickers with a pool of worker threads and
+    store them from the calling thread as they arrive.
+
+    Returns the number of tickers, the number of price points stored and a
+    dict of ticker to error message for the tickers that failed.
+    `progress`, if given, is called as progress(ticker, num_price_points, error)
+    after each ticker has been written or has failed
+    """
+    if ticker_list is None:
+        ticker_list = co.get_sp500_ticker_list()
+    if max_workers is None:
+        max_workers = getattr(settings, 'INGESTION_MAX_WORKERS', DEFAULT_MAX_WORKERS)
+    if fetch is None:
+        # errors are raised so that they are reported per ticker
+        fetch = dc.fetch_yahoo_prices
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter(source)
+
+    number_of_tickers = 0
+    num_price_points = 0
+    failures = {}
+    last_price_datetimes = co.get_last_price_datetimes()
+
+    # indexes are stored before the stocks measured against them
+    market_symbols = set(co.get_market_symbols().values())
+    index_tickers = [ticker for ticker in ticker_list if ticker in market_symbols]
+    stock_tickers = [ticker for ticker in ticker_list if ticker not in market_symbols]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for ticker_batch in [index_tickers, stock_tickers]:
+            fetched_tickers = iter_fetched_tickers(
+                executor, ticker_batch, last_price_datetimes, fetch,
+                rate_limiter, 2 * max_workers)
+            for ticker, future in fetched_tickers:
+                number_of_tickers += 1
+                num_points = 0
+                error = None
+                try:
+                    df_new_data = future.result()
+                    if df_new_data is not None:
+                        num_points = co.save_asset_prices_for_ticker(ticker, df_new_data)
+                    num_price_points += num_points
+                    logger.debug(f'updated {num_points} price points for {ticker}')
+                except Exception as e:
+                    logger.error(f'{ticker}: Error {e} occured')
+                    error = str(e)
+                    failures[ticker] = error
+                if progress:
+                    progress(ticker, num_points, error)
+
+    return number_of_tickers, num_price_points, failures
@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IngestionJob
+from . import controller as co
+from . import ingestion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 5
+# a running job without a heartbeat for this long is taken as dead
+DEFAULT_JOB_LEASE_SECONDS = 15 * 60
+
+
+def get_job_lease():
+    return timedelta(seconds=getattr(settings, 'INGESTION_JOB_LEASE_SECONDS',
+                                     DEFAULT_JOB_LEASE_SECONDS))
+
+
+def fail_expired_jobs():
+    """
+    Fail the running jobs whose worker stopped sending heartbeats, e.g.
+    because it was killed, so that the kind can be queued again
+    """
+    now = timezone.now()
+    num_expired = (IngestionJob.objects
+                   .filter(status=IngestionJob.STATUS_RUNNING,
+                           heartbeat_at__lt=now - get_job_lease())
+                   .update(status=IngestionJob.STATUS_FAILED, finished_at=now,
+                           error='The worker stopped sending heartbeats'))
+    if num_expired:
+        logger.warning(f'failed {num_expired} expired ingestion jobs')
+    return num_expired
+
+
+def get_active_job(kind):
+    return (IngestionJob.objects
+            .filter(kind=kind,
+                    status__in=[IngestionJob.STATUS_QUEUED, IngestionJob.STATUS_RUNNING])
+            .first())
+
+
+def enqueue_job(kind):
+    """
+    Queue an ingestion job, reusing the queued or running job of the same
+    kind if there is one. The unique_active_ingestion_job constraint
+    settles concurrent calls, the losers get the job of the winner
+    """
+    fail_expired_jobs()
+    active_job = get_active_job(kind)
+    if active_job:
+        return active_job
+    try:
+        with transaction.atomic():
+            return IngestionJob.objects.create(kind=kind)
+    except IntegrityError:
+        return get_active_job(kind)
+
+
+def claim_next_job():
+    """
+    Mark the oldest queued job as running and return it. The conditional
+    update makes sure that only one worker gets each job
+    """
+    fail_expired_jobs()
+    for job in IngestionJob.objects.filter(status=IngestionJob.STATUS_QUEUED):
+        now = timezone.now()
+        claimed = (IngestionJob.objects
+                   .filter(pk=job.pk, status=IngestionJob.STATUS_QUEUED)
+                   .update(status=IngestionJob.STATUS_RUNNING, started_at=now,
+                           heartbeat_at=now))
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def record_ticker_progress(job, ticker, num_records, error):
+    job.processed_tickers += 1
+    job.num_records += num_records
+    job.last_ticker = ticker
+    job.ticker_results[ticker] = num_records
+    if error:
+        job.failures[ticker] = error
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['processed_tickers', 'num_records', 'last_ticker',
+                            'ticker_results', 'failures', 'heartbeat_at'])
+
+
+def run_prices_job(job):
+    ticker_list = co.get_sp500_ticker_list()
+    job.total_tickers = len(ticker_list)
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['total_tickers', 'heartbeat_at'])
+    ingestion.update_asset_price_data_concurrently(
+        ticker_list,
+        progress=lambda ticker, num_records, error: record_ticker_progress(
+            job, ticker, num_records, error))
+
+
+def run_metadata_job(job):
+    job.num_records = co.update_asset_data_for_sp500()
+    job.save(update_fields=['num_records'])
+
+
+JOB_RUNNERS = {
+    IngestionJob.KIND_PRICES: run_prices_job,
+    IngestionJob.KIND_METADATA: run_metadata_job,
+}
+
+
+def run_job(job):
+    logger.info(f'running {job}')
+    try:
+        JOB_RUNNERS[job.kind](job)
+        job.status = IngestionJob.STATUS_DONE
+    except Exception as e:
+        logger.error(f'Error {e} running {job}')
+        job.status = IngestionJob.STATUS_FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def run_worker(poll_interval=DEFAULT_POLL_INTERVAL, once=False):
+    """
+    Run queued jobs one after the other. With once=True the worker returns
+    when the queue is empty instead of polling for new jobs
+    """
+    num_jobs = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return num_jobs
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        num_jobs += 1
+
+
+def get_job_status(job):
+    elapsed = None
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+    throughput = {}
+    if elapsed:
+        throughput = {
+            'tickers_per_second': job.processed_tickers / elapsed,
+            'records_per_second': job.num_records / elapsed,
+        }
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'heartbeat_at': job.heartbeat_at,
+        'elapsed_seconds': elapsed,
+        'total_tickers': job.total_tickers,
+        'processed_tickers': job.processed_tickers,
+        'num_records': job.num_records,
+        'last_ticker': job.last_ticker,
+        'throughput': throughput,
+        'ticker_results': job.ticker_results,
+        'failures': job.failures,
+        'error': job.error,
+    }
@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class SizedLRUCache:
+    """
+    Thread safe LRU cache bounded by the total size in bytes of its values.
+    Subclasses define get_size for the values they hold
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_size(self, value):
+        raise NotImplementedError
+
+    def get(self, key, is_valid=None):
+        """
+        Return the cached value of the key, or None when it is not cached or
+        is_valid rejects it
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (is_valid is not None and not is_valid(entry[0])):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key):
+        """
+        Return the cached value of the key without counting a lookup
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key, value):
+        size = self.get_size(value)
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                evicted_key = next(iter(self.entries))
+                self._remove(evicted_key)
+                self.evictions += 1
+                logger.debug(f'evicted {evicted_key} from {self.__class__.__name__}')
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+                self.current_bytes = 0
+            else:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
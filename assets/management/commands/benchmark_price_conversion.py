@@ -0,0 +1,78 @@
+import datetime
+import time
+
+import pandas as pd
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from assets import controller as co
+from assets import synthetic
+from assets.models import Asset, AssetPrice
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+def get_asset_price_list_rowwise(asset, df_ticker_data):
+    """
+    The original row by row conversion, kept as the baseline
+    """
+    asset_price_list = []
+    for i in range(len(df_ticker_data.index)):
+        data = df_ticker_data.iloc[i].to_dict()
+        date = pd.to_datetime(df_ticker_data.index[i])
+        date = date.replace(tzinfo=datetime.timezone.utc)
+        asset_price = AssetPrice(
+                                 asset = asset,
+                                 datetime = date,
+                                 high = data['high'],
+                                 low = data['low'],
+                                 open = data['open'],
+                                 close = data['close'],
+                                 volume = data['volume'],
+                                 adj_close = data['adj_close'],
+                                 )
+        asset_price_list.append(asset_price)
+    return asset_price_list
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the row by row and the column-wise AssetPrice conversion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--write', action='store_true',
+                            help='also time the chunked DB insert (rolled back afterwards)')
+
+    def report(self, label, num_rows, elapsed):
+        self.stdout.write(f'{label:<28} {num_rows:>9} rows {elapsed:8.3f}s '
+                          f'{num_rows / elapsed:12.0f} rows/sec')
+
+    def handle(self, *args, **options):
+        num_rows = options['rows']
+        df_prices = synthetic.make_price_frame('2000-01-03', num_rows, max_volume=1e7)
+        asset = Asset(id=0, symbol='BENCH', security_name='Benchmark')
+
+        start = time.perf_counter()
+        get_asset_price_list_rowwise(asset, df_prices)
+        self.report('row by row conversion', num_rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        list(co.iter_asset_prices(asset.id, df_prices))
+        self.report('column-wise conversion', num_rows, time.perf_counter() - start)
+
+        if not options['write']:
+            return
+        try:
+            with transaction.atomic():
+                asset = Asset.objects.create(symbol='BENCH', market_symbol='BENCH',
+                                             security_name='Benchmark')
+                start = time.perf_counter()
+                co.bulk_create_in_chunks(AssetPrice, co.iter_asset_prices(asset.id, df_prices))
+                self.report('column-wise + chunked insert', num_rows,
+                            time.perf_counter() - start)
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
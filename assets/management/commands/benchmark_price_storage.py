@@ -0,0 +1,104 @@
+import decimal
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from django.core.management.base import BaseCommand
+
+from assets import controller as co
+from assets import synthetic
+
+PRICE_SCALE = 10 ** 4
+
+
+def to_decimal_text(values, decimal_places):
+    return [f'{value:.{decimal_places}f}' for value in values]
+
+
+def from_decimal_text(values):
+    context = decimal.Context(prec=20)
+    return np.array([float(context.create_decimal(value)) for value in values])
+
+
+# column type, value writer and value reader of each storage layout. The
+# decimal layout stores what DecimalField(15,10) / DecimalField(20,4) stored
+# and reads it back through Decimal like the ORM did
+STORAGE_LAYOUTS = {
+    'decimal': (
+        'decimal',
+        lambda column, values: to_decimal_text(values, 4 if column == 'volume' else 10),
+        from_decimal_text,
+    ),
+    'float': (
+        'real',
+        lambda column, values: values.tolist(),
+        lambda values: np.asarray(values, dtype='float64'),
+    ),
+    'scaled': (
+        'integer',
+        lambda column, values: np.rint(values * PRICE_SCALE).astype('int64').tolist(),
+        lambda values: np.asarray(values, dtype='float64') / PRICE_SCALE,
+    ),
+}
+
+
+def create_price_table(db_path, layout, num_tickers, df_prices):
+    column_type, write_values, _ = STORAGE_LAYOUTS[layout]
+    columns = ', '.join(f'{column} {column_type} NOT NULL' for column in co.PRICE_COLUMNS)
+    with sqlite3.connect(db_path) as db:
+        db.execute(f'CREATE TABLE price (asset_id integer NOT NULL, datetime datetime NOT NULL, '
+                   f'{columns}, UNIQUE (asset_id, datetime))')
+        dates = df_prices.index.strftime('%Y-%m-%d %H:%M:%S').tolist()
+        values = [write_values(column, df_prices[column].to_numpy()) for column in co.PRICE_COLUMNS]
+        placeholders = ', '.join(['?'] * (len(co.PRICE_COLUMNS) + 2))
+        for asset_id in range(num_tickers):
+            db.executemany(f'INSERT INTO price VALUES ({placeholders})',
+                           zip([asset_id] * len(dates), dates, *values))
+    with sqlite3.connect(db_path) as db:
+        db.execute('VACUUM')
+
+
+def read_price_table(db_path, layout):
+    _, _, read_values = STORAGE_LAYOUTS[layout]
+    with sqlite3.connect(db_path) as db:
+        start = time.perf_counter()
+        rows = db.execute(f'SELECT asset_id, datetime, {", ".join(co.PRICE_COLUMNS)} '
+                          f'FROM price').fetchall()
+        read_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    _, _, *values = zip(*rows)
+    df_result = pd.DataFrame({column: read_values(column_values)
+                              for column, column_values in zip(co.PRICE_COLUMNS, values)})
+    return read_elapsed, time.perf_counter() - start, df_result
+
+
+class Command(BaseCommand):
+    help = ('Compare DB size, read latency and float64 conversion cost of the decimal, '
+            'float and scaled integer AssetPrice layouts on a synthetic universe')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=500)
+        parser.add_argument('--years', type=int, default=5)
+
+    def handle(self, *args, **options):
+        num_tickers = options['tickers']
+        df_prices = synthetic.make_price_frame('2000-01-03', 252 * options['years'],
+                                               max_volume=1e7)
+        num_rows = num_tickers * len(df_prices)
+        self.stdout.write(f'{num_tickers} tickers x {len(df_prices)} bars = {num_rows} rows')
+        self.stdout.write(f'{"layout":<10} {"size MB":>9} {"read s":>8} {"convert s":>10} '
+                          f'{"max error":>10}')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for layout in STORAGE_LAYOUTS:
+                db_path = os.path.join(tmp_dir, f'{layout}.sqlite3')
+                create_price_table(db_path, layout, num_tickers, df_prices)
+                size = os.path.getsize(db_path) / 1024 ** 2
+                read_elapsed, convert_elapsed, df_result = read_price_table(db_path, layout)
+                expected = np.tile(df_prices[co.PRICE_COLUMNS].to_numpy(), (num_tickers, 1))
+                error = np.abs(df_result.to_numpy() - expected).max()
+                self.stdout.write(f'{layout:<10} {size:9.1f} {read_elapsed:8.3f} '
+                                  f'{convert_elapsed:10.3f} {error:10.2g}')
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+
+from assets import controller as co
+from assets import synthetic
+from assets.asset_index import asset_index
+from assets.db import get_sqlite_pragmas
+from assets.models import Asset
+
+BENCHMARK_PREFIX = 'BENCH'
+
+
+class ReaderStats:
+
+    def __init__(self):
+        self.reads = 0
+        self.lock_errors = 0
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def record(self, elapsed=None, locked=False):
+        with self.lock:
+            if locked:
+                self.lock_errors += 1
+            else:
+                self.reads += 1
+                self.latencies.append(elapsed)
+
+
+def run_writer(tickers, df_prices, chunk_size, stats):
+    """
+    Store the prices of each ticker in chunks, one transaction per chunk,
+    like an ingestion run catching up
+    """
+    try:
+        for ticker in tickers:
+            for start in range(0, len(df_prices), chunk_size):
+                try:
+                    co.upsert_asset_prices_for_ticker(ticker, df_prices.iloc[start:start + chunk_size])
+                    stats['chunks'] += 1
+                except OperationalError:
+                    stats['lock_errors'] += 1
+    finally:
+        connection.close()
+
+
+def run_reader(tickers, stop, stats):
+    try:
+        while not stop.is_set():
+            for ticker in tickers:
+                start = time.perf_counter()
+                try:
+                    co.get_last_price_datetimes()
+                    co.get_price_panel([ticker])
+                    stats.record(time.perf_counter() - start)
+                except OperationalError:
+                    stats.record(locked=True)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Run reader threads against the price tables while a writer stores '
+            'prices and report lock errors and read latencies')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=20)
+        parser.add_argument('--bars', type=int, default=1260)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument('--journal-mode', help='override SQLITE_PRAGMAS, e.g. DELETE')
+        parser.add_argument('--busy-timeout', type=int, help='override SQLITE_PRAGMAS, in ms')
+
+    def handle(self, *args, **options):
+        pragmas = dict(get_sqlite_pragmas())
+        if options['journal_mode']:
+            pragmas['journal_mode'] = options['journal_mode']
+        if options['busy_timeout'] is not None:
+            pragmas['busy_timeout'] = options['busy_timeout']
+        settings.SQLITE_PRAGMAS = pragmas
+        connection.close()
+
+        tickers = [f'{BENCHMARK_PREFIX}{i}' for i in range(options['tickers'])]
+        df_prices = synthetic.make_price_frame('2000-01-03', options['bars'], max_volume=1e7)
+        df_prices.index = df_prices.index.tz_localize('UTC')
+        Asset.objects.bulk_create([Asset(symbol=ticker, market_symbol=BENCHMARK_PREFIX,
+                                         security_name='Benchmark') for ticker in tickers])
+        asset_index.invalidate()
+        # readers keep re-reading a few tickers while the writer stores all of them
+        read_tickers = tickers[:max(1, len(tickers) // 4)]
+        writer_stats = {'chunks': 0, 'lock_errors': 0}
+        reader_stats = ReaderStats()
+        stop = threading.Event()
+        try:
+            readers = [threading.Thread(target=run_reader, args=(read_tickers, stop, reader_stats))
+                       for _ in range(options['readers'])]
+            writer = threading.Thread(target=run_writer,
+                                      args=(tickers, df_prices, options['chunk_size'], writer_stats))
+            start = time.perf_counter()
+            for thread in readers + [writer]:
+                thread.start()
+            writer.join()
+            elapsed = time.perf_counter() - start
+            stop.set()
+            for thread in readers:
+                thread.join()
+        finally:
+            Asset.objects.filter(symbol__in=tickers, market_symbol=BENCHMARK_PREFIX).delete()
+
+        with connection.cursor() as cursor:
+            journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        latencies = sorted(reader_stats.latencies) or [0.0]
+        self.stdout.write(f'journal mode {journal_mode}, {options["readers"]} readers, '
+                          f'{elapsed:.2f}s')
+        self.stdout.write(f'writer: {writer_stats["chunks"]} chunks committed, '
+                          f'{writer_stats["lock_errors"]} lock errors')
+        self.stdout.write(f'readers: {reader_stats.reads} reads, '
+                          f'{reader_stats.lock_errors} lock errors, '
+                          f'p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, '
+                          f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms')
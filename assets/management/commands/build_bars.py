@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from assets import bars
+from assets.asset_index import asset_index
+from assets.models import Asset
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly and monthly bars from the AssetPrice table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*',
+                            help='tickers to rebuild, all assets when omitted')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers']
+        if not tickers:
+            tickers = Asset.objects.values_list('symbol', flat=True).distinct()
+        num_tickers = 0
+        num_bars = 0
+        for ticker in tickers:
+            with transaction.atomic():
+                num_bars += bars.update_bars(asset_index.get_asset_id(ticker))
+            num_tickers += 1
+        self.stdout.write(f'Stored {num_bars} bars for {num_tickers} tickers')
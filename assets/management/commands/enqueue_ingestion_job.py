@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from assets import jobs
+from assets.models import IngestionJob
+
+
+class Command(BaseCommand):
+    help = 'Queue an ingestion job, e.g. from cron to refresh prices on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=[kind for kind, _ in IngestionJob.KIND_CHOICES])
+
+    def handle(self, *args, **options):
+        job = jobs.enqueue_job(options['kind'])
+        self.stdout.write(f'Queued {job}')
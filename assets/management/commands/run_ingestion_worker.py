@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from assets import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued ingestion jobs outside of the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='exit when the queue is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=jobs.DEFAULT_POLL_INTERVAL,
+                            help='seconds to wait between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        num_jobs = jobs.run_worker(options['poll_interval'], options['once'])
+        self.stdout.write(f'Ran {num_jobs} ingestion jobs')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from assets import controller as co
+from assets import price_store
+from assets.models import Asset
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the columnar price store from the AssetPrice table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*',
+                            help='tickers to rebuild, all assets when omitted')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers']
+        if not tickers:
+            tickers = Asset.objects.values_list('symbol', flat=True).distinct()
+        num_tickers = 0
+        num_price_points = 0
+        for ticker in tickers:
+            df_prices = co.get_existing_data_for_ticker_from_db(ticker)
+            if df_prices.empty:
+                price_store.delete_prices(ticker)
+                continue
+            num_price_points += price_store.write_prices(ticker, df_prices)
+            num_tickers += 1
+        self.stdout.write(f'Stored {num_price_points} price points for {num_tickers} tickers')
@@ -0,0 +1,216 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'pystockbot'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# stage timings of the request being served. A context variable rather than
+# a thread local, so that stages run in executor threads by async views are
+# added to their request
+request_stages = ContextVar('request_stages', default=None)
+
+
+class Histogram:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process wide histograms and counters keyed by metric name and label
+    values. Recording is skipped entirely while the registry is disabled
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_stage(self, stage, elapsed):
+        self.observe('stage_seconds', elapsed, stage=stage)
+        stages = request_stages.get()
+        if stages is not None:
+            with self.lock:
+                stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format
+        """
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        for name in sorted({name for (name, _), _ in histograms}):
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} histogram')
+            for (histogram_name, labels), histogram in histograms:
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    bucket_labels = format_labels(labels + (('le', bound),))
+                    lines.append(f'{METRIC_PREFIX}_{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{METRIC_PREFIX}_{name}_sum{format_labels(labels)} {histogram.sum}')
+                lines.append(f'{METRIC_PREFIX}_{name}_count{format_labels(labels)} {histogram.count}')
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name}_total counter')
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f'{METRIC_PREFIX}_{name}_total{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    values = []
+    for label, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        values.append(f'{label}="{value}"')
+    return '{' + ','.join(values) + '}'
+
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+registry = MetricsRegistry(enabled=is_enabled())
+
+
+@receiver(setting_changed)
+def update_metrics_enabled(setting, **kwargs):
+    if setting == 'METRICS_ENABLED':
+        registry.enabled = is_enabled()
+
+
+@contextmanager
+def timer(stage):
+    if not registry.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """
+    Decorator recording the run time of the function as a stage. Stages
+    nest, the time of a stage includes the stages it calls
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.observe_stage(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    Record the duration of each request and the time spent in each stage
+    while serving it, per view. The breakdown is also returned in a
+    Server-Timing header. Works in front of both sync and async views
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as a coroutine function for Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stages = {}
+        token = request_stages.set(stages)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stages.reset(token)
+        return self.record(request, response, elapsed, stages)
+
+    async def __acall__(self, request):
+        stages = {}
+        token = request_stages.set(stages)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stages.reset(token)
+        return self.record(request, response, elapsed, stages)
+
+    def record(self, request, response, elapsed, stages):
+        view = get_view_name(request)
+        registry.observe('request_seconds', elapsed, view=view)
+        registry.increment('requests', view=view, status=response.status_code)
+        for stage, stage_elapsed in stages.items():
+            registry.observe('view_stage_seconds', stage_elapsed, view=view, stage=stage)
+        response['Server-Timing'] = ', '.join(
+            [f'{stage};dur={stage_elapsed * 1000:.1f}' for stage, stage_elapsed in stages.items()]
+            + [f'total;dur={elapsed * 1000:.1f}'])
+        return response
+
+
+def get_view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'unresolved'
+    return resolver_match.view_name or resolver_match._func_path
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetIndicator',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime', models.DateTimeField(verbose_name='Date and Time')),
+                ('sma_10w', models.FloatField(blank=True, null=True, verbose_name='SMA 10 Week')),
+                ('sma_30w', models.FloatField(blank=True, null=True, verbose_name='SMA 30 Week')),
+                ('rsd', models.FloatField(blank=True, null=True, verbose_name='Dorsey Relative Strength')),
+                ('rsm', models.FloatField(blank=True, null=True, verbose_name='Mansfield Relative Strength')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indicators', to='assets.asset')),
+            ],
+            options={
+                'verbose_name': 'Asset Indicator',
+                'verbose_name_plural': 'Asset Indicators',
+                'unique_together': {('asset', 'datetime')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0002_assetindicator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('prices', 'S&P 500 Prices'), ('metadata', 'S&P 500 Metadata')], max_length=16, verbose_name='Kind')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16, verbose_name='Status')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('total_tickers', models.PositiveIntegerField(default=0, verbose_name='Total Tickers')),
+                ('processed_tickers', models.PositiveIntegerField(default=0, verbose_name='Processed Tickers')),
+                ('num_records', models.PositiveIntegerField(default=0, verbose_name='Number of Records')),
+                ('last_ticker', models.CharField(blank=True, max_length=10, verbose_name='Last Ticker')),
+                ('ticker_results', models.JSONField(blank=True, default=dict, verbose_name='Records per Ticker')),
+                ('failures', models.JSONField(blank=True, default=dict, verbose_name='Failures')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+            ],
+            options={
+                'verbose_name': 'Ingestion Job',
+                'verbose_name_plural': 'Ingestion Jobs',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
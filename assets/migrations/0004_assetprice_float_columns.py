@@ -0,0 +1,43 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0003_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assetprice',
+            name='adj_close',
+            field=models.FloatField(verbose_name='Adjusted Close'),
+        ),
+        migrations.AlterField(
+            model_name='assetprice',
+            name='close',
+            field=models.FloatField(verbose_name='Close'),
+        ),
+        migrations.AlterField(
+            model_name='assetprice',
+            name='high',
+            field=models.FloatField(verbose_name='High'),
+        ),
+        migrations.AlterField(
+            model_name='assetprice',
+            name='low',
+            field=models.FloatField(verbose_name='Low'),
+        ),
+        migrations.AlterField(
+            model_name='assetprice',
+            name='open',
+            field=models.FloatField(verbose_name='Open'),
+        ),
+        migrations.AlterField(
+            model_name='assetprice',
+            name='volume',
+            field=models.FloatField(verbose_name='Volume'),
+        ),
+    ]
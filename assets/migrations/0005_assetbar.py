@@ -0,0 +1,35 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0004_assetprice_float_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetBar',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timeframe', models.CharField(choices=[('W', 'Weekly'), ('M', 'Monthly')], max_length=1, verbose_name='Timeframe')),
+                ('period_start', models.DateTimeField(verbose_name='Period Start')),
+                ('datetime', models.DateTimeField(verbose_name='Date and Time of the Last Price')),
+                ('high', models.FloatField(verbose_name='High')),
+                ('low', models.FloatField(verbose_name='Low')),
+                ('open', models.FloatField(verbose_name='Open')),
+                ('close', models.FloatField(verbose_name='Close')),
+                ('volume', models.FloatField(verbose_name='Volume')),
+                ('adj_close', models.FloatField(verbose_name='Adjusted Close')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bars', to='assets.asset')),
+            ],
+            options={
+                'verbose_name': 'Asset Bar',
+                'verbose_name_plural': 'Asset Bars',
+                'unique_together': {('asset', 'timeframe', 'period_start')},
+            },
+        ),
+    ]
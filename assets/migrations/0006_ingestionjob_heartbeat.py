@@ -0,0 +1,39 @@
+# Generated by Django 3.1.5 on 2026-10-18 05:03
+
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    """
+    Keep the oldest queued or running job of each kind so that the
+    constraint can be created
+    """
+    IngestionJob = apps.get_model('assets', 'IngestionJob')
+    active_jobs = IngestionJob.objects.filter(status__in=['queued', 'running']).order_by('created_at')
+    seen_kinds = set()
+    for job in active_jobs:
+        if job.kind in seen_kinds:
+            job.status = 'failed'
+            job.error = 'Duplicate of an active job'
+            job.save(update_fields=['status', 'error'])
+        seen_kinds.add(job.kind)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0005_assetbar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last Heartbeat At'),
+        ),
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingestionjob',
+            constraint=models.UniqueConstraint(condition=models.Q(status__in=['queued', 'running']), fields=('kind',), name='unique_active_ingestion_job'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-18 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0006_ingestionjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='prices_revised_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Prices Revised At'),
+        ),
+    ]
@@ -9,6 +9,7 @@ class Asset(models.Model):
     security_name = models.CharField(_("Security Name"), max_length=64)
     gics_industry = models.CharField(_("GICS Industry"), max_length=64, blank=True, null=True)
     gics_sub_industry = models.CharField(_("GICS Sub-Industry"), max_length=64, blank=True, null=True)
+    prices_revised_at = models.DateTimeField(_("Prices Revised At"), blank=True, null=True)
 
     class Meta:
         verbose_name = _("Asset")
@@ -25,12 +26,12 @@ class Asset(models.Model):
 class AssetPrice(models.Model):
     asset = models.ForeignKey('Asset', related_name='asset', on_delete=models.CASCADE)
     datetime = models.DateTimeField(_("Date and Time"), auto_now=False, auto_now_add=False)
-    high = models.DecimalField(_("High"), max_digits=15, decimal_places=10)
-    low = models.DecimalField(_("Low"), max_digits=15, decimal_places=10)
-    open = models.DecimalField(_("Open"), max_digits=15, decimal_places=10)
-    close = models.DecimalField(_("Close"), max_digits=15, decimal_places=10)
-    volume = models.DecimalField(_("Volume"), max_digits=20, decimal_places=4)
-    adj_close = models.DecimalField(_("Adjusted Close"), max_digits=15, decimal_places=10)
+    high = models.FloatField(_("High"))
+    low = models.FloatField(_("Low"))
+    open = models.FloatField(_("Open"))
+    close = models.FloatField(_("Close"))
+    volume = models.FloatField(_("Volume"))
+    adj_close = models.FloatField(_("Adjusted Close"))
 
     class Meta:
         verbose_name = _("Asset Price")
@@ -42,4 +43,97 @@ class AssetPrice(models.Model):
 
     def get_absolute_url(self):
         return reverse("asset_price_detail", kwargs={"pk": self.pk})
-    
+
+
+class AssetBar(models.Model):
+    TIMEFRAME_WEEKLY = 'W'
+    TIMEFRAME_MONTHLY = 'M'
+    TIMEFRAME_CHOICES = [
+        (TIMEFRAME_WEEKLY, _("Weekly")),
+        (TIMEFRAME_MONTHLY, _("Monthly")),
+    ]
+
+    asset = models.ForeignKey('Asset', related_name='bars', on_delete=models.CASCADE)
+    timeframe = models.CharField(_("Timeframe"), max_length=1, choices=TIMEFRAME_CHOICES)
+    period_start = models.DateTimeField(_("Period Start"), auto_now=False, auto_now_add=False)
+    datetime = models.DateTimeField(_("Date and Time of the Last Price"), auto_now=False,
+                                    auto_now_add=False)
+    high = models.FloatField(_("High"))
+    low = models.FloatField(_("Low"))
+    open = models.FloatField(_("Open"))
+    close = models.FloatField(_("Close"))
+    volume = models.FloatField(_("Volume"))
+    adj_close = models.FloatField(_("Adjusted Close"))
+
+    class Meta:
+        verbose_name = _("Asset Bar")
+        verbose_name_plural = _("Asset Bars")
+        unique_together = ['asset', 'timeframe', 'period_start']
+
+    def __str__(self):
+        return f'{self.asset}: {self.get_timeframe_display()} {self.period_start}'
+
+
+class AssetIndicator(models.Model):
+    asset = models.ForeignKey('Asset', related_name='indicators', on_delete=models.CASCADE)
+    datetime = models.DateTimeField(_("Date and Time"), auto_now=False, auto_now_add=False)
+    sma_10w = models.FloatField(_("SMA 10 Week"), blank=True, null=True)
+    sma_30w = models.FloatField(_("SMA 30 Week"), blank=True, null=True)
+    rsd = models.FloatField(_("Dorsey Relative Strength"), blank=True, null=True)
+    rsm = models.FloatField(_("Mansfield Relative Strength"), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _("Asset Indicator")
+        verbose_name_plural = _("Asset Indicators")
+        unique_together = ['asset', 'datetime']
+
+    def __str__(self):
+        return f'{self.asset}: {self.datetime}'
+
+
+class IngestionJob(models.Model):
+    KIND_PRICES = 'prices'
+    KIND_METADATA = 'metadata'
+    KIND_CHOICES = [
+        (KIND_PRICES, _("S&P 500 Prices")),
+        (KIND_METADATA, _("S&P 500 Metadata")),
+    ]
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, _("Queued")),
+        (STATUS_RUNNING, _("Running")),
+        (STATUS_DONE, _("Done")),
+        (STATUS_FAILED, _("Failed")),
+    ]
+
+    kind = models.CharField(_("Kind"), max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(_("Status"), max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    started_at = models.DateTimeField(_("Started At"), blank=True, null=True)
+    heartbeat_at = models.DateTimeField(_("Last Heartbeat At"), blank=True, null=True)
+    finished_at = models.DateTimeField(_("Finished At"), blank=True, null=True)
+    total_tickers = models.PositiveIntegerField(_("Total Tickers"), default=0)
+    processed_tickers = models.PositiveIntegerField(_("Processed Tickers"), default=0)
+    num_records = models.PositiveIntegerField(_("Number of Records"), default=0)
+    last_ticker = models.CharField(_("Last Ticker"), max_length=10, blank=True)
+    ticker_results = models.JSONField(_("Records per Ticker"), default=dict, blank=True)
+    failures = models.JSONField(_("Failures"), default=dict, blank=True)
+    error = models.TextField(_("Error"), blank=True)
+
+    class Meta:
+        verbose_name = _("Ingestion Job")
+        verbose_name_plural = _("Ingestion Jobs")
+        ordering = ['created_at']
+        constraints = [
+            # a single queued or running job of each kind
+            models.UniqueConstraint(fields=['kind'],
+                                    condition=models.Q(status__in=['queued', 'running']),
+                                    name='unique_active_ingestion_job'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} job {self.pk}: {self.status}'
+
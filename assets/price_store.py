@@ -0,0 +1,120 @@
+import os
+import logging
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# serializes the full writes and the read-modify-write of appends of the
+# view and ingestion threads
+_write_lock = threading.Lock()
+
+PRICE_COLUMNS = ['high', 'low', 'open', 'close', 'volume', 'adj_close']
+PRICE_STORE_DTYPE = np.dtype([('datetime', '<i8')] +
+                             [(col, '<f8') for col in PRICE_COLUMNS])
+
+
+def is_enabled():
+    return getattr(settings, 'PRICE_STORE_ENABLED', False)
+
+
+def get_filename_for_ticker(ticker):
+    ticker = ticker.replace('.', '_')
+    return os.path.join(settings.PRICE_STORE_DIR, f'{ticker}.npy')
+
+
+def read_prices(ticker):
+    """
+    Memory map the stored prices of a ticker and return them as a DataFrame
+    shaped like the DB read. Returns None when the ticker is not stored
+    """
+    filename = get_filename_for_ticker(ticker)
+    try:
+        records = np.load(filename, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f'Error {e} reading {filename}')
+        return None
+    if records.dtype != PRICE_STORE_DTYPE:
+        logger.error(f'Unexpected layout in {filename}. Ignoring it')
+        return None
+
+    dates = pd.arrays.DatetimeArray(records['datetime'].view('datetime64[ns]'),
+                                    dtype=pd.DatetimeTZDtype(tz='UTC'))
+    index = pd.DatetimeIndex(dates, name='datetime')
+    return pd.DataFrame({col: records[col] for col in PRICE_COLUMNS}, index=index)
+
+
+def get_records(df_prices):
+    dates = pd.DatetimeIndex(pd.to_datetime(df_prices.index))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    records = np.empty(len(df_prices), dtype=PRICE_STORE_DTYPE)
+    records['datetime'] = dates.values.view('i8')
+    for col in PRICE_COLUMNS:
+        records[col] = df_prices[col].to_numpy(dtype='float64')
+    return records
+
+
+def write_records(ticker, records):
+    """
+    Replace the file of the ticker atomically so that readers never see a
+    partially written file. Each write goes to its own temporary file, so
+    concurrent writers of a ticker never replace each other's partial files
+    """
+    filename = get_filename_for_ticker(ticker)
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(filename),
+                                     suffix='.tmp', delete=False) as tmp_file:
+        try:
+            np.save(tmp_file, records)
+        except Exception:
+            tmp_file.close()
+            os.remove(tmp_file.name)
+            raise
+    os.replace(tmp_file.name, filename)
+
+
+def write_prices(ticker, df_prices):
+    """
+    Store the full price history of a ticker, replacing anything stored
+    """
+    records = get_records(df_prices)
+    records.sort(order='datetime')
+    with _write_lock:
+        write_records(ticker, records)
+    return len(records)
+
+
+def append_prices(ticker, df_new_prices):
+    """
+    Add new prices to the stored history of a ticker. Prices at datetimes
+    already stored replace the stored ones. Tickers that are not stored yet
+    are left alone: their full history is written on the next DB read
+    """
+    filename = get_filename_for_ticker(ticker)
+    new_records = get_records(df_new_prices)
+    with _write_lock:
+        try:
+            records = np.load(filename)
+        except FileNotFoundError:
+            return 0
+        records = records[~np.isin(records['datetime'], new_records['datetime'])]
+        records = np.concatenate([records, new_records])
+        records.sort(order='datetime')
+        write_records(ticker, records)
+    return len(records)
+
+
+def delete_prices(ticker):
+    try:
+        os.remove(get_filename_for_ticker(ticker))
+    except FileNotFoundError:
+        pass
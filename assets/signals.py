@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent once new prices of a ticker have been stored, with the keyword
+# arguments `ticker`, `df_prices` (the stored rows as a float64 frame) and
+# `revised` (True when prices stored before were updated)
+asset_prices_saved = Signal()
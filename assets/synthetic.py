@@ -0,0 +1,153 @@
+import html
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import data_collection as dc
+
+TRADING_DAYS_PER_YEAR = 252
+GICS_SECTORS = ['Industrials', 'Health Care', 'Information Technology', 'Financials',
+                'Energy', 'Utilities', 'Materials', 'Real Estate']
+
+
+def make_ticker_symbols(num_tickers):
+    return [f'SYN{i:04d}' for i in range(num_tickers)]
+
+
+def make_synthetic_prices(num_tickers, years, seed=0, end_date=None):
+    """
+    Generate seeded daily OHLCV frames, with the columns and index of the
+    frames returned by dc.fetch_yahoo_prices, for the S&P 500 index and
+    num_tickers stocks tracking it over the last `years` years of business
+    days. Returns a dict of ticker to frame
+    """
+    rng = np.random.default_rng(seed)
+    if end_date is None:
+        end_date = pd.Timestamp(datetime.utcnow().date()) - pd.tseries.offsets.BDay(1)
+    index = pd.bdate_range(end=end_date, periods=TRADING_DAYS_PER_YEAR * years, name='Date')
+    num_days = len(index)
+    market_returns = rng.normal(0.0003, 0.01, num_days)
+
+    frames = {dc.SP500_INDEX_TICKER: make_ohlcv_frame(index, 3000, market_returns, rng)}
+    for ticker in make_ticker_symbols(num_tickers):
+        beta = rng.uniform(0.5, 1.5)
+        returns = beta * market_returns + rng.normal(0, 0.015, num_days)
+        frames[ticker] = make_ohlcv_frame(index, rng.uniform(10, 500), returns, rng)
+    return frames
+
+
+def make_ohlcv_frame(index, start_price, returns, rng):
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = close * np.exp(rng.normal(0, 0.005, len(index)))
+    spread = np.abs(rng.normal(0, 0.01, len(index)))
+    return pd.DataFrame({
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Open': open_,
+        'Close': close,
+        'Volume': rng.integers(1e5, 1e7, len(index)).astype('float64'),
+        'Adj Close': close,
+    }, index=index)
+
+
+def make_price_frame(start='2020-01-01', periods=300, seed=0, max_volume=1e6):
+    """
+    Generate a seeded random walk of daily prices with the columns stored in
+    AssetPrice, indexed by datetime
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=periods, name='datetime')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'open': close,
+        'close': close,
+        'volume': rng.integers(1e5, max_volume, periods).astype('float64'),
+        'adj_close': close,
+    }, index=index)
+
+
+def make_yahoo_frame(start='2021-01-04', periods=3):
+    """
+    Generate a frame shaped like the ones of dc.fetch_yahoo_prices whose
+    prices rise by 1 every business day, for checks of exact values
+    """
+    index = pd.date_range(start, periods=periods, freq='B', name='Date')
+    return pd.DataFrame({
+        'High': [11.0 + i for i in range(periods)],
+        'Low': [9.0 + i for i in range(periods)],
+        'Open': [10.0 + i for i in range(periods)],
+        'Close': [10.5 + i for i in range(periods)],
+        'Volume': [1000.0 + i for i in range(periods)],
+        'Adj Close': [10.4 + i for i in range(periods)],
+    }, index=index)
+
+
+def make_sp500_wiki_page(tickers):
+    """
+    Render a page with a constituents table shaped like the one of the S&P
+    500 wikipedia page, listing the given tickers
+    """
+    rows = []
+    for i, ticker in enumerate(tickers):
+        cells = [ticker, f'{ticker} Inc.', 'reports', GICS_SECTORS[i % len(GICS_SECTORS)],
+                 'Synthetic', 'Nowhere', '2000-01-01', f'{i:010d}', '1900']
+        rows.append('<tr>' + ''.join(f'<td>{html.escape(cell)}</td>' for cell in cells) + '</tr>')
+    header = ''.join(f'<th>{name}</th>' for name in [
+        'Symbol', 'Security', 'SEC filings', 'GICS Sector', 'GICS Sub-Industry',
+        'Headquarters Location', 'Date first added', 'CIK', 'Founded'])
+    return (f'<html><body><table class="wikitable sortable" id="constituents"><tbody>'
+            f'<tr>{header}</tr>{"".join(rows)}</tbody></table></body></html>').encode('utf-8')
+
+
+class FakeQuoteSource:
+    """
+    Local stand-in for dc.fetch_yahoo_prices serving the part of the
+    synthetic frames between the requested dates after `latency` seconds.
+    With clip_dates=False whole frames are served whatever the dates.
+    Tickers in `errors` raise a ConnectionError
+    """
+
+    def __init__(self, frames, latency=0.0, errors=(), clip_dates=True):
+        self.frames = frames
+        self.latency = latency
+        self.errors = set(errors)
+        self.clip_dates = clip_dates
+        self.calls = []
+
+    @property
+    def num_calls(self):
+        return len(self.calls)
+
+    def __call__(self, ticker, start_date, end_date):
+        self.calls.append(ticker)
+        if self.latency:
+            time.sleep(self.latency)
+        if ticker in self.errors:
+            raise ConnectionError(f'no quotes for {ticker}')
+        df_prices = self.frames.get(ticker)
+        if df_prices is None:
+            return pd.DataFrame()
+        if not self.clip_dates:
+            return df_prices.copy()
+        start_date = pd.Timestamp(start_date).tz_localize(None)
+        end_date = pd.Timestamp(end_date).tz_localize(None)
+        return df_prices[(df_prices.index >= start_date) & (df_prices.index <= end_date)].copy()
+
+
+class FakeWikiPage:
+    """
+    Local stand-in for dc.read_sp500_wiki_page
+    """
+
+    def __init__(self, html_page, latency=0.0):
+        self.html_page = html_page
+        self.latency = latency
+
+    def __call__(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.html_page
@@ -1,3 +1,466 @@
-from django.test import TestCase
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Asset, AssetBar, AssetPrice, IngestionJob
+from . import bars
+from . import controller as co
+from . import data_collection as dc
+from . import ingestion
+from . import jobs
+from . import price_store
+from . import synthetic
+from .asset_index import asset_index
+from .frame_cache import FrameCache, price_frame_cache
+from .synthetic import FakeQuoteSource, make_yahoo_frame
+
+
+class ConcurrentIngestionTest(TestCase):
+
+    def setUp(self):
+        for symbol in ['AAA', 'BBB', 'CCC']:
+            Asset.objects.create(symbol=symbol, security_name=symbol)
+
+    def test_stores_prices_and_reports_failures(self):
+        source = FakeQuoteSource(
+            {'AAA': make_yahoo_frame(), 'BBB': make_yahoo_frame(periods=5)},
+            errors=['CCC'], clip_dates=False)
+        progress = []
+
+        result = ingestion.update_asset_price_data_concurrently(
+            ['AAA', 'BBB', 'CCC'], max_workers=2, fetch=source,
+            rate_limiter=ingestion.RateLimiter(0),
+            progress=lambda *args: progress.append(args))
+
+        number_of_tickers, num_price_points, failures = result
+        self.assertEqual(number_of_tickers, 3)
+        self.assertEqual(num_price_points, 8)
+        self.assertEqual(list(failures), ['CCC'])
+        self.assertEqual(AssetPrice.objects.filter(asset__symbol='BBB').count(), 5)
+        self.assertEqual(sorted(p[0] for p in progress), ['AAA', 'BBB', 'CCC'])
+
+    def test_quote_source_errors_are_reported_per_ticker(self):
+        def data_reader(ticker, source, start_date, end_date):
+            if ticker == 'CCC':
+                raise ConnectionError('connection reset')
+            return make_yahoo_frame()
+
+        with mock.patch.object(dc.web, 'DataReader', side_effect=data_reader):
+            result = ingestion.update_asset_price_data_concurrently(
+                ['AAA', 'CCC'], max_workers=2, rate_limiter=ingestion.RateLimiter(0))
+        self.assertEqual(result, (2, 3, {'CCC': 'connection reset'}))
+
+    def test_rerun_only_fetches_after_last_stored_price(self):
+        source = FakeQuoteSource({'AAA': make_yahoo_frame()}, clip_dates=False)
+        ingestion.update_asset_price_data_concurrently(
+            ['AAA'], max_workers=1, fetch=source,
+            rate_limiter=ingestion.RateLimiter(0))
+
+        requested = []
+
+        def fetch(ticker, start_date, end_date):
+            requested.append(start_date)
+            return pd.DataFrame()
+
+        ingestion.update_asset_price_data_concurrently(
+            ['AAA'], max_workers=1, fetch=fetch,
+            rate_limiter=ingestion.RateLimiter(0))
+        self.assertEqual(requested[0].date().isoformat(), '2021-01-07')
+
+
+class AssetPriceConversionTest(TestCase):
+
+    def test_column_wise_conversion_and_chunked_insert(self):
+        asset = Asset.objects.create(symbol='AAA', security_name='AAA')
+        df_prices = co.rename_yahoo_columns(make_yahoo_frame(periods=7))
+
+        num_created = co.bulk_create_in_chunks(
+            AssetPrice, co.iter_asset_prices(asset.id, df_prices), batch_size=3)
+
+        self.assertEqual(num_created, 7)
+        first = AssetPrice.objects.filter(asset=asset).earliest('datetime')
+        self.assertEqual(first.datetime.isoformat(), '2021-01-04T00:00:00+00:00')
+        self.assertEqual(first.adj_close, df_prices['adj_close'].iloc[0])
+        self.assertIsInstance(first.volume, float)
+
+
+class PriceStoreTest(TestCase):
+
+    def setUp(self):
+        price_frame_cache.invalidate()
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+        self.asset = Asset.objects.create(symbol='AAA', security_name='AAA')
+        co.save_asset_prices_for_ticker('AAA', co.rename_yahoo_columns(make_yahoo_frame()))
+
+    def test_read_falls_back_to_db_and_is_kept_in_sync(self):
+        with override_settings(PRICE_STORE_ENABLED=True,
+                               PRICE_STORE_DIR=self.store_dir.name):
+            self.assertIsNone(price_store.read_prices('AAA'))
+            df_db = co.get_existing_data_for_ticker('AAA')
+
+            df_stored = price_store.read_prices('AAA')
+            self.assertEqual(list(df_stored.index), list(df_db.index))
+            self.assertEqual(list(df_stored.columns), list(df_db.columns))
+
+            df_new = co.rename_yahoo_columns(make_yahoo_frame('2021-01-07', periods=2))
+            co.save_asset_prices_for_ticker('AAA', df_new)
+            df_stored = co.get_existing_data_for_ticker('AAA')
+            self.assertEqual(len(df_stored), 5)
+            self.assertAlmostEqual(df_stored['adj_close'].iloc[-1], 11.4)
+
+    def test_stale_store_files_are_reloaded_from_the_db(self):
+        with override_settings(PRICE_STORE_ENABLED=True,
+                               PRICE_STORE_DIR=self.store_dir.name):
+            df_old = co.get_existing_data_for_ticker('AAA')
+            # bars stored while the file was missing or the store disabled
+            with override_settings(PRICE_STORE_ENABLED=False):
+                df_new = co.rename_yahoo_columns(make_yahoo_frame('2021-01-07', periods=2))
+                co.save_asset_prices_for_ticker('AAA', df_new)
+            price_store.write_prices('AAA', df_old)
+            price_frame_cache.invalidate()
+
+            df_result = co.get_existing_data_for_ticker('AAA')
+            self.assertEqual(len(df_result), 5)
+            self.assertEqual(len(price_store.read_prices('AAA')), 5)
+            self.assertEqual(len(co.get_existing_data_for_ticker('AAA')), 5)
+
+    def test_concurrent_writes_of_a_ticker_keep_the_file_whole(self):
+        records = price_store.get_records(co.get_existing_data_for_ticker_from_db('AAA'))
+        with override_settings(PRICE_STORE_DIR=self.store_dir.name):
+            with ThreadPoolExecutor(8) as executor:
+                list(executor.map(lambda _: price_store.write_records('AAA', records), range(32)))
+            self.assertEqual(len(price_store.read_prices('AAA')), len(records))
+        self.assertEqual(os.listdir(self.store_dir.name), ['AAA.npy'])
+
+
+class FrameCacheTest(TestCase):
+
+    def setUp(self):
+        price_frame_cache.invalidate()
+        Asset.objects.create(symbol='AAA', security_name='AAA')
+        co.save_asset_prices_for_ticker('AAA', co.rename_yahoo_columns(make_yahoo_frame()))
+
+    def test_ingestion_extends_cached_frame(self):
+        co.get_existing_data_for_ticker('AAA')
+        hits = price_frame_cache.get_stats()['hits']
+
+        df_new = co.rename_yahoo_columns(make_yahoo_frame('2021-01-07', periods=2))
+        co.save_asset_prices_for_ticker('AAA', df_new)
+        with self.assertNumQueries(1):
+            df_cached = co.get_existing_data_for_ticker('AAA')
+
+        self.assertEqual(price_frame_cache.get_stats()['hits'], hits + 1)
+        self.assertEqual(len(df_cached), 5)
+        self.assertEqual(df_cached.index.max().isoformat(), '2021-01-08T00:00:00+00:00')
+
+    def test_revisions_by_another_process_are_not_served_from_cache(self):
+        co.get_existing_data_for_ticker('AAA')
+        # what an ingestion worker process revising the last bar leaves behind
+        last_price = AssetPrice.objects.filter(asset__symbol='AAA').latest('datetime')
+        AssetPrice.objects.filter(pk=last_price.pk).update(adj_close=111.4)
+        Asset.objects.filter(symbol='AAA').update(prices_revised_at=timezone.now())
+        self.assertEqual(co.get_existing_data_for_ticker('AAA')['adj_close'].iloc[-1], 111.4)
+
+    def test_evicts_least_recently_used(self):
+        df = co.get_existing_data_for_ticker('AAA')
+        cache = FrameCache(max_bytes=2 * df.memory_usage(deep=True).sum() + 1)
+        last_bar = df.index.max()
+        for ticker in ['AAA', 'BBB', 'CCC']:
+            cache.put(ticker, df, last_bar)
+
+        self.assertIsNone(cache.get('AAA', last_bar))
+        self.assertIsNotNone(cache.get('CCC', last_bar))
+        self.assertIsNone(cache.get('CCC', None))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+
+class IngestionJobTest(TestCase):
+
+    def setUp(self):
+        price_frame_cache.invalidate()
+        for symbol in ['AAA', 'BBB']:
+            Asset.objects.create(symbol=symbol, security_name=symbol)
+
+    def test_view_enqueues_and_worker_reports_progress(self):
+        response = self.client.get('/assets/sp500_prices')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get('/assets/sp500_prices').status_code, 202)
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, IngestionJob.STATUS_QUEUED)
+
+        source = FakeQuoteSource({'AAA': make_yahoo_frame()}, errors=['BBB'], clip_dates=False)
+        with mock.patch.object(co, 'get_sp500_ticker_list', return_value=['AAA', 'BBB']), \
+                mock.patch('assets.data_collection.fetch_yahoo_prices', source):
+            self.assertEqual(jobs.run_worker(once=True), 1)
+
+        status = self.client.get(f'/assets/jobs/{job.pk}').json()
+        self.assertEqual(status['status'], IngestionJob.STATUS_DONE)
+        self.assertEqual(status['processed_tickers'], 2)
+        self.assertEqual(status['num_records'], 3)
+        self.assertEqual(status['ticker_results'], {'AAA': 3, 'BBB': 0})
+        self.assertEqual(list(status['failures']), ['BBB'])
+
+    def test_expired_running_job_is_failed_and_requeued(self):
+        job = jobs.enqueue_job(IngestionJob.KIND_PRICES)
+        self.assertEqual(jobs.claim_next_job(), job)
+        self.assertEqual(jobs.enqueue_job(IngestionJob.KIND_PRICES), job)
+
+        IngestionJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - jobs.get_job_lease() - timedelta(seconds=1))
+        new_job = jobs.enqueue_job(IngestionJob.KIND_PRICES)
+        self.assertNotEqual(new_job, job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_FAILED)
+
+    def test_concurrent_enqueue_returns_the_winning_job(self):
+        job = jobs.enqueue_job(IngestionJob.KIND_PRICES)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            IngestionJob.objects.create(kind=IngestionJob.KIND_PRICES)
+        # a caller that checked before the job was created
+        with mock.patch.object(jobs, 'get_active_job', side_effect=[None, job]):
+            self.assertEqual(jobs.enqueue_job(IngestionJob.KIND_PRICES), job)
+        self.assertEqual(IngestionJob.objects.count(), 1)
+
+
+SP500_WIKI_PAGE_FIXTURE = os.path.join(os.path.dirname(__file__), 'test_data', 'sp500_wiki_page.html')
+
+
+class SP500InfoTest(TestCase):
+
+    def setUp(self):
+        with open(SP500_WIKI_PAGE_FIXTURE, 'rb') as f:
+            self.html_page = f.read()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.settings = override_settings(
+            SP500_INFO_FILE=os.path.join(tmp_dir.name, 'sp500_constituents.csv'))
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        dc._sp500_info['df'] = None
+
+    def test_fast_parse_matches_beautifulsoup(self):
+        data, column_names = dc.parse_sp500_wiki_page_fast(self.html_page)
+        self.assertEqual((data, column_names), dc.parse_sp500_wiki_page(self.html_page))
+        self.assertEqual([row[0] for row in data], ['MMM', 'ABT', 'BRK.B', 'T'])
+        self.assertEqual(data[3][1], 'AT&T Inc.')
+        self.assertEqual(column_names[3], 'GICS Sector')
+
+    def test_repeat_calls_use_the_saved_list_until_it_expires(self):
+        with mock.patch.object(dc, 'read_sp500_wiki_page', return_value=self.html_page) as read_page:
+            df_first = dc.get_SP500_info()
+            dc._sp500_info['df'] = None
+            df_second = dc.get_SP500_info()
+            self.assertEqual(read_page.call_count, 1)
+            pd.testing.assert_frame_equal(df_first, df_second)
+            self.assertEqual(df_second.loc[0, 'CIK'], '0000066740')
+
+            dc.get_SP500_info(max_age=0)
+            self.assertEqual(read_page.call_count, 2)
+
+    def test_saved_list_is_used_when_download_fails(self):
+        with mock.patch.object(dc, 'read_sp500_wiki_page', return_value=self.html_page):
+            dc.get_SP500_info()
+        with mock.patch.object(dc, 'read_sp500_wiki_page', return_value=pd.DataFrame()):
+            self.assertEqual(len(dc.get_SP500_info(max_age=0)), 4)
+
+    def test_saved_list_is_used_when_download_errors_or_page_changes(self):
+        with mock.patch.object(dc, 'read_sp500_wiki_page', return_value=self.html_page):
+            dc.get_SP500_info()
+        with mock.patch.object(dc.requests, 'get',
+                               side_effect=dc.requests.Timeout('timed out')) as get:
+            self.assertEqual(len(dc.get_SP500_info(max_age=0)), 4)
+        self.assertEqual(get.call_args[1]['timeout'], dc.SP500_WIKI_TIMEOUT)
+        with mock.patch.object(dc, 'read_sp500_wiki_page', return_value=b'<html></html>'):
+            self.assertEqual(len(dc.get_SP500_info(max_age=0)), 4)
+
+
+class UpsertTest(TestCase):
+
+    def setUp(self):
+        price_frame_cache.invalidate()
+        Asset.objects.create(symbol='AAA', security_name='AAA')
+        co.save_asset_prices_for_ticker('AAA', co.rename_yahoo_columns(make_yahoo_frame()))
+
+    def test_overlapping_download_only_inserts_new_bars(self):
+        df_overlap = co.rename_yahoo_columns(make_yahoo_frame(periods=5))
+        counts = co.upsert_asset_prices_for_ticker('AAA', df_overlap, update_changed=True)
+        self.assertEqual(counts, {'inserted': 2, 'updated': 0, 'skipped': 3})
+        self.assertEqual(AssetPrice.objects.filter(asset__symbol='AAA').count(), 5)
+
+    def test_revised_bars_are_updated_when_asked(self):
+        df_revised = co.rename_yahoo_columns(make_yahoo_frame())
+        df_revised.iloc[1, df_revised.columns.get_loc('adj_close')] = 99.0
+
+        counts = co.upsert_asset_prices_for_ticker('AAA', df_revised, update_changed=False)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 0, 'skipped': 3})
+
+        counts = co.upsert_asset_prices_for_ticker('AAA', df_revised, update_changed=True)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1, 'skipped': 2})
+        self.assertEqual(co.get_existing_data_for_ticker('AAA')['adj_close'].iloc[1], 99.0)
+
+    def test_assets_are_upserted_on_symbol_and_market(self):
+        assets = [Asset(symbol='AAA', security_name='AAA Corp'),
+                  Asset(symbol='BBB', security_name='BBB')]
+        self.assertEqual(co.upsert_assets(assets), {'inserted': 1, 'updated': 1, 'skipped': 0})
+        self.assertEqual(Asset.objects.get(symbol='AAA').security_name, 'AAA Corp')
+        self.assertEqual(co.upsert_assets(assets), {'inserted': 0, 'updated': 0, 'skipped': 2})
+
+
+class AssetIndexTest(TestCase):
+
+    def setUp(self):
+        asset_index.invalidate()
+        Asset.objects.create(symbol='AAA', security_name='AAA')
+        Asset.objects.create(symbol='AAA', market_symbol='^IXIC', security_name='AAA Nasdaq')
+        Asset.objects.create(symbol='BBB', market_symbol='^IXIC', security_name='BBB')
+
+    def test_lookups_use_a_single_query(self):
+        nasdaq_asset = Asset.objects.get(symbol='AAA', market_symbol='^IXIC')
+        with self.assertNumQueries(1):
+            self.assertEqual(asset_index.get_market_symbol('AAA'), '^GSPC')
+            self.assertEqual(asset_index.get_market_symbol('BBB'), '^IXIC')
+            self.assertEqual(asset_index.get_asset_id('AAA', '^IXIC'), nasdaq_asset.id)
+
+    def test_index_is_reloaded_after_asset_changes(self):
+        asset_index.get_asset_id('AAA')
+        Asset.objects.create(symbol='CCC', security_name='CCC')
+        self.assertEqual(asset_index.get_market_symbol('CCC'), '^GSPC')
+        co.upsert_assets([Asset(symbol='DDD', security_name='DDD')])
+        self.assertEqual(asset_index.get_market_symbol('DDD'), '^GSPC')
+        with self.assertRaises(Asset.DoesNotExist):
+            asset_index.get_asset_id('ZZZ')
+
+    def test_unknown_symbols_reload_the_index_once_per_ttl(self):
+        asset_index.get_asset_id('AAA')
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                with self.assertRaises(Asset.DoesNotExist):
+                    asset_index.get_asset_id('ZZZ')
+        with mock.patch.object(asset_index, 'missing_ttl', 0), self.assertNumQueries(1):
+            with self.assertRaises(Asset.DoesNotExist):
+                asset_index.get_asset_id('ZZZ')
+        Asset.objects.create(symbol='ZZZ', security_name='ZZZ')
+        self.assertEqual(asset_index.get_market_symbol('ZZZ'), '^GSPC')
+
+    def test_ambiguous_symbol_without_default_market(self):
+        Asset.objects.create(symbol='BBB', market_symbol='^FTSE', security_name='BBB London')
+        with self.assertRaises(Asset.MultipleObjectsReturned):
+            asset_index.get_asset_id('BBB')
+
+
+class PricePanelTest(TestCase):
+
+    def setUp(self):
+        asset_index.invalidate()
+        price_frame_cache.invalidate()
+        for ticker, start in [('AAA', '2021-01-04'), ('BBB', '2021-01-05')]:
+            Asset.objects.create(symbol=ticker, security_name=ticker)
+            co.save_asset_prices_for_ticker(
+                ticker, co.rename_yahoo_columns(make_yahoo_frame(start, periods=5)))
+
+    def test_long_panel_matches_per_ticker_frames(self):
+        asset_index.get_symbols()
+        with self.assertNumQueries(1):
+            df_panel = co.get_price_panel(['AAA', 'BBB'])
+        self.assertEqual(list(df_panel.columns), co.PRICE_COLUMNS)
+        self.assertTrue((df_panel.dtypes == 'float64').all())
+        for ticker in ['AAA', 'BBB']:
+            df_expected = co.get_existing_data_for_ticker_from_db(ticker)
+            pd.testing.assert_frame_equal(df_panel.loc[ticker], df_expected,
+                                          check_names=False, check_freq=False)
+
+    def test_wide_panel_with_date_range(self):
+        start, end = pd.Timestamp('2021-01-05', tz='UTC'), pd.Timestamp('2021-01-07', tz='UTC')
+        df_panel = co.get_price_panel(start_datetime=start, end_datetime=end,
+                                      columns=['adj_close', 'volume'], layout='wide')
+        self.assertEqual(list(df_panel.index), list(pd.date_range(start, end)))
+        self.assertEqual(sorted(df_panel['adj_close'].columns), ['AAA', 'BBB'])
+        self.assertTrue(co.get_price_panel(['ZZZ']).empty)
+
+
+class SQLiteProfileTest(TestCase):
+
+    def test_pragmas_are_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            busy_timeout = cursor.execute('PRAGMA busy_timeout').fetchone()[0]
+            synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+        self.assertEqual(busy_timeout, 30000)
+        self.assertEqual(synchronous, 1)
+
+    def test_last_price_datetimes_skip_assets_without_prices(self):
+        Asset.objects.create(symbol='AAA', security_name='AAA')
+        Asset.objects.create(symbol='BBB', security_name='BBB')
+        co.save_asset_prices_for_ticker('AAA', co.rename_yahoo_columns(make_yahoo_frame()))
+        last_price_datetimes = co.get_last_price_datetimes()
+        self.assertEqual(list(last_price_datetimes), ['AAA'])
+        self.assertEqual(last_price_datetimes['AAA'].isoformat(), '2021-01-06T00:00:00+00:00')
+
+
+class SyntheticDataTest(TestCase):
+
+    def test_prices_are_seeded_and_served_between_dates(self):
+        frames = synthetic.make_synthetic_prices(3, 1, seed=1, end_date='2021-12-31')
+        self.assertEqual(sorted(frames), ['SYN0000', 'SYN0001', 'SYN0002', '^GSPC'])
+        pd.testing.assert_frame_equal(
+            frames['SYN0001'],
+            synthetic.make_synthetic_prices(3, 1, seed=1, end_date='2021-12-31')['SYN0001'])
+        self.assertTrue((frames['SYN0000']['High'] >= frames['SYN0000']['Low']).all())
+
+        source = FakeQuoteSource(frames)
+        start_date, end_date = dc.get_start_and_end_dates(pd.Timestamp('2021-12-27'))
+        df_prices = source('SYN0000', start_date, end_date)
+        self.assertEqual(list(df_prices.index.day), [27, 28, 29, 30, 31])
+        self.assertTrue(source('ZZZ', start_date, end_date).empty)
+
+    def test_wiki_page_lists_the_tickers(self):
+        html_page = synthetic.make_sp500_wiki_page(['AAA', 'B&B'])
+        data, column_names = dc.parse_sp500_wiki_page_fast(html_page)
+        self.assertEqual([row[0] for row in data], ['AAA', 'B&B'])
+        self.assertEqual(column_names[3], 'GICS Sector')
+
+
+class BarTest(TestCase):
+
+    def setUp(self):
+        asset_index.invalidate()
+        price_frame_cache.invalidate()
+        Asset.objects.create(symbol='AAA', security_name='AAA')
+        self.df_daily = synthetic.make_synthetic_prices(1, 1, seed=2, end_date='2021-12-31')['SYN0000']
+
+    def test_bars_match_pandas_resampling(self):
+        co.save_asset_prices_for_ticker('AAA', co.rename_yahoo_columns(self.df_daily))
+        df_prices = co.get_existing_data_for_ticker_from_db('AAA')
+        for timeframe, rule in [('W', 'W-SUN'), ('M', 'M')]:
+            df_bars = bars.get_bars('AAA', timeframe)
+            df_expected = df_prices.resample(rule).agg({
+                'high': 'max', 'low': 'min', 'open': 'first', 'close': 'last',
+                'volume': 'sum', 'adj_close': 'last'}).dropna()
+            np.testing.assert_allclose(df_bars[df_expected.columns].to_numpy(),
+                                       df_expected.to_numpy())
+            self.assertTrue((df_bars['period_start'] <= df_bars.index).all())
+        self.assertEqual(df_bars.index[-1], df_prices.index[-1])
+
+    def test_incremental_ingestion_matches_a_rebuild(self):
+        df_daily = co.rename_yahoo_columns(self.df_daily)
+        for start in range(0, len(df_daily), 7):
+            co.save_asset_prices_for_ticker('AAA', df_daily.iloc[start:start + 7])
+        df_incremental = bars.get_bars('AAA', 'W')
+
+        bars.update_bars(asset_index.get_asset_id('AAA'))
+        pd.testing.assert_frame_equal(df_incremental, bars.get_bars('AAA', 'W'))
+        self.assertEqual(AssetBar.objects.filter(timeframe='M').count(), 12)
+
+    @override_settings(BAR_TIMEFRAMES=[])
+    def test_bars_can_be_turned_off(self):
+        co.save_asset_prices_for_ticker('AAA', co.rename_yahoo_columns(self.df_daily))
+        self.assertFalse(AssetBar.objects.exists())
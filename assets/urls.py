@@ -5,4 +5,8 @@ from . import views
 urlpatterns = [
     path('sp500_meta', views.save_all_sp500_metadata, name='sp_meta'),
     path('sp500_prices', views.save_all_sp500_stock_prices, name='sp500_stock_prices'),
+    path('jobs/<int:job_id>', views.get_ingestion_job_status, name='ingestion_job_status'),
+    path('async/jobs/<int:job_id>', views.get_ingestion_job_status_async,
+         name='ingestion_job_status_async'),
+    path('metrics', views.get_metrics, name='metrics'),
 ]
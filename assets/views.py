@@ -1,27 +1,48 @@
-from django.shortcuts import render
-from django.http import HttpResponse
+from django.shortcuts import render, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse
 from django.template import loader
+from django.urls import reverse
 
 import pandas as pd
 
 from . import data_collection as dc
-from . import controller
+from .executor import run_in_executor
+from . import jobs
+from . import metrics
+from .models import IngestionJob
 
 
 # Create your views here.
-def save_all_sp500_metadata(request):
-    num_updated = controller.update_asset_data_for_sp500()
+def enqueue_job_response(request, kind):
+    job = jobs.enqueue_job(kind)
     template = loader.get_template('status.html')
     context = {
-        'status': f'Successfully loaded {num_updated} records of S&P 500',
+        'status': f'{job.get_kind_display()} job {job.pk} is {job.status}',
+        'job_status_url': reverse('ingestion_job_status', kwargs={'job_id': job.pk}),
     }
-    return HttpResponse(template.render(context, request))
+    return HttpResponse(template.render(context, request), status=202)
+
+
+def save_all_sp500_metadata(request):
+    return enqueue_job_response(request, IngestionJob.KIND_METADATA)
 
 
 def save_all_sp500_stock_prices(request):
-    num_tickers, num_records = controller.update_asset_price_data_for_sp500()
-    template = loader.get_template('status.html')
-    context = {
-        'status': f'Successfully loaded {num_records} price points for {num_tickers} tickers of S&P 500',
-    }
-    return HttpResponse(template.render(context, request))
\ No newline at end of file
+    return enqueue_job_response(request, IngestionJob.KIND_PRICES)
+
+
+def get_ingestion_job_status(request, job_id):
+    job = get_object_or_404(IngestionJob, pk=job_id)
+    return JsonResponse(jobs.get_job_status(job))
+
+
+async def get_ingestion_job_status_async(request, job_id):
+    job = await run_in_executor(get_object_or_404, IngestionJob, pk=job_id)
+    return JsonResponse(await run_in_executor(jobs.get_job_status, job))
+
+
+def get_metrics(request):
+    if not metrics.registry.enabled:
+        raise Http404('Metrics are disabled')
+    return HttpResponse(metrics.registry.render_prometheus(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
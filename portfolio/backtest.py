@@ -0,0 +1,266 @@
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.util import Finalize
+
+import numpy as np
+import pandas as pd
+
+from assets import controller as co
+from assets.metrics import timed
+
+from .indicator_engine import RSM_WINDOW, SMA_10W_WINDOW, SMA_30W_WINDOW
+from . import indicator_engine
+from . import screener
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+# cost of trading the whole portfolio value once, 10 basis points
+DEFAULT_COST = 0.001
+STATS = ['days', 'total_return', 'annual_return', 'annual_volatility', 'sharpe',
+         'max_drawdown', 'annual_turnover', 'exposure', 'trades']
+
+# price matrices of the sweep workers, attached from shared memory
+_worker_arrays = {}
+_worker_buffers = []
+
+
+def sma_crossover_signal(prices, index_prices, fast=SMA_10W_WINDOW, slow=SMA_30W_WINDOW):
+    """
+    Long while the fast SMA is above the slow SMA
+    """
+    with np.errstate(invalid='ignore'):
+        return indicator_engine.rolling_mean(prices, fast) > indicator_engine.rolling_mean(
+            prices, slow)
+
+
+def rsm_signal(prices, index_prices, window=RSM_WINDOW, threshold=0.0):
+    """
+    Long while the Mansfield relative strength is above the threshold
+    """
+    _, rsm = indicator_engine.relative_strength(prices, index_prices, window)
+    with np.errstate(invalid='ignore'):
+        return rsm > threshold
+
+
+SIGNALS = {
+    'sma_crossover': sma_crossover_signal,
+    'rsm': rsm_signal,
+}
+
+
+def get_backtest_data(tickers=None, start_datetime=None):
+    """
+    Load the adjusted close matrix of the tickers (all the stocks by
+    default, leaving out the indexes) and the matching index prices
+    """
+    if tickers is None:
+        tickers = screener.get_universe_assets()['symbol'].tolist()
+    df_prices = co.get_price_matrix(tickers, start_datetime=start_datetime)
+    if df_prices.empty:
+        return df_prices, np.empty(df_prices.shape)
+    market_symbols = co.get_market_symbols(df_prices.columns)
+    return df_prices, indicator_engine.get_index_matrix(df_prices, market_symbols)
+
+
+def prepare_prices(prices):
+    """
+    Carry prices forward over the days a ticker or index did not trade, so
+    that positions are held through the gaps instead of being closed
+    """
+    return pd.DataFrame(np.asarray(prices, dtype='float64')).ffill().to_numpy()
+
+
+def get_weights(positions, max_weight=None):
+    """
+    Split the portfolio equally over the held positions. With max_weight no
+    position gets more than that fraction and the rest stays in cash
+    """
+    held = np.nan_to_num(np.asarray(positions, dtype='float64')).clip(0, None)
+    counts = held.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = np.where(counts > 0, held / counts, 0.0)
+    if max_weight is not None:
+        weights = np.minimum(weights, max_weight)
+    return weights
+
+
+def simulate(prices, positions, cost=DEFAULT_COST, max_weight=None):
+    """
+    Daily returns of holding the target positions of a date x ticker panel.
+    Positions are decided on a close and traded on that close, so they earn
+    the returns from the next bar on. The portfolio is rebalanced to the
+    target weights every day and pays `cost` per unit of turnover.
+    Returns the daily returns, turnover and weights
+    """
+    prices = np.asarray(prices, dtype='float64')
+    tradable = ~np.isnan(prices)
+    weights = get_weights(np.where(tradable, positions, 0.0), max_weight)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        asset_returns = prices[1:] / prices[:-1] - 1
+    asset_returns = np.nan_to_num(asset_returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    turnover = np.abs(np.diff(weights, axis=0, prepend=0.0)).sum(axis=1)
+    returns = -cost * turnover
+    returns[1:] += (weights[:-1] * asset_returns).sum(axis=1)
+    return returns, turnover, weights
+
+
+def get_stats(returns, turnover, weights):
+    """
+    Summary statistics of a simulation, annualised over TRADING_DAYS
+    """
+    days = len(returns)
+    if days == 0:
+        return dict.fromkeys(STATS, np.nan)
+    equity = np.cumprod(1 + returns)
+    years = days / TRADING_DAYS
+    peaks = np.maximum.accumulate(np.concatenate([[1.0], equity]))[1:]
+    volatility = returns.std(ddof=1) if days > 1 else 0.0
+    entries = (weights > 0) & (np.vstack([np.zeros((1, weights.shape[1])), weights[:-1]]) == 0)
+    return {
+        'days': days,
+        'total_return': equity[-1] - 1,
+        'annual_return': equity[-1] ** (1 / years) - 1 if equity[-1] > 0 else -1.0,
+        'annual_volatility': volatility * math.sqrt(TRADING_DAYS),
+        'sharpe': returns.mean() / volatility * math.sqrt(TRADING_DAYS) if volatility else np.nan,
+        'max_drawdown': (equity / peaks - 1).min(),
+        'annual_turnover': turnover.sum() / years,
+        'exposure': weights.sum(axis=1).mean(),
+        'trades': int(entries.sum()),
+    }
+
+
+def get_backtest_stats(prices, index_prices, signal, params, cost=DEFAULT_COST, max_weight=None):
+    positions = signal(prices, index_prices, **params)
+    return get_stats(*simulate(prices, positions, cost, max_weight))
+
+
+@timed('backtest')
+def run_backtest(df_prices, index_prices, signal, cost=DEFAULT_COST, max_weight=None, **params):
+    """
+    Backtest a signal function over a date x ticker price frame. The
+    signal gets the price and index price arrays and the params and
+    returns the target positions. Returns the stats and the daily returns
+    and equity curve as series
+    """
+    prices = prepare_prices(df_prices)
+    index_prices = prepare_prices(index_prices)
+    positions = signal(prices, index_prices, **params)
+    returns, turnover, weights = simulate(prices, positions, cost, max_weight)
+    return {
+        'stats': get_stats(returns, turnover, weights),
+        'returns': pd.Series(returns, index=df_prices.index),
+        'equity': pd.Series(np.cumprod(1 + returns), index=df_prices.index),
+    }
+
+
+def get_param_combinations(param_grid):
+    """
+    Every combination of a dict of parameter name to list of values
+    """
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+
+
+def get_pool_context():
+    """
+    Fork the workers where possible, so they start with the Django apps of
+    the parent already loaded
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+
+def attach_shared_memory(name):
+    """
+    Map a shared memory block created by the parent without registering it
+    with the resource tracker. The parent owns and unlinks the block, a
+    worker registration would unlink it or warn about a leak when a worker
+    exits. Pool workers share the tracker of the parent, so unregistering
+    after the attach would drop the registration of the parent as well
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def close_worker_buffers():
+    _worker_arrays.clear()
+    while _worker_buffers:
+        buffer = _worker_buffers.pop()
+        try:
+            buffer.close()
+        except Exception as e:
+            logger.error(f'Error {e} closing shared memory {buffer.name}')
+
+
+def init_sweep_worker(specs):
+    for key, (name, shape) in specs.items():
+        buffer = attach_shared_memory(name)
+        _worker_buffers.append(buffer)
+        _worker_arrays[key] = np.ndarray(shape, dtype='float64', buffer=buffer.buf)
+    # pool workers leave through os._exit, which skips atexit but runs the
+    # multiprocessing finalizers
+    Finalize(None, close_worker_buffers, exitpriority=10)
+
+
+def run_sweep_task(signal, params, cost, max_weight):
+    stats = get_backtest_stats(_worker_arrays['prices'], _worker_arrays['index_prices'],
+                               signal, params, cost, max_weight)
+    return dict(params, **stats)
+
+
+@timed('backtest_sweep')
+def run_sweep(df_prices, index_prices, signal, param_grid, cost=DEFAULT_COST, max_weight=None,
+              workers=None):
+    """
+    Backtest a signal over every combination of the parameter grid and
+    return one row of params and stats per combination.
+
+    With more than one worker the combinations are spread over a process
+    pool. The price matrices are copied once into shared memory, which the
+    workers map instead of receiving a pickled copy with each task
+    """
+    combinations = get_param_combinations(param_grid)
+    prices = prepare_prices(df_prices)
+    index_prices = prepare_prices(index_prices)
+    workers = min(workers or os.cpu_count() or 1, len(combinations))
+    if workers <= 1:
+        rows = [dict(params, **get_backtest_stats(prices, index_prices, signal, params, cost,
+                                                  max_weight))
+                for params in combinations]
+        return pd.DataFrame(rows, columns=list(param_grid) + STATS)
+
+    buffers = []
+    try:
+        specs = {}
+        for key, values in [('prices', prices), ('index_prices', index_prices)]:
+            buffer = SharedMemory(create=True, size=max(values.nbytes, 1))
+            buffers.append(buffer)
+            np.ndarray(values.shape, dtype='float64', buffer=buffer.buf)[:] = values
+            specs[key] = (buffer.name, values.shape)
+        chunksize = max(1, len(combinations) // (workers * 4))
+        with ProcessPoolExecutor(workers, mp_context=get_pool_context(),
+                                 initializer=init_sweep_worker, initargs=(specs,)) as executor:
+            rows = list(executor.map(run_sweep_task, itertools.repeat(signal), combinations,
+                                     itertools.repeat(cost), itertools.repeat(max_weight),
+                                     chunksize=chunksize))
+    finally:
+        for buffer in buffers:
+            buffer.close()
+            buffer.unlink()
+    return pd.DataFrame(rows, columns=list(param_grid) + STATS)
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager, ExitStack
+from datetime import datetime
+from unittest import mock
+
+import django
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings
+
+from assets import controller as co
+from assets import data_collection as dc
+from assets import ingestion
+from assets import synthetic
+from assets.asset_index import asset_index
+from assets.frame_cache import price_frame_cache
+from assets.index_registry import index_series_registry
+from assets.models import Asset, AssetPrice, AssetIndicator
+
+from .chart_cache import chart_cache
+from .models import IndicatorState
+from . import indicator_engine
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+
+
+def get_timing_stats(timings):
+    timings = np.asarray(timings, dtype='float64')
+    return {
+        'count': len(timings),
+        'total_seconds': float(timings.sum()),
+        'mean_seconds': float(timings.mean()),
+        'min_seconds': float(timings.min()),
+        'median_seconds': float(np.median(timings)),
+        'max_seconds': float(timings.max()),
+    }
+
+
+def time_call(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def time_calls(function, args_list, repeat=1):
+    timings = []
+    for _ in range(repeat):
+        for args in args_list:
+            timings.append(time_call(function, *args)[0])
+    return get_timing_stats(timings)
+
+
+def invalidate_caches():
+    asset_index.invalidate()
+    price_frame_cache.invalidate()
+    chart_cache.invalidate()
+    utils.indicator_cache.invalidate()
+    index_series_registry.refresh()
+
+
+@contextmanager
+def benchmark_environment(frames, latency=0.0, isolated_db=True):
+    """
+    Point the quote source and the wiki page at the synthetic data, keep
+    every file in a temporary directory and, with isolated_db, run against
+    a throwaway test database
+    """
+    tickers = [ticker for ticker in frames if ticker != dc.SP500_INDEX_TICKER]
+    with ExitStack() as stack:
+        tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        stack.enter_context(override_settings(
+            SP500_INFO_FILE=os.path.join(tmp_dir, 'sp500_constituents.csv'),
+            PRICE_STORE_ENABLED=False,
+            PRICE_STORE_DIR=os.path.join(tmp_dir, 'price_store'),
+            INGESTION_RATE_LIMITS={},
+        ))
+        source = synthetic.FakeQuoteSource(frames, latency)
+        stack.enter_context(mock.patch.object(dc, 'fetch_yahoo_prices', source))
+        stack.enter_context(mock.patch.object(
+            dc, 'read_sp500_wiki_page',
+            synthetic.FakeWikiPage(synthetic.make_sp500_wiki_page(tickers), latency)))
+        stack.enter_context(mock.patch.dict(dc._sp500_info, {'df': None, 'loaded_at': 0.0}))
+        if isolated_db:
+            if connection.vendor == 'sqlite':
+                # a file rather than the shared in-memory test DB, so that the
+                # ingestion threads get their own connections
+                stack.enter_context(mock.patch.dict(
+                    connection.settings_dict['TEST'],
+                    {'NAME': os.path.join(tmp_dir, 'benchmark.sqlite3')}))
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                                          serialize=False)
+            stack.callback(connection.creation.destroy_test_db, old_name, verbosity=0)
+        stack.callback(invalidate_caches)
+        invalidate_caches()
+        yield source
+
+
+def delete_prices():
+    IndicatorState.objects.all().delete()
+    AssetIndicator.objects.all().delete()
+    AssetPrice.objects.all().delete()
+    invalidate_caches()
+
+
+def run_benchmarks(num_tickers=50, years=5, latency=0.0, seed=0, sample=5, repeat=3,
+                   render=2, isolated_db=True):
+    """
+    Time metadata and price ingestion, history reads, indicators and chart
+    rendering on num_tickers synthetic stocks with `years` of history.
+    Per-ticker steps run on `sample` tickers. Returns a JSON serializable
+    dict of the run parameters and the timing stats of each step
+    """
+    frames = synthetic.make_synthetic_prices(num_tickers, years, seed)
+    tickers = synthetic.make_ticker_symbols(num_tickers)
+    sample_tickers = [(ticker,) for ticker in tickers[:sample]]
+    results = {}
+    with benchmark_environment(frames, latency, isolated_db) as source:
+        Asset.objects.get_or_create(symbol=dc.SP500_INDEX_TICKER,
+                                    market_symbol=dc.SP500_INDEX_TICKER,
+                                    defaults={'security_name': 'S&P 500'})
+        elapsed, num_records = time_call(co.update_asset_data_for_sp500)
+        results['metadata_ingestion'] = dict(get_timing_stats([elapsed]), records=num_records)
+
+        elapsed, (num_tickers_updated, num_points) = time_call(
+            co.update_asset_price_data_for_sp500)
+        results['price_ingestion'] = dict(get_timing_stats([elapsed]),
+                                          tickers=num_tickers_updated, records=num_points,
+                                          records_per_second=num_points / elapsed,
+                                          quote_requests=source.num_calls)
+
+        delete_prices()
+        elapsed, (num_tickers_updated, num_points, failures) = time_call(
+            ingestion.update_asset_price_data_concurrently)
+        results['price_ingestion_concurrent'] = dict(get_timing_stats([elapsed]),
+                                                     tickers=num_tickers_updated,
+                                                     records=num_points,
+                                                     records_per_second=num_points / elapsed,
+                                                     failures=len(failures))
+
+        price_frame_cache.invalidate()
+        results['history_read_cold'] = time_calls(
+            lambda ticker: co.get_data_for_ticker(ticker, dataset='existing'), sample_tickers)
+        results['history_read_warm'] = time_calls(
+            lambda ticker: co.get_data_for_ticker(ticker, dataset='existing'),
+            sample_tickers, repeat)
+        results['indicators'] = time_calls(utils.get_analytical_data, sample_tickers, repeat)
+        results['indicators_recompute'] = time_calls(utils.calculate_analytical_data,
+                                                     sample_tickers, repeat)
+        results['universe_indicators'] = time_calls(
+            indicator_engine.compute_universe_indicators, [()], repeat)
+
+        frames_to_render = [(utils.get_analytical_data(ticker),)
+                            for ticker, in sample_tickers[:render]]
+        if frames_to_render:
+            results['rendering'] = time_calls(utils.get_full_plot, frames_to_render)
+
+    return {
+        'version': RESULTS_VERSION,
+        'meta': get_run_metadata(),
+        'params': {
+            'tickers': num_tickers,
+            'years': years,
+            'latency': latency,
+            'seed': seed,
+            'sample': sample,
+            'repeat': repeat,
+            'render': render,
+            'rows': sum(len(df) for df in frames.values()),
+        },
+        'results': results,
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception as e:
+        logger.debug(f'Error {e} reading the git commit')
+        return None
+
+
+def get_run_metadata():
+    return {
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'commit': get_git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'database': connection.vendor,
+    }
+
+
+def write_results(results, filename):
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def read_results(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current):
+    """
+    Return a dict of step name to the ratio of the mean time of the
+    current run over the baseline run, for the steps both runs timed
+    """
+    return {name: current['results'][name]['mean_seconds'] / stats['mean_seconds']
+            for name, stats in baseline['results'].items()
+            if name in current['results'] and stats['mean_seconds']}
@@ -0,0 +1,145 @@
+import logging
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from assets import controller as co
+from assets.metrics import timed
+
+from . import screener
+
+logger = logging.getLogger(__name__)
+
+# lookback windows in trading days
+BREAKOUT_WINDOWS = {
+    '1M': 21,
+    '3M': 63,
+    '12M': 252,
+    '36M': 756,
+}
+ALERT_COLUMNS = ['symbol', 'datetime', 'window', 'kind', 'adj_close', 'level']
+
+
+def sliding_max(values, window):
+    """
+    Maximum of the last `window` rows (fewer at the start) for every row
+    of a date x ticker array, skipping NaNs.
+
+    van Herk/Gil-Werman: the rows are cut into blocks of `window` rows and
+    the running max from the start and from the end of each block is
+    computed once, so that each window max is the max of a suffix and a
+    prefix value. Costs three passes over the array whatever the window
+    """
+    values = np.asarray(values, dtype='float64')
+    num_rows = len(values)
+    filled = np.where(np.isnan(values), -np.inf, values)
+    window = max(1, min(window, num_rows))
+    padding = np.full(((-num_rows) % window,) + values.shape[1:], -np.inf)
+    blocks = np.concatenate([filled, padding]).reshape((-1, window) + values.shape[1:])
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape((-1,) + values.shape[1:])
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(prefix.shape)
+
+    result = np.empty_like(filled)
+    result[:window - 1] = np.maximum.accumulate(filled[:window - 1], axis=0)
+    result[window - 1:] = np.maximum(suffix[:num_rows - window + 1], prefix[window - 1:num_rows])
+    result[result == -np.inf] = np.nan
+    return result
+
+
+def sliding_min(values, window):
+    return -sliding_max(-np.asarray(values, dtype='float64'), window)
+
+
+def shift_rows(values):
+    shifted = np.full(values.shape, np.nan)
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+def detect_breakouts(prices, windows=None):
+    """
+    For every lookback window, the highest and lowest price of the
+    `window` rows before each row of a date x ticker array, whether the
+    price is a new high or low of the window, and whether it closed above
+    (breakout) or below (breakdown) the prior range. Flags need a full
+    window of history. Returns a dict of window label to dict of arrays
+    """
+    if windows is None:
+        windows = BREAKOUT_WINDOWS
+    prices = np.asarray(prices, dtype='float64')
+    row_numbers = np.arange(len(prices)).reshape((-1,) + (1,) * (prices.ndim - 1))
+    results = {}
+    with np.errstate(invalid='ignore'):
+        for label, window in windows.items():
+            prior_high = shift_rows(sliding_max(prices, window))
+            prior_low = shift_rows(sliding_min(prices, window))
+            full_history = row_numbers >= window
+            results[label] = {
+                'high': prior_high,
+                'low': prior_low,
+                'new_high': prices >= np.fmax(prior_high, prices),
+                'new_low': prices <= np.fmin(prior_low, prices),
+                'breakout': full_history & (prices > prior_high),
+                'breakdown': full_history & (prices < prior_low),
+            }
+    return results
+
+
+def get_new_highs_for_frame(df_data, windows=None):
+    """
+    Rows of a single ticker frame where the adjusted close is the highest
+    of each lookback window, as a frame of booleans per window label
+    """
+    results = detect_breakouts(df_data['adj_close'].to_numpy(dtype='float64'), windows)
+    return pd.DataFrame({label: result['new_high'] for label, result in results.items()},
+                        index=df_data.index)
+
+
+def get_breakout_start_datetime(last_datetime, days, windows):
+    bars = max(windows.values()) + days + 1
+    return last_datetime - timedelta(days=int(bars * 7 / 5) + 30)
+
+
+@timed('breakout_alerts')
+def get_breakout_alerts(tickers=None, days=1, windows=None):
+    """
+    Breakouts and breakdowns of the given tickers (all by default) over
+    the last `days` bars of each, loading just enough history before the
+    oldest last bar for the longest window. Delisted tickers are left out
+    as in the screener. Returns a frame with one row per ticker, bar,
+    window and kind
+    """
+    if windows is None:
+        windows = BREAKOUT_WINDOWS
+    last_price_datetimes = screener.get_current_last_datetimes(co.get_last_price_datetimes(),
+                                                               tickers)
+    if not last_price_datetimes:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+    start_datetime = get_breakout_start_datetime(min(last_price_datetimes.values()), days,
+                                                 windows)
+    df_prices = co.get_price_matrix(list(last_price_datetimes), start_datetime=start_datetime)
+    if df_prices.empty:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    prices = df_prices.to_numpy()
+    # the last `days` rows up to the last bar of each ticker
+    positions = np.arange(len(prices))[:, np.newaxis]
+    recent = positions > screener.get_last_positions(prices) - days
+    alerts = []
+    for label, result in detect_breakouts(prices, windows).items():
+        for kind, level in [('breakout', 'high'), ('breakdown', 'low')]:
+            rows, columns = np.nonzero(result[kind] & recent)
+            alerts.append(pd.DataFrame({
+                'symbol': df_prices.columns[columns],
+                'datetime': df_prices.index[rows],
+                'window': label,
+                'kind': kind,
+                'adj_close': prices[rows, columns],
+                'level': result[level][rows, columns],
+            }))
+    df_alerts = pd.concat(alerts, ignore_index=True)
+    df_alerts['window_days'] = df_alerts['window'].map(windows)
+    df_alerts = df_alerts.sort_values(['datetime', 'window_days', 'symbol'],
+                                      ascending=[False, False, True], kind='mergesort')
+    return df_alerts[ALERT_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+
+from django.conf import settings
+
+from assets import controller as co
+from assets.executor import run_in_executor
+from assets.lru_cache import SizedLRUCache
+
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+FULL_PLOT_SPEC = 'full-15x12-v4'
+
+
+class ChartCache(SizedLRUCache):
+    """
+    Size bounded LRU cache of rendered charts keyed by
+    (ticker, last bar datetimes, chart spec)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(max_bytes)
+
+    def get_size(self, graph):
+        return len(graph)
+
+
+chart_cache = ChartCache(getattr(settings, 'CHART_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def get_chart_key(ticker, spec=FULL_PLOT_SPEC):
+    """
+    The chart of a ticker changes when a bar of the ticker or of its index
+    is stored, when stored bars of either are revised, or when the chart
+    spec changes
+    """
+    index_ticker = co.get_index_ticker(ticker)
+    revised_at = co.get_prices_revised_at([ticker, index_ticker])
+    return (ticker,
+            co.get_last_price_datetime(ticker),
+            co.get_last_price_datetime(index_ticker),
+            revised_at.get(ticker),
+            revised_at.get(index_ticker),
+            spec)
+
+
+def get_chart_etag(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def get_chart_last_modified(key):
+    changes = [change for change in key[1:5] if change is not None]
+    return max(changes) if changes else None
+
+
+def get_full_chart(ticker, key=None):
+    """
+    Return the base64 PNG of the full technical analysis chart of the
+    ticker, rendering it only when it is not cached
+    """
+    if key is None:
+        key = get_chart_key(ticker)
+    graph = chart_cache.get(key)
+    if graph is None:
+        logger.debug(f'rendering chart for {ticker}')
+        graph = utils.get_full_plot(utils.get_analytical_data(ticker))
+        chart_cache.put(key, graph)
+    return graph
+
+
+async def get_full_chart_async(ticker, key=None):
+    """
+    get_full_chart for async views, rendering in the shared executor
+    """
+    if key is None:
+        key = await run_in_executor(get_chart_key, ticker)
+    graph = chart_cache.get(key)
+    if graph is None:
+        logger.debug(f'rendering chart for {ticker}')
+        df_data = await utils.get_analytical_data_async(ticker)
+        graph = await run_in_executor(utils.get_full_plot, df_data)
+        chart_cache.put(key, graph)
+    return graph
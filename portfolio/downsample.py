@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest Triangle Three Buckets: pick `threshold` points of the series
+    that preserve its visual shape. Returns the positions of the kept points
+    """
+    num_points = len(y)
+    if threshold >= num_points or threshold < 3:
+        return np.arange(num_points)
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+
+    # first and last points are always kept, the rest is split in buckets
+    edges = np.linspace(1, num_points - 1, threshold - 1).astype(int)
+    edges = np.append(edges, num_points)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = num_points - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """
+    Keep the lowest and the highest point of each of threshold / 2 equal
+    buckets. Returns the positions of the kept points in order
+    """
+    num_points = len(y)
+    if threshold >= num_points or threshold < 2:
+        return np.arange(num_points)
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(0, num_points, threshold // 2 + 1).astype(int)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = y[start:end]
+        selected.append(start + int(np.nanargmin(bucket)))
+        selected.append(start + int(np.nanargmax(bucket)))
+    return np.unique(selected)
+
+
+def downsample_indices(x, y, threshold, method='lttb'):
+    if method == 'lttb':
+        return lttb_indices(x, y, threshold)
+    if method == 'minmax':
+        return minmax_indices(y, threshold)
+    if method == 'none':
+        return np.arange(len(y))
+    raise ValueError(f'Unknown downsampling method {method}')
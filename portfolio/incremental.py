@@ -0,0 +1,222 @@
+import logging
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from django.db import transaction
+from django.db.models import Max
+
+from assets import controller as co
+from assets.asset_index import asset_index
+from assets.metrics import timed
+from assets.models import Asset, AssetPrice, AssetIndicator
+
+from .models import IndicatorState
+from .indicator_engine import SMA_10W_WINDOW, SMA_30W_WINDOW, RSM_WINDOW
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+INDICATOR_WINDOWS = {
+    'sma_10w': SMA_10W_WINDOW,
+    'sma_30w': SMA_30W_WINDOW,
+    'rsm': RSM_WINDOW,
+}
+
+
+class RollingMeanState:
+    """
+    Running sum and tail of a rolling mean with min_periods=1 that skips
+    NaNs, matching pandas rolling().mean(). Each new value costs O(1)
+    """
+
+    def __init__(self, window, tail=(), running_sum=0.0, valid_count=0):
+        self.window = window
+        self.tail = deque(tail)
+        self.running_sum = running_sum
+        self.valid_count = valid_count
+
+    def push(self, value):
+        if len(self.tail) == self.window:
+            dropped = self.tail.popleft()
+            if not math.isnan(dropped):
+                self.running_sum -= dropped
+                self.valid_count -= 1
+        self.tail.append(value)
+        if not math.isnan(value):
+            self.running_sum += value
+            self.valid_count += 1
+        if self.valid_count == 0:
+            self.running_sum = 0.0
+            return math.nan
+        return self.running_sum / self.valid_count
+
+    def update(self, values):
+        return np.array([self.push(float(value)) for value in values])
+
+    @classmethod
+    def from_model(cls, state):
+        tail = np.frombuffer(bytes(state.tail), dtype='<f8').tolist()
+        return cls(state.window, tail, state.running_sum, state.valid_count)
+
+    def to_model(self, asset_id, indicator, last_datetime, last_value):
+        return IndicatorState(
+            asset_id=asset_id,
+            indicator=indicator,
+            window=self.window,
+            last_datetime=last_datetime,
+            running_sum=self.running_sum,
+            valid_count=self.valid_count,
+            tail=np.array(self.tail, dtype='<f8').tobytes(),
+            last_value=None if math.isnan(last_value) else last_value,
+        )
+
+
+def get_rolling_states(asset_id):
+    """
+    Return the persisted states of the asset and the datetime they are up
+    to. Incomplete or inconsistent states are discarded and rebuilt
+    """
+    states = {state.indicator: state for state in IndicatorState.objects.filter(asset_id=asset_id)}
+    last_datetimes = {state.last_datetime for state in states.values()}
+    if set(states) != set(INDICATOR_WINDOWS) or len(last_datetimes) != 1:
+        states = {}
+    if not states:
+        rolling_states = {indicator: RollingMeanState(window)
+                          for indicator, window in INDICATOR_WINDOWS.items()}
+        return rolling_states, None
+    rolling_states = {indicator: RollingMeanState.from_model(state)
+                      for indicator, state in states.items()}
+    return rolling_states, last_datetimes.pop()
+
+
+def get_new_prices(asset_id, index_asset_id, last_datetime):
+    """
+    Return the dates, adjusted close and index adjusted close of the prices
+    stored after last_datetime. Prices newer than the last index price are
+    held back until the index catches up
+    """
+    ticker_prices = AssetPrice.objects.filter(asset_id=asset_id)
+    index_prices = AssetPrice.objects.filter(asset_id=index_asset_id)
+    if last_datetime is not None:
+        ticker_prices = ticker_prices.filter(datetime__gt=last_datetime)
+    index_last_datetime = index_prices.aggregate(last_datetime=Max('datetime'))['last_datetime']
+    if index_last_datetime is not None:
+        ticker_prices = ticker_prices.filter(datetime__lte=index_last_datetime)
+
+    rows = list(ticker_prices.order_by('datetime').values_list('datetime', 'adj_close'))
+    if not rows:
+        return [], np.array([]), np.array([])
+    dates = [row[0] for row in rows]
+    adj_close = np.array([row[1] for row in rows], dtype='float64')
+    index_rows = dict(index_prices
+                      .filter(datetime__gte=dates[0], datetime__lte=dates[-1])
+                      .values_list('datetime', 'adj_close'))
+    adj_close_index = np.array([index_rows.get(date, math.nan) for date in dates],
+                               dtype='float64')
+    return dates, adj_close, adj_close_index
+
+
+@timed('indicators_incremental')
+def update_incremental_indicators(ticker):
+    """
+    Fold the prices stored since the last update into the persisted rolling
+    states of the ticker. Costs O(N) for N new prices. Returns the indicator
+    values of the new prices as a date indexed frame
+    """
+    asset_id, index_ticker = asset_index.get(ticker)
+    try:
+        index_asset_id = asset_index.get_asset_id(index_ticker)
+    except Asset.DoesNotExist:
+        index_asset_id = None
+    rolling_states, last_datetime = get_rolling_states(asset_id)
+    dates, adj_close, adj_close_index = get_new_prices(asset_id, index_asset_id, last_datetime)
+    if not dates:
+        return pd.DataFrame()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsd = adj_close / adj_close_index * 100
+        df_result = pd.DataFrame({
+            'sma_10w': rolling_states['sma_10w'].update(adj_close),
+            'sma_30w': rolling_states['sma_30w'].update(adj_close),
+            'rsd': rsd,
+            'rsm': (rsd / rolling_states['rsm'].update(rsd) - 1) * 100,
+        }, index=pd.DatetimeIndex(dates, name='datetime'))
+
+    with transaction.atomic():
+        IndicatorState.objects.filter(asset_id=asset_id).delete()
+        if last_datetime is None:
+            AssetIndicator.objects.filter(asset_id=asset_id).delete()
+        IndicatorState.objects.bulk_create([
+            rolling_state.to_model(asset_id, indicator, dates[-1], df_result[indicator].iloc[-1])
+            for indicator, rolling_state in rolling_states.items()
+        ])
+        co.bulk_create_in_chunks(AssetIndicator, iter_asset_indicators(asset_id, df_result))
+    logger.debug(f'updated indicators of {ticker} with {len(dates)} prices')
+    return df_result
+
+
+def iter_asset_indicators(asset_id, df_result):
+    df_values = df_result[['sma_10w', 'sma_30w', 'rsd', 'rsm']].astype(object)
+    df_values = df_values.where(df_result.notna(), None)
+    for date, sma_10w, sma_30w, rsd, rsm in zip(df_result.index.to_pydatetime(),
+                                                 *(df_values[col].tolist() for col in df_values)):
+        yield AssetIndicator(
+                             asset_id = asset_id,
+                             datetime = date,
+                             sma_10w = sma_10w,
+                             sma_30w = sma_30w,
+                             rsd = rsd,
+                             rsm = rsm,
+                             )
+
+
+def reset_incremental_indicators(ticker):
+    """
+    Drop the persisted states and materialized indicators of the ticker and
+    rebuild them from its whole price history
+    """
+    with transaction.atomic():
+        IndicatorState.objects.filter(asset_id=asset_index.get_asset_id(ticker)).delete()
+        return update_incremental_indicators(ticker)
+
+
+def reset_index_member_indicators(index_ticker):
+    """
+    Rebuild the indicators of the assets measured against the index, whose
+    relative strength used the revised index prices
+    """
+    symbols = (Asset.objects
+               .filter(market_symbol=index_ticker)
+               .exclude(symbol=index_ticker)
+               .values_list('symbol', flat=True))
+    for symbol in symbols:
+        try:
+            reset_incremental_indicators(symbol)
+        except Exception as e:
+            logger.error(f'Error {e} resetting indicators of {symbol}')
+
+
+def verify_incremental_indicators(ticker, rtol=1e-9):
+    """
+    Compare the persisted indicator values with a full recompute by
+    portfolio.utils.calculate_analytical_data. Returns a dict of indicator to (incremental, full)
+    values for the indicators that differ
+    """
+    states = IndicatorState.objects.filter(asset_id=asset_index.get_asset_id(ticker))
+    if not states:
+        return {}
+    df_full = utils.calculate_analytical_data(ticker)
+    mismatches = {}
+    for state in states:
+        full_value = float(df_full.loc[state.last_datetime, state.indicator])
+        incremental_value = math.nan if state.last_value is None else state.last_value
+        if math.isnan(full_value) and math.isnan(incremental_value):
+            continue
+        if not math.isclose(incremental_value, full_value, rel_tol=rtol, abs_tol=rtol):
+            mismatches[state.indicator] = (incremental_value, full_value)
+    if mismatches:
+        logger.error(f'Incremental indicators of {ticker} differ from full recompute: {mismatches}')
+    return mismatches
@@ -0,0 +1,118 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from assets import controller as co
+from assets.index_registry import index_series_registry
+from assets.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+SMA_10W_WINDOW = 70
+SMA_30W_WINDOW = 210
+RSM_WINDOW = 7 * 52
+
+INDICATORS = ['adj_close', 'adj_close_index', 'sma_10w', 'sma_30w', 'rsd', 'rsm']
+
+
+def rolling_mean(values, window):
+    """
+    Rolling mean down the rows of a 2D array with min_periods=1 semantics,
+    skipping NaNs like pandas does. Computed for all columns at once from
+    cumulative sums
+    """
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = sums / counts
+    result[counts == 0] = np.nan
+    return result
+
+
+def relative_strength(prices, index_prices, window=RSM_WINDOW):
+    """
+    Dorsey relative strength of prices against their index and its
+    Mansfield normalisation over `window` rows
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsd = prices / index_prices * 100
+        rsm = (rsd / rolling_mean(rsd, window) - 1) * 100
+    return rsd, rsm
+
+
+def get_index_matrix(df_prices, market_symbols):
+    """
+    Build a matrix of the index prices of each ticker aligned to the dates of
+    the price matrix, loading each index only once
+    """
+    index_prices = np.full(df_prices.shape, np.nan)
+    for market_symbol in set(market_symbols.values()):
+        series = index_series_registry.get_aligned(market_symbol, df_prices.index)
+        columns = [i for i, ticker in enumerate(df_prices.columns)
+                   if market_symbols.get(ticker) == market_symbol]
+        index_prices[:, columns] = series.to_numpy(dtype='float64')[:, None]
+    return index_prices
+
+
+def compute_indicators(df_prices, index_prices):
+    """
+    Compute the moving averages and the Dorsey and Mansfield relative
+    strengths of every column of a date x ticker price matrix.
+
+    Windows are counted in rows of the matrix, so the results match the per
+    ticker calculations of portfolio.utils as long as the tickers share
+    trading days. Returns a dict of indicator name to date x ticker frame
+    """
+    prices = df_prices.to_numpy(dtype='float64')
+    missing = np.isnan(prices)
+    rsd, rsm = relative_strength(prices, index_prices)
+    results = {
+        'adj_close': prices,
+        'adj_close_index': index_prices,
+        'sma_10w': rolling_mean(prices, SMA_10W_WINDOW),
+        'sma_30w': rolling_mean(prices, SMA_30W_WINDOW),
+        'rsd': rsd,
+        'rsm': rsm,
+    }
+    indicators = {}
+    for name, values in results.items():
+        values = np.where(missing, np.nan, values)
+        indicators[name] = pd.DataFrame(values, index=df_prices.index,
+                                        columns=df_prices.columns)
+    return indicators
+
+
+@timed('universe_indicators')
+def compute_universe_indicators(tickers=None, start_datetime=None):
+    """
+    Load the adjusted close of all the tickers in one query and compute
+    their indicators in a few array passes. With start_datetime only the
+    prices from then on are used, so the windows start filling from there
+    """
+    df_prices = co.get_price_matrix(tickers, start_datetime=start_datetime)
+    if df_prices.empty:
+        return {name: pd.DataFrame(dtype='float64') for name in INDICATORS}
+    market_symbols = co.get_market_symbols(df_prices.columns)
+    index_prices = get_index_matrix(df_prices, market_symbols)
+    return compute_indicators(df_prices, index_prices)
+
+
+def to_panel(indicators):
+    """
+    Combine the indicator frames into one frame with (indicator, ticker)
+    columns
+    """
+    return pd.concat(indicators, axis=1, keys=list(indicators))
+
+
+def get_indicators_for_ticker(indicators, ticker):
+    """
+    Return the indicators of one ticker as a date indexed frame with one
+    column per indicator, dropping the dates the ticker did not trade
+    """
+    df_result = pd.DataFrame({name: df[ticker] for name, df in indicators.items()})
+    return df_result[df_result['adj_close'].notna()]
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from assets.models import Asset
+from portfolio import incremental
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized AssetIndicator rows from the stored prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*',
+                            help='tickers to backfill, all assets when omitted')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers']
+        if not tickers:
+            # indexes first, the relative strength of the stocks depends on them
+            market_symbols = set(Asset.objects.values_list('market_symbol', flat=True))
+            tickers = sorted(set(Asset.objects.values_list('symbol', flat=True)),
+                             key=lambda ticker: (ticker not in market_symbols, ticker))
+        num_tickers = 0
+        num_rows = 0
+        for ticker in tickers:
+            num_rows += len(incremental.reset_incremental_indicators(ticker))
+            num_tickers += 1
+        self.stdout.write(f'Stored {num_rows} indicator rows for {num_tickers} tickers')
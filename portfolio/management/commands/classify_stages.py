@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portfolio import stages
+
+
+class Command(BaseCommand):
+    help = ('Classify every bar of every ticker into Weinstein stages and report how many '
+            'tickers are in each stage on their last bar')
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*',
+                            help='tickers to classify, all assets when omitted')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        df_stages = stages.compute_universe_stages(options['tickers'] or None)
+        elapsed = time.perf_counter() - start
+        if df_stages.empty:
+            self.stdout.write('No prices stored')
+            return
+        last_stages = df_stages.where(df_stages > 0).ffill().iloc[-1].fillna(stages.STAGE_UNKNOWN)
+        for stage, name in stages.STAGE_NAMES.items():
+            self.stdout.write(f'{name:<10} {(last_stages == stage).sum():>5} tickers')
+        self.stdout.write(f'Classified {df_stages.size} bars of {df_stages.shape[1]} tickers '
+                          f'in {elapsed:.2f}s')
@@ -0,0 +1,68 @@
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio import backtest
+
+
+def parse_value(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_param(param):
+    """
+    Parse name=value1,value2,... into the name and the list of values
+    """
+    name, _, values = param.partition('=')
+    if not name or not values:
+        raise CommandError(f'Invalid param {param}, expected name=value1,value2')
+    try:
+        return name, [parse_value(value) for value in values.split(',')]
+    except ValueError:
+        raise CommandError(f'Invalid values in param {param}')
+
+
+class Command(BaseCommand):
+    help = ('Backtest a signal over the stored prices, sweeping every combination of the '
+            'given parameter values across a process pool')
+
+    def add_arguments(self, parser):
+        parser.add_argument('signal', choices=sorted(backtest.SIGNALS))
+        parser.add_argument('tickers', nargs='*',
+                            help='tickers to trade, all assets when omitted')
+        parser.add_argument('--param', action='append', default=[],
+                            help='signal parameter values to sweep, e.g. fast=20,50,70')
+        parser.add_argument('--cost', type=float, default=backtest.DEFAULT_COST,
+                            help='cost per unit of turnover')
+        parser.add_argument('--max-weight', type=float,
+                            help='largest fraction of the portfolio in one ticker')
+        parser.add_argument('--start', help='first date of the backtest, YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, help='worker processes, one per core by default')
+        parser.add_argument('--top', type=int, default=20,
+                            help='number of combinations to show, best Sharpe ratio first')
+
+    def handle(self, *args, **options):
+        param_grid = dict(parse_param(param) for param in options['param'])
+        start_datetime = None
+        if options['start']:
+            start_datetime = datetime.strptime(options['start'], '%Y-%m-%d').replace(
+                tzinfo=timezone.utc)
+        df_prices, index_prices = backtest.get_backtest_data(options['tickers'] or None,
+                                                             start_datetime)
+        if df_prices.empty:
+            self.stdout.write('No prices stored')
+            return
+
+        start = time.perf_counter()
+        df_results = backtest.run_sweep(df_prices, index_prices, backtest.SIGNALS[options['signal']],
+                                        param_grid, options['cost'], options['max_weight'],
+                                        options['workers'])
+        elapsed = time.perf_counter() - start
+        df_results = df_results.sort_values('sharpe', ascending=False, na_position='last')
+        self.stdout.write(df_results.head(options['top']).to_string(index=False))
+        self.stdout.write(f'Backtested {len(df_results)} combinations over {df_prices.shape[1]} '
+                          f'tickers and {df_prices.shape[0]} days in {elapsed:.2f}s')
@@ -0,0 +1,49 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portfolio import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Time ingestion, history reads, indicators and rendering on seeded synthetic '
+            'market data in a throwaway database and write the results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=50)
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='seconds each fake quote and wiki request takes')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--sample', type=int, default=5,
+                            help='number of tickers the per-ticker steps run on')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--render', type=int, default=2,
+                            help='number of charts to render')
+        parser.add_argument('--output', help='JSON file to write, data/benchmarks/ by default')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+
+    def handle(self, *args, **options):
+        results = benchmarks.run_benchmarks(
+            num_tickers=options['tickers'], years=options['years'], latency=options['latency'],
+            seed=options['seed'], sample=options['sample'], repeat=options['repeat'],
+            render=options['render'])
+
+        filename = options['output']
+        if filename is None:
+            timestamp = results['meta']['timestamp'].replace(':', '')
+            filename = os.path.join(settings.BASE_DIR, 'data', 'benchmarks',
+                                    f'{timestamp}-{results["meta"]["commit"] or "nocommit"}.json')
+        benchmarks.write_results(results, filename)
+
+        for name, stats in results['results'].items():
+            self.stdout.write(f'{name:<28} {stats["count"]:>4} runs '
+                              f'mean {stats["mean_seconds"] * 1000:10.1f}ms '
+                              f'max {stats["max_seconds"] * 1000:10.1f}ms')
+        if options['compare']:
+            ratios = benchmarks.compare_results(benchmarks.read_results(options['compare']),
+                                                results)
+            for name, ratio in ratios.items():
+                self.stdout.write(f'{name:<28} {ratio:6.2f}x baseline')
+        self.stdout.write(f'Results written to {filename}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from assets.models import Asset
+from portfolio import incremental
+
+
+class Command(BaseCommand):
+    help = 'Fold newly stored prices into the persisted rolling indicator states'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*',
+                            help='tickers to update, all assets when omitted')
+        parser.add_argument('--verify', action='store_true',
+                            help='check the incremental values against a full recompute')
+
+    def handle(self, *args, **options):
+        tickers = options['tickers']
+        if not tickers:
+            tickers = Asset.objects.values_list('symbol', flat=True).distinct()
+        num_prices = 0
+        num_mismatches = 0
+        for ticker in tickers:
+            num_prices += len(incremental.update_incremental_indicators(ticker))
+            if options['verify']:
+                mismatches = incremental.verify_incremental_indicators(ticker)
+                for indicator, (incremental_value, full_value) in mismatches.items():
+                    self.stdout.write(f'{ticker} {indicator}: incremental {incremental_value} '
+                                      f'!= full {full_value}')
+                num_mismatches += len(mismatches)
+        self.stdout.write(f'Updated indicators with {num_prices} new prices')
+        if options['verify']:
+            self.stdout.write(f'{num_mismatches} mismatches found')
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('assets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indicator', models.CharField(max_length=16, verbose_name='Indicator')),
+                ('window', models.PositiveIntegerField(verbose_name='Window')),
+                ('last_datetime', models.DateTimeField(verbose_name='Last Date and Time')),
+                ('running_sum', models.FloatField(verbose_name='Running Sum')),
+                ('valid_count', models.PositiveIntegerField(verbose_name='Valid Count')),
+                ('tail', models.BinaryField(verbose_name='Window Tail')),
+                ('last_value', models.FloatField(blank=True, null=True, verbose_name='Last Value')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indicator_states', to='assets.asset')),
+            ],
+            options={
+                'verbose_name': 'Indicator State',
+                'verbose_name_plural': 'Indicator States',
+                'unique_together': {('asset', 'indicator')},
+            },
+        ),
+    ]
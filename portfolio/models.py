@@ -1,3 +1,26 @@
 from django.db import models
+from django.utils.translation import ugettext_lazy as _
 
 # Create your models here.
+
+class IndicatorState(models.Model):
+    """
+    Rolling window state of an indicator of an asset, so that new prices can
+    be folded in without recomputing the whole history
+    """
+    asset = models.ForeignKey('assets.Asset', related_name='indicator_states', on_delete=models.CASCADE)
+    indicator = models.CharField(_("Indicator"), max_length=16)
+    window = models.PositiveIntegerField(_("Window"))
+    last_datetime = models.DateTimeField(_("Last Date and Time"), auto_now=False, auto_now_add=False)
+    running_sum = models.FloatField(_("Running Sum"))
+    valid_count = models.PositiveIntegerField(_("Valid Count"))
+    tail = models.BinaryField(_("Window Tail"))
+    last_value = models.FloatField(_("Last Value"), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _("Indicator State")
+        verbose_name_plural = _("Indicator States")
+        unique_together = ['asset', 'indicator']
+
+    def __str__(self):
+        return f'{self.asset}: {self.indicator} at {self.last_datetime}'
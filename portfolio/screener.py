@@ -0,0 +1,206 @@
+import logging
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from assets import controller as co
+from assets.metrics import timed
+from assets.models import Asset
+
+from .indicator_engine import RSM_WINDOW, SMA_30W_WINDOW
+from . import indicator_engine
+from . import stages
+
+logger = logging.getLogger(__name__)
+
+# bars over which zero-line crossings of the RSM and the SMA slope are looked at
+CROSS_LOOKBACK = 5
+SLOPE_LOOKBACK = 5
+# trading days loaded for the screen: the longest window plus the lookbacks,
+# so that the last values match a calculation over the whole history
+SCREEN_BARS = (max(RSM_WINDOW, SMA_30W_WINDOW)
+               + max(CROSS_LOOKBACK, SLOPE_LOOKBACK, stages.SLOPE_LOOKBACK) + 1)
+# stocks whose last bar lags the newest one by more trading days than this
+# are taken as delisted and left out
+MAX_LAG_BARS = 10
+
+SCREEN_COLUMNS = ['symbol', 'security_name', 'gics_industry', 'market_symbol', 'datetime',
+                  'adj_close', 'sma_10w', 'sma_30w', 'price_vs_sma_30w', 'above_sma_30w',
+                  'sma_30w_slope', 'rsm', 'rsm_cross', 'stage']
+SORT_COLUMNS = ['symbol', 'adj_close', 'price_vs_sma_30w', 'sma_30w_slope', 'rsm', 'stage']
+
+_screen_cache = {'key': None, 'df': None}
+_screen_cache_lock = threading.Lock()
+
+
+def get_screen_start_datetime(last_datetime):
+    """
+    Calendar start of the last SCREEN_BARS trading days, with a margin for
+    holidays
+    """
+    return last_datetime - timedelta(days=int(SCREEN_BARS * 7 / 5) + 30)
+
+
+def get_current_last_datetimes(last_price_datetimes, symbols=None):
+    """
+    Last bar of each of the symbols (all by default), leaving out the ones
+    lagging the newest last bar by more than MAX_LAG_BARS trading days
+    """
+    if symbols is not None:
+        last_price_datetimes = {symbol: last_price_datetimes[symbol] for symbol in symbols
+                                if symbol in last_price_datetimes}
+    if not last_price_datetimes:
+        return {}
+    cutoff = max(last_price_datetimes.values()) - timedelta(days=int(MAX_LAG_BARS * 7 / 5))
+    return {symbol: last_datetime for symbol, last_datetime in last_price_datetimes.items()
+            if last_datetime >= cutoff}
+
+
+def get_last_positions(values):
+    """
+    Row position of the last non NaN value of each column, -1 for empty
+    columns
+    """
+    valid = ~np.isnan(values)
+    last_positions = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+    return np.where(valid.any(axis=0), last_positions, -1)
+
+
+def take(values, positions):
+    """
+    Value of each column at its row position, NaN for negative positions
+    """
+    result = values[np.clip(positions, 0, None), np.arange(values.shape[1])]
+    return np.where(positions >= 0, result, np.nan)
+
+
+def compute_screen(indicators):
+    """
+    Evaluate every ticker of the indicator frames at its last bar and
+    return one row per ticker
+    """
+    df_prices = indicators['adj_close']
+    if df_prices.empty:
+        return pd.DataFrame(columns=SCREEN_COLUMNS)
+    prices = df_prices.to_numpy()
+    sma_30w = indicators['sma_30w'].to_numpy()
+    rsm = indicators['rsm'].to_numpy()
+    last = get_last_positions(prices)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        last_sma_30w = take(sma_30w, last)
+        last_price = take(prices, last)
+        previous_sma_30w = take(sma_30w, np.where(last >= SLOPE_LOOKBACK,
+                                                  last - SLOPE_LOOKBACK, -1))
+        # sign of the RSM on each of the last CROSS_LOOKBACK + 1 bars
+        rsm_signs = np.stack([np.sign(take(rsm, np.where(last >= i, last - i, -1)))
+                              for i in range(CROSS_LOOKBACK, -1, -1)])
+        df_screen = pd.DataFrame({
+            'symbol': df_prices.columns,
+            'datetime': df_prices.index[np.clip(last, 0, None)],
+            'adj_close': last_price,
+            'sma_10w': take(indicators['sma_10w'].to_numpy(), last),
+            'sma_30w': last_sma_30w,
+            'price_vs_sma_30w': (last_price / last_sma_30w - 1) * 100,
+            'above_sma_30w': last_price > last_sma_30w,
+            'sma_30w_slope': (last_sma_30w / previous_sma_30w - 1) * 100,
+            'rsm': take(rsm, last),
+        })
+    stage = stages.compute_stages(indicators).to_numpy()
+    df_screen['stage'] = stage[np.clip(last, 0, None), np.arange(stage.shape[1])]
+    crossed_up = ((rsm_signs[:-1] <= 0) & (rsm_signs[1:] > 0)).any(axis=0)
+    crossed_down = ((rsm_signs[:-1] >= 0) & (rsm_signs[1:] < 0)).any(axis=0)
+    # the latest side of the zero line wins when it was crossed both ways
+    df_screen['rsm_cross'] = np.select(
+        [crossed_up & (rsm_signs[-1] > 0), crossed_down & (rsm_signs[-1] < 0)],
+        ['up', 'down'], '')
+    return df_screen[last >= 0].reset_index(drop=True)
+
+
+def get_universe_assets(universe=None):
+    """
+    Return the symbols and metadata of the stocks of a universe, given as
+    the symbol of its index. Index assets themselves are left out
+    """
+    assets = Asset.objects.all()
+    if universe:
+        assets = assets.filter(market_symbol=universe)
+    df_assets = pd.DataFrame.from_records(
+        assets.values_list('symbol', 'market_symbol', 'security_name', 'gics_industry'),
+        columns=['symbol', 'market_symbol', 'security_name', 'gics_industry'])
+    index_symbols = set(Asset.objects.values_list('market_symbol', flat=True))
+    return df_assets[~df_assets['symbol'].isin(index_symbols)].drop_duplicates('symbol')
+
+
+@timed('screen')
+def get_screen(universe=None):
+    """
+    Screen the current stocks of a universe in one batched pass over their
+    recent prices. The prices are loaded from SCREEN_BARS before the oldest
+    last bar of the stocks, so that stocks lagging behind by a few days get
+    full windows too. The result is cached until a price is stored or
+    revised for any asset
+    """
+    last_price_datetimes = co.get_last_price_datetimes()
+    key = (universe, tuple(sorted(last_price_datetimes.items())),
+           co.get_last_prices_revised_at())
+    with _screen_cache_lock:
+        if _screen_cache['key'] == key:
+            return _screen_cache['df']
+
+    df_assets = get_universe_assets(universe)
+    df_screen = pd.DataFrame(columns=SCREEN_COLUMNS)
+    last_datetimes = get_current_last_datetimes(last_price_datetimes, df_assets['symbol'])
+    if last_datetimes:
+        start_datetime = get_screen_start_datetime(min(last_datetimes.values()))
+        indicators = indicator_engine.compute_universe_indicators(
+            list(last_datetimes), start_datetime)
+        df_screen = compute_screen(indicators)
+        df_screen = df_screen.merge(df_assets, on='symbol', how='left')[SCREEN_COLUMNS]
+
+    with _screen_cache_lock:
+        _screen_cache['key'] = key
+        _screen_cache['df'] = df_screen
+    return df_screen
+
+
+def invalidate_screen_cache():
+    with _screen_cache_lock:
+        _screen_cache['key'] = None
+        _screen_cache['df'] = None
+
+
+def filter_screen(df_screen, min_rsm=None, max_rsm=None, rsm_cross=None, above_sma_30w=None,
+                  min_slope=None, max_slope=None, gics_industry=None, stage=None):
+    mask = pd.Series(True, index=df_screen.index)
+    if min_rsm is not None:
+        mask &= df_screen['rsm'] >= min_rsm
+    if max_rsm is not None:
+        mask &= df_screen['rsm'] <= max_rsm
+    if rsm_cross:
+        mask &= df_screen['rsm_cross'] == rsm_cross
+    if above_sma_30w is not None:
+        mask &= df_screen['above_sma_30w'] == above_sma_30w
+    if min_slope is not None:
+        mask &= df_screen['sma_30w_slope'] >= min_slope
+    if max_slope is not None:
+        mask &= df_screen['sma_30w_slope'] <= max_slope
+    if gics_industry:
+        mask &= df_screen['gics_industry'] == gics_industry
+    if stage is not None:
+        mask &= df_screen['stage'] == stage
+    return df_screen[mask]
+
+
+def sort_screen(df_screen, sort='-rsm'):
+    """
+    Sort on a SORT_COLUMNS column, descending when prefixed with '-'.
+    Missing values go last either way
+    """
+    column = sort.lstrip('-')
+    if column not in SORT_COLUMNS:
+        raise ValueError(f'Cannot sort on {column}')
+    return df_screen.sort_values([column, 'symbol'], ascending=[not sort.startswith('-'), True],
+                                 na_position='last', kind='mergesort')
@@ -0,0 +1,22 @@
+import logging
+
+from django.dispatch import receiver
+
+from assets.signals import asset_prices_saved
+
+from . import incremental
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(asset_prices_saved)
+def update_indicators_on_ingest(sender, ticker, revised=False, **kwargs):
+    try:
+        if revised:
+            # stored prices changed, the rolling states no longer apply
+            incremental.reset_incremental_indicators(ticker)
+            incremental.reset_index_member_indicators(ticker)
+        else:
+            incremental.update_incremental_indicators(ticker)
+    except Exception as e:
+        logger.error(f'Error {e} updating indicators of {ticker}')
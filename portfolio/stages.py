@@ -0,0 +1,94 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from assets.metrics import timed
+
+from . import indicator_engine
+
+logger = logging.getLogger(__name__)
+
+STAGE_UNKNOWN = 0
+STAGE_BASING = 1
+STAGE_ADVANCING = 2
+STAGE_TOPPING = 3
+STAGE_DECLINING = 4
+STAGE_NAMES = {
+    STAGE_UNKNOWN: 'unknown',
+    STAGE_BASING: 'basing',
+    STAGE_ADVANCING: 'advancing',
+    STAGE_TOPPING: 'topping',
+    STAGE_DECLINING: 'declining',
+}
+
+# the 30 week SMA slope is measured over 4 weeks of bars and counts as flat
+# while it moves less than FLAT_SLOPE percent over them
+SLOPE_LOOKBACK = 20
+FLAT_SLOPE = 1.0
+
+
+def get_sma_slope(sma_30w, lookback=SLOPE_LOOKBACK):
+    """
+    Percent change of the SMA over the last `lookback` rows, for every row
+    of a date x ticker array
+    """
+    slope = np.full(sma_30w.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope[lookback:] = (sma_30w[lookback:] / sma_30w[:-lookback] - 1) * 100
+    return slope
+
+
+def classify_stages(prices, sma_30w, rsm, lookback=SLOPE_LOOKBACK, flat_slope=FLAT_SLOPE):
+    """
+    Classify every bar of a date x ticker panel into Weinstein stages:
+
+    - advancing (2): rising 30 week SMA, price above it and positive Mansfield RS
+    - declining (4): falling 30 week SMA, price below it and negative Mansfield RS
+    - topping (3) and basing (1): anything in between, after an advance
+      and after a decline (or before any trend) respectively
+
+    Returns an int8 array of the stages, 0 where the inputs are missing
+    """
+    prices = np.asarray(prices, dtype='float64')
+    sma_30w = np.asarray(sma_30w, dtype='float64')
+    rsm = np.asarray(rsm, dtype='float64')
+    slope = get_sma_slope(sma_30w, lookback)
+    known = ~(np.isnan(prices) | np.isnan(sma_30w) | np.isnan(rsm) | np.isnan(slope))
+
+    advancing = known & (slope > flat_slope) & (prices > sma_30w) & (rsm > 0)
+    declining = known & (slope < -flat_slope) & (prices < sma_30w) & (rsm < 0)
+    # carry the direction of the last trend forward through the bars in between
+    trend = np.where(advancing, 1.0, np.where(declining, -1.0, np.nan))
+    last_trend = pd.DataFrame(trend).ffill().to_numpy()
+
+    stages = np.where(last_trend == 1, STAGE_TOPPING, STAGE_BASING).astype('int8')
+    stages[advancing] = STAGE_ADVANCING
+    stages[declining] = STAGE_DECLINING
+    stages[~known] = STAGE_UNKNOWN
+    return stages
+
+
+def compute_stages(indicators):
+    """
+    Stages of every bar of the indicator frames of
+    indicator_engine.compute_indicators, as a date x ticker frame
+    """
+    df_prices = indicators['adj_close']
+    stages = classify_stages(df_prices.to_numpy(), indicators['sma_30w'].to_numpy(),
+                             indicators['rsm'].to_numpy())
+    return pd.DataFrame(stages, index=df_prices.index, columns=df_prices.columns)
+
+
+@timed('universe_stages')
+def compute_universe_stages(tickers=None):
+    return compute_stages(indicator_engine.compute_universe_indicators(tickers))
+
+
+def get_stages_for_frame(df_data):
+    """
+    Stages of the rows of a single ticker frame of get_analytical_data
+    """
+    stages = classify_stages(df_data[['adj_close']].to_numpy(), df_data[['sma_30w']].to_numpy(),
+                             df_data[['rsm']].to_numpy())
+    return pd.Series(stages[:, 0], index=df_data.index, name='stage')
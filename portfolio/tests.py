@@ -1,3 +1,617 @@
-from django.test import TestCase
+import asyncio
+from io import StringIO
+from multiprocessing.shared_memory import SharedMemory
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import IndicatorState
+
+from assets import bars
+from assets import controller as co
+from assets import metrics
+from assets.asset_index import asset_index
+from assets.models import Asset, AssetPrice, AssetIndicator, IngestionJob
+from assets.frame_cache import price_frame_cache
+from assets.index_registry import index_series_registry, load_index_series
+from assets.synthetic import make_price_frame
+
+from . import backtest
+from . import benchmarks
+from . import breakouts
+from . import chart_cache
+from . import downsample
+from . import incremental
+from . import indicator_engine
+from . import screener
+from . import stages
+from . import utils
+from . import views
+
+
+class PriceDataMixin:
+    """
+    Stores synthetic prices for an index and a few stocks tracking it
+    """
+    tickers = ['AAA', 'BBB']
+    index_ticker = '^GSPC'
+    periods = 300
+
+    def setUp(self):
+        asset_index.invalidate()
+        price_frame_cache.invalidate()
+        utils.indicator_cache.invalidate()
+        index_series_registry.refresh()
+        for seed, ticker in enumerate([self.index_ticker] + self.tickers):
+            Asset.objects.create(symbol=ticker, security_name=ticker)
+            co.save_asset_prices_for_ticker(ticker, make_price_frame(periods=self.periods,
+                                                                     seed=seed))
+
+
+class PriceDataTestCase(PriceDataMixin, TestCase):
+    pass
+
+
+class IndexSeriesRegistryTest(PriceDataTestCase):
+
+    def test_index_is_loaded_once_and_refreshed_on_ingest(self):
+        loader = mock.Mock(side_effect=load_index_series)
+        with mock.patch.object(index_series_registry, 'loader', loader):
+            for ticker in self.tickers:
+                df_data = utils.calculate_analytical_data(ticker)
+            self.assertEqual(loader.call_count, 1)
+            self.assertFalse(df_data['adj_close_index'].isna().any())
+
+            co.save_asset_prices_for_ticker(
+                self.index_ticker, make_price_frame('2021-03-01', periods=5))
+            utils.calculate_analytical_data('AAA')
+            self.assertEqual(loader.call_count, 2)
+
+
+class AssetIndexUsageTest(PriceDataTestCase):
+
+    def test_ingestion_and_analytics_do_not_query_assets_per_ticker(self):
+        asset_index.get_asset_id(self.index_ticker)
+        with CaptureQueriesContext(connection) as queries:
+            for ticker in self.tickers:
+                co.save_asset_prices_for_ticker(ticker, make_price_frame('2021-03-01', periods=5))
+                utils.get_analytical_data(ticker)
+        asset_queries = [query['sql'] for query in queries
+                         if 'FROM "assets_asset"' in query['sql']]
+        self.assertEqual(asset_queries, [])
+
+
+class IndicatorEngineTest(PriceDataTestCase):
+
+    def test_matches_per_ticker_calculations(self):
+        indicators = indicator_engine.compute_universe_indicators()
+
+        self.assertEqual(sorted(indicators['rsm'].columns),
+                         sorted([self.index_ticker] + self.tickers))
+        for ticker in self.tickers:
+            df_expected = utils.get_analytical_data(ticker)
+            df_result = indicator_engine.get_indicators_for_ticker(indicators, ticker)
+            for column in ['sma_10w', 'sma_30w', 'adj_close_index', 'rsm']:
+                np.testing.assert_allclose(df_result[column].to_numpy(),
+                                           df_expected[column].to_numpy(),
+                                           rtol=1e-9)
+
+    def test_panel_has_indicator_and_ticker_columns(self):
+        panel = indicator_engine.to_panel(indicator_engine.compute_universe_indicators())
+        self.assertIn(('sma_30w', 'AAA'), panel.columns)
+
+
+class IncrementalIndicatorsTest(PriceDataTestCase):
+
+    def test_ingest_keeps_states_in_line_with_full_recompute(self):
+        for ticker in self.tickers:
+            self.assertEqual(incremental.verify_incremental_indicators(ticker), {})
+
+        co.save_asset_prices_for_ticker(
+            self.index_ticker, make_price_frame('2021-03-01', periods=5, seed=7))
+        co.save_asset_prices_for_ticker('AAA', make_price_frame('2021-03-01', periods=5, seed=8))
+
+        state = IndicatorState.objects.get(asset__symbol='AAA', indicator='rsm')
+        self.assertEqual(state.last_datetime,
+                         AssetPrice.objects.filter(asset__symbol='AAA').latest('datetime').datetime)
+        self.assertEqual(incremental.verify_incremental_indicators('AAA'), {})
+
+    def test_prices_are_held_back_until_the_index_catches_up(self):
+        co.save_asset_prices_for_ticker('AAA', make_price_frame('2021-03-01', periods=5))
+        self.assertEqual(len(incremental.update_incremental_indicators('AAA')), 0)
+
+        co.save_asset_prices_for_ticker(
+            self.index_ticker, make_price_frame('2021-03-01', periods=5))
+        self.assertEqual(len(incremental.update_incremental_indicators('AAA')), 5)
+        self.assertEqual(incremental.verify_incremental_indicators('AAA'), {})
+
+    def test_revised_index_prices_reset_the_member_indicators(self):
+        df_revised = make_price_frame(periods=self.periods, seed=0).iloc[-3:] * 1.1
+        co.save_asset_prices_for_ticker(self.index_ticker, df_revised, update_changed=True)
+        for ticker in self.tickers:
+            self.assertEqual(incremental.verify_incremental_indicators(ticker), {})
+
+
+class MaterializedIndicatorsTest(PriceDataTestCase):
+
+    def test_ingest_fills_indicator_table(self):
+        for ticker in self.tickers:
+            self.assertEqual(AssetIndicator.objects.filter(asset__symbol=ticker).count(),
+                             AssetPrice.objects.filter(asset__symbol=ticker).count())
+
+    def test_analytical_data_is_read_from_indicator_table(self):
+        df_expected = utils.calculate_analytical_data('AAA')
+        with mock.patch.object(utils, 'calculate_analytical_data') as calculate:
+            df_result = utils.get_analytical_data('AAA')
+        calculate.assert_not_called()
+        self.assertEqual(list(df_result.columns), list(df_expected.columns))
+        np.testing.assert_allclose(df_result['rsm'].to_numpy(),
+                                   df_expected['rsm'].to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(df_result['adj_close_index'].to_numpy(),
+                                   df_expected['adj_close_index'].to_numpy(), rtol=1e-9)
+
+    def test_stored_indicators_are_cached_until_rewritten(self):
+        df_first = utils.get_stored_indicators('AAA')
+        with self.assertNumQueries(1):
+            pd.testing.assert_frame_equal(utils.get_stored_indicators('AAA'), df_first)
+        co.save_asset_prices_for_ticker(
+            self.index_ticker, make_price_frame('2021-03-01', periods=5))
+        co.save_asset_prices_for_ticker('AAA', make_price_frame('2021-03-01', periods=5, seed=8))
+        self.assertEqual(len(utils.get_stored_indicators('AAA')), len(df_first) + 5)
+
+    def test_backfill_rebuilds_indicator_rows(self):
+        AssetIndicator.objects.all().delete()
+        call_command('backfill_indicators', stdout=StringIO())
+        self.assertEqual(AssetIndicator.objects.filter(asset__symbol='AAA').count(),
+                         AssetPrice.objects.filter(asset__symbol='AAA').count())
+
+
+class ChartCacheTest(PriceDataTestCase):
+
+    def setUp(self):
+        super().setUp()
+        chart_cache.chart_cache.invalidate()
+
+    def test_repeat_requests_skip_rendering_and_get_304(self):
+        with mock.patch.object(utils, 'get_full_plot', return_value='png') as get_full_plot:
+            response = self.client.get('/portfolio/', {'ticker': 'AAA'})
+            self.client.get('/portfolio/', {'ticker': 'AAA'})
+            self.assertEqual(get_full_plot.call_count, 1)
+
+            response = self.client.get('/portfolio/', {'ticker': 'AAA'},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+            co.save_asset_prices_for_ticker('AAA', make_price_frame('2021-03-01', periods=2))
+            response = self.client.get('/portfolio/', {'ticker': 'AAA'},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_full_plot.call_count, 2)
+
+            df_revised = make_price_frame(periods=self.periods, seed=0).iloc[-3:] * 1.1
+            co.save_asset_prices_for_ticker(self.index_ticker, df_revised, update_changed=True)
+            response = self.client.get('/portfolio/', {'ticker': 'AAA'},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_full_plot.call_count, 3)
+
+    def test_evicts_to_stay_within_size(self):
+        cache = chart_cache.ChartCache(max_bytes=10)
+        cache.put('a', 'x' * 6)
+        cache.put('b', 'x' * 6)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 'x' * 6)
+
+
+class ChartDataTest(PriceDataTestCase):
+
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        y = np.sin(np.linspace(0, 20, 5000))
+        y[2500] = 5
+        indices = downsample.lttb_indices(np.arange(5000), y, 200)
+        self.assertEqual(len(indices), 200)
+        self.assertEqual((indices[0], indices[-1]), (0, 4999))
+        self.assertIn(2500, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_endpoint_returns_downsampled_columns(self):
+        response = self.client.get('/portfolio/chart_data/AAA', {'points': 50})
+        self.assertEqual(response.status_code, 200)
+        columns = response.json()['columns']
+        self.assertEqual(len(columns['datetime']), 50)
+        self.assertEqual(set(columns), {'datetime', 'adj_close', 'sma_10w',
+                                         'sma_30w', 'volume', 'rsm'})
+
+        response = self.client.get('/portfolio/chart_data/AAA', {'method': 'minmax', 'points': 20})
+        self.assertLessEqual(len(response.json()['columns']['adj_close']), 20)
+
+        response = self.client.get('/portfolio/chart_data/AAA', {'method': 'spline'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_tickers_are_not_found(self):
+        Asset.objects.create(symbol='NOP', security_name='No prices')
+        for ticker in ['ZZZ', 'NOP']:
+            for params in [{}, {'timeframe': 'W'}, {'timeframe': 'M'}]:
+                response = self.client.get(f'/portfolio/chart_data/{ticker}', params)
+                self.assertEqual(response.status_code, 404)
+            self.assertEqual(self.client.get('/portfolio/', {'ticker': ticker}).status_code, 404)
+
+
+class BenchmarkTest(TestCase):
+
+    def test_suite_runs_on_synthetic_data(self):
+        results = benchmarks.run_benchmarks(num_tickers=3, years=1, sample=2, repeat=1,
+                                            render=0, isolated_db=False)
+        self.assertEqual(results['params']['rows'], 4 * 252)
+        ingestion_stats = results['results']['price_ingestion']
+        self.assertEqual((ingestion_stats['tickers'], ingestion_stats['records']), (4, 4 * 252))
+        self.assertEqual(results['results']['price_ingestion_concurrent']['failures'], 0)
+        self.assertEqual(results['results']['indicators']['count'], 2)
+        self.assertEqual(set(benchmarks.compare_results(results, results).values()), {1.0})
+
+
+class MetricsTest(PriceDataTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+
+    def test_view_stages_are_timed_and_exposed(self):
+        response = self.client.get('/portfolio/chart_data/AAA', {'points': 50})
+        self.assertIn('chart_data;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+        text = self.client.get('/assets/metrics').content.decode()
+        self.assertIn('pystockbot_stage_seconds_count{stage="analytical_data"} 1', text)
+        self.assertIn('pystockbot_view_stage_seconds_bucket{stage="chart_data",'
+                      'view="chart_data",le="+Inf"} 1', text)
+        self.assertIn('pystockbot_requests_total{status="200",view="chart_data"} 1',
+                      text)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_metrics_record_nothing(self):
+        response = self.client.get('/portfolio/chart_data/AAA', {'points': 50})
+        self.assertFalse(response.has_header('Server-Timing'))
+        utils.get_analytical_data('AAA')
+        self.assertEqual(metrics.registry.histograms, {})
+        self.assertEqual(self.client.get('/assets/metrics').status_code, 404)
+
+
+class ScreenerTest(PriceDataTestCase):
+    tickers = ['AAA', 'BBB', 'CCC']
+    periods = 800
+
+    def setUp(self):
+        super().setUp()
+        screener.invalidate_screen_cache()
+
+    def test_screen_matches_full_history_calculations(self):
+        df_screen = screener.get_screen().set_index('symbol')
+        self.assertEqual(sorted(df_screen.index), self.tickers)
+        for ticker in self.tickers:
+            df_expected = utils.get_analytical_data(ticker)
+            row = df_screen.loc[ticker]
+            self.assertAlmostEqual(row['rsm'], df_expected['rsm'].iloc[-1])
+            self.assertAlmostEqual(row['sma_30w'], df_expected['sma_30w'].iloc[-1])
+            self.assertEqual(row['above_sma_30w'],
+                             df_expected['adj_close'].iloc[-1] > df_expected['sma_30w'].iloc[-1])
+            self.assertAlmostEqual(row['sma_30w_slope'], (
+                df_expected['sma_30w'].iloc[-1] / df_expected['sma_30w'].iloc[-6] - 1) * 100)
+
+    def test_revised_prices_are_screened_again(self):
+        screener.get_screen()
+        last_price = AssetPrice.objects.filter(asset__symbol='AAA').latest('datetime')
+        AssetPrice.objects.filter(pk=last_price.pk).update(adj_close=1000.0)
+        Asset.objects.filter(symbol='AAA').update(prices_revised_at=timezone.now())
+        price_frame_cache.invalidate()
+        utils.indicator_cache.invalidate()
+        row = screener.get_screen().set_index('symbol').loc['AAA']
+        self.assertEqual(row['adj_close'], 1000.0)
+
+    def test_lagging_tickers_are_screened_over_full_windows(self):
+        # DDD is three days behind the others
+        Asset.objects.create(symbol='DDD', security_name='DDD')
+        co.save_asset_prices_for_ticker('DDD', make_price_frame(periods=self.periods - 3,
+                                                                seed=9))
+        row = screener.get_screen().set_index('symbol').loc['DDD']
+        df_expected = utils.get_analytical_data('DDD')
+        self.assertEqual(row['datetime'], df_expected.index[-1])
+        self.assertAlmostEqual(row['rsm'], df_expected['rsm'].iloc[-1])
+        self.assertAlmostEqual(row['sma_30w'], df_expected['sma_30w'].iloc[-1])
+
+    def test_delisted_tickers_are_left_out(self):
+        # EEE stopped trading 400 days before the others
+        Asset.objects.create(symbol='EEE', security_name='EEE')
+        co.save_asset_prices_for_ticker('EEE', make_price_frame(periods=self.periods - 400,
+                                                                seed=9))
+        with mock.patch.object(indicator_engine, 'compute_universe_indicators',
+                               wraps=indicator_engine.compute_universe_indicators) as compute:
+            df_screen = screener.get_screen()
+        self.assertEqual(sorted(df_screen['symbol']), self.tickers)
+        # the window is not pulled back to the last bar of EEE
+        tickers, start_datetime = compute.call_args[0]
+        self.assertEqual(sorted(tickers), self.tickers)
+        self.assertEqual(start_datetime, screener.get_screen_start_datetime(
+            co.get_last_price_datetimes()['AAA']))
+
+    def test_rsm_zero_line_crossings(self):
+        rsm = np.array([[-1.0, 1.0, np.nan], [-2.0, 2.0, 1.0], [-1.0, 3.0, -1.0],
+                        [-1.0, 3.0, -2.0], [-1.0, 3.0, -2.0], [-1.0, 3.0, -2.0], [0.5, 3.0, -2.0]])
+        columns = ['UP', 'ABOVE', 'DOWN']
+        frame = pd.DataFrame(rsm, index=pd.bdate_range('2021-01-04', periods=7), columns=columns)
+        indicators = {name: frame for name in ['adj_close', 'sma_10w', 'sma_30w', 'rsm']}
+        df_screen = screener.compute_screen(indicators).set_index('symbol')
+        self.assertEqual(df_screen['rsm_cross'].to_dict(), {'UP': 'up', 'ABOVE': '', 'DOWN': 'down'})
+
+    def test_endpoint_filters_sorts_and_pages(self):
+        response = self.client.get('/portfolio/screener', {'sort': 'symbol', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['count'], response.json()['num_pages']), (3, 2))
+        self.assertEqual([row['symbol'] for row in response.json()['results']], ['AAA', 'BBB'])
+
+        df_screen = screener.get_screen()
+        response = self.client.get('/portfolio/screener', {'min_rsm': df_screen['rsm'].median()})
+        rsm = [row['rsm'] for row in response.json()['results']]
+        self.assertEqual(len(rsm), 2)
+        self.assertEqual(rsm, sorted(rsm, reverse=True))
+
+        response = self.client.get('/portfolio/screener', {'sort': 'volume'})
+        self.assertEqual(response.status_code, 400)
+
+
+class StageClassificationTest(PriceDataTestCase):
+    periods = 500
+
+    def test_stages_follow_the_trend_of_the_30_week_sma(self):
+        days = 120
+        rising = np.linspace(100, 200, days)
+        prices = np.concatenate([rising, rising[::-1], np.full(days, 100.0)])[:, None]
+        sma_30w = pd.DataFrame(prices).rolling(60, min_periods=1).mean().to_numpy()
+        rsm = np.sign(prices - sma_30w)
+
+        result = stages.classify_stages(prices, sma_30w, rsm)[:, 0]
+        self.assertEqual(result[0], stages.STAGE_UNKNOWN)
+        self.assertEqual(result[days - 1], stages.STAGE_ADVANCING)
+        self.assertEqual(result[days + 30], stages.STAGE_TOPPING)
+        self.assertEqual(result[2 * days - 1], stages.STAGE_DECLINING)
+        self.assertEqual(result[-1], stages.STAGE_BASING)
+
+    def test_universe_stages_match_single_ticker_stages(self):
+        df_stages = stages.compute_universe_stages()
+        for ticker in self.tickers:
+            df_data = utils.get_analytical_data(ticker)
+            expected = stages.get_stages_for_frame(df_data)
+            np.testing.assert_array_equal(df_stages[ticker].loc[df_data.index].to_numpy(),
+                                          expected.to_numpy())
+        self.assertTrue(set(np.unique(df_stages.to_numpy())) <= set(stages.STAGE_NAMES))
+
+
+class BreakoutTest(PriceDataTestCase):
+
+    def test_sliding_extremes_match_pandas_rolling(self):
+        values = np.random.default_rng(0).normal(size=(100, 3)).cumsum(axis=0)
+        values[[0, 10, 11, 50], [0, 1, 1, 2]] = np.nan
+        values[:30, 2] = np.nan
+        df_values = pd.DataFrame(values)
+        for window in [1, 2, 7, 21, 99, 100, 150]:
+            np.testing.assert_allclose(breakouts.sliding_max(values, window),
+                                       df_values.rolling(window, min_periods=1).max())
+            np.testing.assert_allclose(breakouts.sliding_min(values, window),
+                                       df_values.rolling(window, min_periods=1).min())
+
+    def test_breakouts_need_a_full_window_above_the_prior_high(self):
+        prices = np.array([5.0, 1.0, 2.0, 3.0, 2.0, 4.0, 0.5, 1.0])[:, None]
+        result = breakouts.detect_breakouts(prices, {'3': 3})['3']
+        self.assertEqual(result['breakout'][:, 0].tolist(),
+                         [False, False, False, False, False, True, False, False])
+        self.assertEqual(result['breakdown'][:, 0].tolist(),
+                         [False, False, False, False, False, False, True, False])
+        self.assertEqual(result['high'][5, 0], 3.0)
+        self.assertTrue(result['new_high'][0, 0])
+
+    def test_alerts_match_single_ticker_history(self):
+        df_alerts = breakouts.get_breakout_alerts(days=self.periods)
+        self.assertTrue((df_alerts['window'] != '36M').all())
+        for ticker in self.tickers:
+            prices = co.get_price_matrix([ticker])[ticker]
+            prior_high = prices.rolling(21).max().shift()
+            expected = prices.index[prices > prior_high]
+            alerts = df_alerts[(df_alerts['symbol'] == ticker) & (df_alerts['window'] == '1M')
+                               & (df_alerts['kind'] == 'breakout')]
+            self.assertEqual(sorted(alerts['datetime']), list(expected))
+
+        response = self.client.get('/portfolio/breakouts',
+                                   {'days': 5, 'window': ['1M', '3M'], 'kind': 'breakout'})
+        self.assertEqual(response.status_code, 200)
+        for alert in response.json()['results']:
+            self.assertGreater(alert['adj_close'], alert['level'])
+            self.assertIn(alert['window'], ['1M', '3M'])
+        response = self.client.get('/portfolio/breakouts', {'window': '6M'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lagging_tickers_get_alerts_over_their_own_last_bars(self):
+        # DDD is five days behind the others, EEE stopped trading 100 days before
+        for ticker, lag, seed in [('DDD', 5, 6), ('EEE', 100, 7)]:
+            Asset.objects.create(symbol=ticker, security_name=ticker)
+            co.save_asset_prices_for_ticker(ticker, make_price_frame(periods=self.periods - lag,
+                                                                     seed=seed))
+        windows = {'3M': 63}
+        df_alerts = breakouts.get_breakout_alerts(['AAA', 'DDD', 'EEE'], days=30,
+                                                  windows=windows)
+        self.assertNotIn('EEE', df_alerts['symbol'].tolist())
+        for ticker in ['AAA', 'DDD']:
+            prices = co.get_price_matrix([ticker])[ticker]
+            prior_high = prices.rolling(63).max().shift()
+            expected = prices.index[-30:][(prices > prior_high).iloc[-30:]]
+            alerts = df_alerts[(df_alerts['symbol'] == ticker) & (df_alerts['kind'] == 'breakout')]
+            self.assertEqual(sorted(alerts['datetime']), list(expected))
+
+
+class BacktestTest(PriceDataTestCase):
+    tickers = ['AAA', 'BBB', 'CCC']
+
+    def test_positions_earn_the_returns_from_the_next_bar(self):
+        prices = np.array([[10.0, 20.0], [11.0, 20.0], [11.0, 10.0], [22.0, 10.0]])
+        positions = np.array([[1, 1], [1, 0], [0, 0], [0, 0]])
+        returns, turnover, weights = backtest.simulate(prices, positions, cost=0.01)
+        np.testing.assert_allclose(weights, [[0.5, 0.5], [1, 0], [0, 0], [0, 0]])
+        np.testing.assert_allclose(turnover, [1, 1, 1, 0])
+        np.testing.assert_allclose(returns, [-0.01, 0.05 - 0.01, 0 - 0.01, 0])
+
+        stats = backtest.get_stats(returns, turnover, weights)
+        self.assertEqual(stats['trades'], 2)
+        self.assertAlmostEqual(stats['total_return'], 0.99 * 1.04 * 0.99 - 1)
+        self.assertAlmostEqual(stats['max_drawdown'], 0.99 * 1.04 * 0.99 / (0.99 * 1.04) - 1)
+
+    def test_weights_are_capped_with_the_rest_in_cash(self):
+        weights = backtest.get_weights(np.array([[1, 0, 0], [1, 1, 1]]), max_weight=0.4)
+        np.testing.assert_allclose(weights, [[0.4, 0, 0], [1 / 3, 1 / 3, 1 / 3]])
+
+    def test_parallel_sweep_matches_single_backtests(self):
+        df_prices, index_prices = backtest.get_backtest_data()
+        param_grid = {'fast': [5, 20], 'slow': [50, 100]}
+        df_results = backtest.run_sweep(df_prices, index_prices, backtest.sma_crossover_signal,
+                                        param_grid, workers=2)
+        self.assertEqual(len(df_results), 4)
+        for row in df_results.to_dict('records'):
+            result = backtest.run_backtest(df_prices, index_prices, backtest.sma_crossover_signal,
+                                           fast=row['fast'], slow=row['slow'])
+            for name, value in result['stats'].items():
+                self.assertAlmostEqual(row[name], value)
+        pd.testing.assert_frame_equal(
+            df_results, backtest.run_sweep(df_prices, index_prices,
+                                           backtest.sma_crossover_signal, param_grid, workers=1))
+
+    def test_index_gaps_are_carried_forward_for_the_signal(self):
+        df_prices, index_prices = backtest.get_backtest_data()
+        gapped_index_prices = index_prices.copy()
+        gapped_index_prices[260:265] = np.nan
+        filled_index_prices = backtest.prepare_prices(gapped_index_prices)
+
+        gapped = backtest.run_backtest(df_prices, gapped_index_prices, backtest.rsm_signal,
+                                       window=50)
+        filled = backtest.run_backtest(df_prices, filled_index_prices, backtest.rsm_signal,
+                                       window=50)
+        self.assertEqual(gapped['stats'], filled['stats'])
+        pd.testing.assert_frame_equal(
+            backtest.run_sweep(df_prices, gapped_index_prices, backtest.rsm_signal,
+                               {'window': [50]}, workers=1),
+            backtest.run_sweep(df_prices, filled_index_prices, backtest.rsm_signal,
+                               {'window': [50]}, workers=1))
+
+    def test_worker_attachments_leave_the_shared_memory_to_the_parent(self):
+        buffer = SharedMemory(create=True, size=8 * 6)
+        self.addCleanup(buffer.unlink)
+        self.addCleanup(buffer.close)
+        with mock.patch.object(backtest.resource_tracker, 'register') as register, \
+                mock.patch.object(backtest, 'Finalize'):
+            backtest.init_sweep_worker({'prices': (buffer.name, (2, 3))})
+        register.assert_not_called()
+        self.assertEqual(backtest._worker_arrays['prices'].shape, (2, 3))
+        backtest.close_worker_buffers()
+        self.assertEqual((backtest._worker_arrays, backtest._worker_buffers), ({}, []))
+
+    def test_command_prints_best_combinations(self):
+        out = StringIO()
+        call_command('run_backtest', 'rsm', '--param', 'threshold=-5,0,5', '--param', 'window=50',
+                     '--workers', '1', stdout=out)
+        self.assertIn('Backtested 3 combinations over 3 tickers', out.getvalue())
+
+
+class BarIndicatorTest(PriceDataTestCase):
+
+    def test_weekly_indicators_use_week_windows(self):
+        df_weekly = utils.get_bar_analytical_data('AAA', 'W')
+        df_daily = utils.get_analytical_data('AAA')
+        self.assertEqual(df_weekly.index[-1], df_daily.index[-1])
+        self.assertLess(len(df_weekly), len(df_daily) / 4)
+        self.assertAlmostEqual(df_weekly['sma_10w'].iloc[-1],
+                               df_weekly['adj_close'].iloc[-10:].mean())
+        df_index = bars.get_bars(self.index_ticker, 'W')
+        rsd = df_weekly['adj_close'] / df_index['adj_close'].to_numpy() * 100
+        self.assertAlmostEqual(df_weekly['rsm'].iloc[-1],
+                               (rsd.iloc[-1] / rsd.iloc[-52:].mean() - 1) * 100)
+        self.assertEqual(utils.get_bar_window(utils.SMA_30W_WEEKS, 'M'), 7)
+
+    def test_chart_data_endpoint_serves_bars(self):
+        response = self.client.get('/portfolio/chart_data/AAA', {'timeframe': 'W'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['columns']['datetime']),
+                         len(bars.get_bars('AAA', 'W')))
+        response = self.client.get('/portfolio/chart_data/AAA', {'timeframe': 'Y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTest(PriceDataMixin, TransactionTestCase):
+    """
+    The async views read the DB from executor threads, which only see
+    committed data
+    """
+
+    def setUp(self):
+        super().setUp()
+        chart_cache.chart_cache.invalidate()
+
+    def test_home_renders_and_answers_conditional_requests(self):
+        response = self.client.get('/portfolio/async/', {'ticker': 'AAA'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'data:image/png;base64', response.content)
+        self.assertIn('analytical_data;dur=', response['Server-Timing'])
+
+        response = self.client.get('/portfolio/async/', {'ticker': 'AAA'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_chart_data_matches_the_sync_view(self):
+        for params in [{'points': 50}, {'points': 50, 'timeframe': 'W'}]:
+            response = self.client.get('/portfolio/async/chart_data/AAA', params)
+            self.assertEqual(response.json(),
+                             self.client.get('/portfolio/chart_data/AAA', params).json())
+        response = self.client.get('/portfolio/async/chart_data/AAA', {'method': 'spline'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_tickers_are_not_found(self):
+        response = self.client.get('/portfolio/async/', {'ticker': 'ZZZ'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/portfolio/async/chart_data/ZZZ', {'timeframe': 'W'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_concurrent_requests_over_asgi(self):
+        async def get_chart_data():
+            client = AsyncClient()
+            return await asyncio.gather(*[
+                client.get(f'/portfolio/async/chart_data/{ticker}', {'points': 50})
+                for ticker in self.tickers * 2])
+
+        responses = async_to_sync(get_chart_data)()
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        self.assertEqual([response.json()['ticker'] for response in responses],
+                         self.tickers * 2)
+        self.assertIn('chart_data;dur=', responses[0]['Server-Timing'])
+
+    def test_charts_page_renders_tickers_in_parallel(self):
+        response = self.client.get('/portfolio/charts', {'tickers': 'AAA,BBB,ZZZ'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'data:image/png;base64'), 2)
+        self.assertIn(b'No chart available for ZZZ', response.content)
+        self.assertEqual(chart_cache.chart_cache.get_stats()['entries'], 2)
+
+        response = self.client.get('/portfolio/charts', {'tickers': ','.join(['AAA'] * 13)})
+        self.assertEqual(response.status_code, 200)
+        tickers = ','.join(f'T{i}' for i in range(views.MAX_CHART_TICKERS + 1))
+        self.assertEqual(self.client.get('/portfolio/charts', {'tickers': tickers}).status_code,
+                         400)
+
+    def test_job_status(self):
+        job = IngestionJob.objects.create(kind=IngestionJob.KIND_PRICES)
+        response = self.client.get(f'/assets/async/jobs/{job.pk}')
+        self.assertEqual(response.json()['status'], IngestionJob.STATUS_QUEUED)
+        self.assertEqual(self.client.get(f'/assets/async/jobs/{job.pk + 1}').status_code, 404)
@@ -3,5 +3,11 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path("", views.get_portfolio_home, name="portfolio_home")
+    path("", views.get_portfolio_home, name="portfolio_home"),
+    path("chart_data/<str:ticker>", views.get_chart_data, name="chart_data"),
+    path("screener", views.get_screener, name="screener"),
+    path("breakouts", views.get_breakouts, name="breakouts"),
+    path("async/", views.get_portfolio_home_async, name="portfolio_home_async"),
+    path("async/chart_data/<str:ticker>", views.get_chart_data_async, name="chart_data_async"),
+    path("charts", views.get_portfolio_charts, name="portfolio_charts"),
 ]
@@ -1,30 +1,212 @@
+import asyncio
 import logging
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 from datetime import datetime, timezone, timedelta
 from django_pandas.io import read_frame
 import matplotlib.pyplot as plt
 import base64
+import numpy as np
 from io import BytesIO
 
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+
+from assets import bars
 from assets import controller as co
+from assets.asset_index import asset_index
+from assets.frame_cache import get_frame_size
+from assets.lru_cache import SizedLRUCache
+from assets.models import AssetIndicator
+from assets.index_registry import index_series_registry
+from assets.executor import run_in_executor
+from assets.metrics import timed, timer
+
+from .downsample import downsample_indices
+from .models import IndicatorState
+from . import breakouts
+from . import stages
 
 logger = logging.getLogger(__name__)
 
+CHART_DATA_COLUMNS = ['adj_close', 'sma_10w', 'sma_30w', 'volume', 'rsm']
+# materialized in AssetIndicator
+INDICATOR_COLUMNS = ['sma_10w', 'sma_30w', 'rsd', 'rsm']
+DEFAULT_INDICATOR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# indicator windows in weeks, for the weekly and monthly bars
+SMA_10W_WEEKS = 10
+SMA_30W_WEEKS = 30
+RSM_WEEKS = 52
 
+
+@timed('analytical_data')
 def get_analytical_data(ticker):
-    df_asset_prices = pd.DataFrame()
-    df_asset_prices = co.get_data_for_ticker(ticker, dataset='all')
+    """
+    Get the prices of the ticker with their indicators, read from the
+    materialized AssetIndicator rows when they cover every price and
+    recomputed otherwise
+    """
+    df_asset_prices = co.get_data_for_ticker(ticker, dataset='existing')
+    df_indicators = get_stored_indicators(ticker)
+    return combine_analytical_data(ticker, df_asset_prices, df_indicators)
+
+
+async def get_analytical_data_async(ticker):
+    """
+    get_analytical_data for async views. The prices and the stored
+    indicators of the ticker are loaded concurrently in the shared executor
+    """
+    with timer('analytical_data'):
+        df_asset_prices, df_indicators = await asyncio.gather(
+            run_in_executor(co.get_data_for_ticker, ticker, dataset='existing'),
+            run_in_executor(get_stored_indicators, ticker))
+        return await run_in_executor(combine_analytical_data, ticker, df_asset_prices,
+                                     df_indicators)
+
+
+def combine_analytical_data(ticker, df_asset_prices, df_indicators):
+    """
+    Add the stored indicators of the ticker to its prices, or recompute
+    them when they do not cover every price
+    """
+    if df_indicators.empty or not df_indicators.index.equals(df_asset_prices.index):
+        return calculate_analytical_data(ticker, df_asset_prices)
+
+    df_asset_prices['sma_10w'] = df_indicators['sma_10w']
+    df_asset_prices['sma_30w'] = df_indicators['sma_30w']
+    # the stored Dorsey RS is the price over the index price, no need to
+    # load the index
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df_asset_prices['adj_close_index'] = (df_asset_prices['adj_close']
+                                              / df_indicators['rsd'] * 100)
+    df_asset_prices['rsm'] = df_indicators['rsm']
+    return df_asset_prices
+
+
+def fetch_indicator_rows(asset_id):
+    """
+    Run the indicator query on a raw cursor, like co.fetch_price_rows, and
+    return its (datetime, sma_10w, sma_30w, rsd, rsm) rows
+    """
+    quote = connection.ops.quote_name
+    table = quote(AssetIndicator._meta.db_table)
+    selected_datetime = quote('datetime')
+    if connection.vendor == 'sqlite':
+        # parsed at once by pandas, see co.fetch_price_rows
+        selected_datetime = f'CAST({selected_datetime} AS TEXT)'
+    selected = ', '.join([selected_datetime] + [quote(column) for column in INDICATOR_COLUMNS])
+    query = (f'SELECT {selected} FROM {table} WHERE {quote("asset_id")} = %s '
+             f'ORDER BY {quote("datetime")}')
+    with connection.cursor() as cursor:
+        cursor.execute(query, [asset_id])
+        return cursor.fetchall()
+
+
+class IndicatorCache(SizedLRUCache):
+    """
+    LRU cache of the materialized indicators of each ticker with the
+    version of the indicator states they were read at
+    """
+
+    def __init__(self, max_bytes=DEFAULT_INDICATOR_CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+
+    def get_size(self, value):
+        return get_frame_size(value[0])
+
+
+indicator_cache = IndicatorCache(
+    getattr(settings, 'INDICATOR_CACHE_MAX_BYTES', DEFAULT_INDICATOR_CACHE_MAX_BYTES))
+
+
+def get_indicator_version(asset_id):
+    """
+    The indicator states of an asset are recreated, with new ids, in the
+    transaction that writes its AssetIndicator rows, so their largest id
+    changes whenever the rows do
+    """
+    return (IndicatorState.objects
+            .filter(asset_id=asset_id)
+            .aggregate(version=Max('id'))['version'])
+
+
+def read_stored_indicators(asset_id):
+    rows = fetch_indicator_rows(asset_id)
+    if not rows:
+        return pd.DataFrame(columns=INDICATOR_COLUMNS, dtype='float64')
+    dates, *values = zip(*rows)
+    index = pd.DatetimeIndex(pd.to_datetime(dates, utc=True), name='datetime')
+    return pd.DataFrame({column: np.asarray(column_values, dtype='float64')
+                         for column, column_values in zip(INDICATOR_COLUMNS, values)},
+                        index=index)
+
+
+@timed('db_indicators')
+def get_stored_indicators(ticker):
+    """
+    Read the materialized indicators of the ticker, served from the
+    indicator cache until they are rewritten
+    """
+    asset_id = asset_index.get_asset_id(ticker)
+    version = get_indicator_version(asset_id)
+    cached = indicator_cache.get(ticker, lambda value: value[1] == version)
+    if cached is not None:
+        return cached[0].copy()
+    df_result = read_stored_indicators(asset_id)
+    indicator_cache.put(ticker, (df_result, version))
+    return df_result.copy()
+
+
+@timed('indicators_compute')
+def calculate_analytical_data(ticker, df_asset_prices=None):
+    if df_asset_prices is None:
+        df_asset_prices = co.get_data_for_ticker(ticker, dataset='existing')
     df_asset_prices['sma_10w'] = calculate_SMA(df_asset_prices['adj_close'], 70)
     df_asset_prices['sma_30w'] = calculate_SMA(df_asset_prices['adj_close'], 210)
-    df_asset_prices['adj_close_index'] = get_index_ticker_prices(ticker)
+    df_asset_prices['adj_close_index'] = get_index_ticker_prices(
+        ticker, df_asset_prices.index)
     series_mansfield = calculate_mansfield_relative_strength(
         df_asset_prices['adj_close'], df_asset_prices['adj_close_index'])
     df_asset_prices['rsm'] = series_mansfield
     return df_asset_prices
 
 
+def get_bar_window(weeks, timeframe):
+    """
+    Number of bars of the timeframe covering the given number of weeks
+    """
+    return max(1, round(weeks / bars.TIMEFRAME_WEEKS[timeframe]))
+
+
+@timed('indicators_bars')
+def get_bar_analytical_data(ticker, timeframe):
+    """
+    Get the weekly or monthly bars of the ticker with their indicators,
+    computed on the bars themselves so that the 10 and 30 week SMAs and
+    the 52 week Mansfield RS span whole weeks
+    """
+    df_bars = bars.get_bars(ticker, timeframe)
+    index_prices = pd.Series(dtype='float')
+    try:
+        df_index_bars = bars.get_bars(co.get_index_ticker(ticker), timeframe)
+        index_prices = df_index_bars.set_index('period_start')['adj_close']
+    except Exception as e:
+        logger.error(f'Exception {e} occured when getting index bars')
+    df_bars['sma_10w'] = calculate_SMA(df_bars['adj_close'],
+                                       get_bar_window(SMA_10W_WEEKS, timeframe))
+    df_bars['sma_30w'] = calculate_SMA(df_bars['adj_close'],
+                                       get_bar_window(SMA_30W_WEEKS, timeframe))
+    df_bars['adj_close_index'] = index_prices.reindex(df_bars['period_start']).to_numpy()
+    series_rsd = calculate_dorsey_relative_strength(df_bars['adj_close'], df_bars['adj_close_index'])
+    rsm_window = get_bar_window(RSM_WEEKS, timeframe)
+    df_bars['rsm'] = (series_rsd / series_rsd.rolling(window=rsm_window, min_periods=1).mean()
+                      - 1) * 100
+    return df_bars
+
+
 def calculate_SMA(series, tenor):
     result = pd.Series()
     try:
@@ -35,16 +217,22 @@ def calculate_SMA(series, tenor):
     return result.astype('float')
 
 
-def get_index_ticker_prices(ticker):
-    result = pd.Series()
+def get_index_ticker_prices(ticker, dates=None):
+    """
+    Get the adjusted close of the index of the ticker from the shared index
+    registry, aligned to the given dates when provided
+    """
+    result = pd.Series(dtype='float')
     index_ticker = co.get_index_ticker(ticker)
-    df_index_prices = co.get_data_for_ticker(index_ticker)
     try:
-        result = df_index_prices['adj_close']
+        if dates is None:
+            result = index_series_registry.get_series(index_ticker)
+        else:
+            result = index_series_registry.get_aligned(index_ticker, dates)
     except Exception as e:
         logger.error(f'Exception {e} occured when getting index prices')
 
-    return result.astype('float')
+    return result
 
 
 def calculate_dorsey_relative_strength(series, index_series):
@@ -71,9 +259,12 @@ def calculate_mansfield_relative_strength(series, index_series):
     return result.astype('float')
 
 
-def get_graph():
+def get_graph(fig=None):
     buffer = BytesIO()
-    plt.savefig(buffer, format='png')
+    if fig is None:
+        plt.savefig(buffer, format='png')
+    else:
+        fig.savefig(buffer, format='png')
     buffer.seek(0)
     image_png = buffer.getvalue()
     graph = base64.b64encode(image_png)
@@ -94,12 +285,14 @@ def get_plot(x, y):
     return graph
 
 
+@timed('chart_render')
 def get_full_plot(df_data):
-    plt.switch_backend('AGG')
-    # plt.figure(figsize=(10,5))
-    # %matplotlib widget
-    fig, (ax1, ax2, ax3) = plt.subplots(3, sharex=True)
-    fig.set_size_inches(15, 12)
+    """
+    Render the technical analysis chart as a base64 PNG. The figure is
+    built with the object oriented API rather than pyplot, so charts can
+    be rendered in several threads at once
+    """
+    fig = Figure(figsize=(15, 12))
     start_date = df_data.index.min()
     end_date = df_data.index.max()
     fig.suptitle(
@@ -109,24 +302,25 @@ def get_full_plot(df_data):
     num_rows_ax1 = 5
     num_rows_ax2 = 2
     num_rows_ax3 = 2
-    ax1 = plt.subplot2grid((num_rows, num_cols), (0, 0),
-                           rowspan=num_rows_ax1, colspan=1)
-    ax2 = plt.subplot2grid((num_rows, num_cols), (5, 0),
-                           rowspan=num_rows_ax2, colspan=1, sharex=ax1)
-    ax3 = plt.subplot2grid((num_rows, num_cols), (7, 0),
-                           rowspan=num_rows_ax3, colspan=1, sharex=ax1)
+    grid = fig.add_gridspec(num_rows, num_cols)
+    ax1 = fig.add_subplot(grid[0:num_rows_ax1, 0])
+    ax2 = fig.add_subplot(grid[5:5 + num_rows_ax2, 0], sharex=ax1)
+    ax3 = fig.add_subplot(grid[7:7 + num_rows_ax3, 0], sharex=ax1)
 
     # Main share price chart
     ax1.plot(df_data['adj_close'], label='Adj Close')
     ax1.plot(df_data['sma_10w'], label='SMA - 10 week')
     ax1.plot(df_data['sma_30w'], label='SMA - 30 week')
 
-    # ax1.plot(df_filtered[df_filtered['Price History 001M']]['{} Adj Close'.format(ticker)], 'c^', label='Local Maxima 1 M')
-    # ax1.plot(df_filtered[df_filtered['Price History 036M']]['{} Adj Close'.format(ticker)], 'b^', label='Local Maxima 36 M')
+    new_highs = breakouts.get_new_highs_for_frame(df_data)
+    ax1.plot(df_data['adj_close'][new_highs['1M']], 'c^', label='Local Maxima 1 M')
+    ax1.plot(df_data['adj_close'][new_highs['36M']], 'b^', label='Local Maxima 36 M')
 
-    # ax1.plot(df_filtered[df_filtered['Stage Trend 30W'] == 1]['SMA 30W'], 'g^')
-    # ax1.plot(df_filtered[df_filtered['Stage Trend 30W'] == -1]['SMA 30W'], 'rv')
-    # ax1.plot(df_filtered[df_filtered['Stage Trend 30W'] == 0]['SMA 30W'], 'ys')
+    stage = stages.get_stages_for_frame(df_data)
+    ax1.plot(df_data['sma_30w'][stage == stages.STAGE_ADVANCING], 'g^', markersize=3)
+    ax1.plot(df_data['sma_30w'][stage == stages.STAGE_DECLINING], 'rv', markersize=3)
+    ax1.plot(df_data['sma_30w'][stage.isin([stages.STAGE_BASING, stages.STAGE_TOPPING])],
+             'ys', markersize=3)
 
     ax1.set_title = 'Adj Close Price History'
     ax1.set_ylabel('Adj. Close Price in USD ($)')
@@ -146,8 +340,23 @@ def get_full_plot(df_data):
     ax3.legend(loc='upper left')
     ax3.set_ylabel('Mansfield RS')
 
-    # plt.show()
-
-    plt.tight_layout()
-    graph = get_graph()
+    fig.tight_layout()
+    graph = get_graph(fig)
     return graph
+
+
+@timed('chart_data')
+def get_chart_data(df_data, points=1000, method='lttb'):
+    """
+    Downsample the analytical data to about `points` rows, keeping the shape
+    of the adjusted close, and return it as columns of plain lists with the
+    datetimes as epoch milliseconds
+    """
+    timestamps = df_data.index.asi8 // 10**6
+    indices = downsample_indices(timestamps, df_data['adj_close'].to_numpy(dtype='float64'),
+                                 points, method)
+    chart_data = {'datetime': timestamps[indices].tolist()}
+    for column in CHART_DATA_COLUMNS:
+        values = df_data[column].to_numpy(dtype='float64')[indices]
+        chart_data[column] = np.where(np.isnan(values), None, np.round(values, 4)).tolist()
+    return chart_data
@@ -1,19 +1,296 @@
+import asyncio
+import functools
+import logging
+from calendar import timegm
+
+from django.core.paginator import Paginator, InvalidPage
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.template import loader
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
 
 import pandas as pd
 
+from assets.asset_index import asset_index
+from assets.executor import run_in_executor
+from assets.models import Asset
+
 from . import utils
+from . import chart_cache
+from . import screener
+from . import breakouts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICKER = 'AAPL'
+DEFAULT_CHART_POINTS = 1000
+MAX_CHART_POINTS = 10000
+DOWNSAMPLING_METHODS = ['lttb', 'minmax', 'none']
+# daily prices or the weekly and monthly bars
+CHART_TIMEFRAMES = ['D', 'W', 'M']
+DEFAULT_SCREENER_PAGE_SIZE = 50
+MAX_SCREENER_PAGE_SIZE = 500
+MAX_BREAKOUT_DAYS = 60
+MAX_CHART_TICKERS = 12
+
+
+def get_chart_key_or_404(ticker, spec=chart_cache.FULL_PLOT_SPEC):
+    """
+    Chart key of the ticker, raising Http404 for unknown tickers and
+    tickers without prices. The conditional GET checks run it before the
+    views, so it guards them as well
+    """
+    try:
+        asset_index.get_asset_id(ticker)
+    except Asset.DoesNotExist:
+        raise Http404(f'Unknown ticker {ticker}')
+    key = chart_cache.get_chart_key(ticker, spec)
+    if key[1] is None:
+        raise Http404(f'No prices stored for {ticker}')
+    return key
+
+
+def get_request_chart_key(request):
+    """
+    Compute the chart key once per request, it is used by the conditional
+    GET checks and by the view itself
+    """
+    if not hasattr(request, 'chart_key'):
+        ticker = request.GET.get('ticker', DEFAULT_TICKER)
+        request.chart_key = get_chart_key_or_404(ticker)
+    return request.chart_key
+
+
+def portfolio_home_etag(request):
+    return chart_cache.get_chart_etag(get_request_chart_key(request))
+
+
+def portfolio_home_last_modified(request):
+    return chart_cache.get_chart_last_modified(get_request_chart_key(request))
+
 
 # Create your views here.
+@condition(etag_func=portfolio_home_etag, last_modified_func=portfolio_home_last_modified)
 def get_portfolio_home(request):
     template = loader.get_template("portfolio_home.html")
     context = {}
 
-    asset_prices = utils.get_analytical_data('AAPL')
-    # x = [x for x in asset_prices.index]
-    # y = [y for y in asset_prices['adj_close']]
-    chart = utils.get_full_plot(asset_prices)
+    key = get_request_chart_key(request)
+    chart = chart_cache.get_full_chart(key[0], key)
     context['chart'] = chart
-    return HttpResponse(template.render(context, request))
\ No newline at end of file
+    return HttpResponse(template.render(context, request))
+
+
+def get_chart_data_params(request):
+    points = int(request.GET.get('points', DEFAULT_CHART_POINTS))
+    method = request.GET.get('method', 'lttb')
+    timeframe = request.GET.get('timeframe', 'D')
+    if not 3 <= points <= MAX_CHART_POINTS or method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f'invalid points {points} or method {method}')
+    if timeframe not in CHART_TIMEFRAMES:
+        raise ValueError(f'invalid timeframe {timeframe}')
+    return points, method, timeframe
+
+
+def get_request_chart_data_key(request, ticker):
+    if not hasattr(request, 'chart_key'):
+        try:
+            points, method, timeframe = get_chart_data_params(request)
+        except ValueError:
+            points, method, timeframe = None, None, None
+        request.chart_key = get_chart_key_or_404(ticker, f'data-{points}-{method}-{timeframe}')
+    return request.chart_key
+
+
+def chart_data_etag(request, ticker):
+    return chart_cache.get_chart_etag(get_request_chart_data_key(request, ticker))
+
+
+def chart_data_last_modified(request, ticker):
+    return chart_cache.get_chart_last_modified(get_request_chart_data_key(request, ticker))
+
+
+@condition(etag_func=chart_data_etag, last_modified_func=chart_data_last_modified)
+def get_chart_data(request, ticker):
+    try:
+        points, method, timeframe = get_chart_data_params(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    if timeframe == 'D':
+        df_data = utils.get_analytical_data(ticker)
+    else:
+        df_data = utils.get_bar_analytical_data(ticker, timeframe)
+    return JsonResponse({
+        'ticker': ticker,
+        'method': method,
+        'points': points,
+        'timeframe': timeframe,
+        'columns': utils.get_chart_data(df_data, points, method),
+    })
+
+
+def get_float_param(request, name):
+    value = request.GET.get(name)
+    return None if value in (None, '') else float(value)
+
+
+def get_screener_filters(request):
+    above_sma_30w = request.GET.get('above_sma_30w')
+    rsm_cross = request.GET.get('rsm_cross')
+    if rsm_cross not in (None, '', 'up', 'down'):
+        raise ValueError(f'invalid rsm_cross {rsm_cross}')
+    return {
+        'min_rsm': get_float_param(request, 'min_rsm'),
+        'max_rsm': get_float_param(request, 'max_rsm'),
+        'rsm_cross': rsm_cross,
+        'above_sma_30w': None if above_sma_30w in (None, '') else above_sma_30w in ('1', 'true'),
+        'min_slope': get_float_param(request, 'min_slope'),
+        'max_slope': get_float_param(request, 'max_slope'),
+        'gics_industry': request.GET.get('gics_industry'),
+        'stage': None if request.GET.get('stage') in (None, '') else int(request.GET['stage']),
+    }
+
+
+def get_screener(request):
+    """
+    Screen the stocks of a universe on Mansfield RS and trend filters,
+    returning one page of the sorted matches
+    """
+    try:
+        filters = get_screener_filters(request)
+        page_size = int(request.GET.get('page_size', DEFAULT_SCREENER_PAGE_SIZE))
+        if not 1 <= page_size <= MAX_SCREENER_PAGE_SIZE:
+            raise ValueError(f'invalid page_size {page_size}')
+        df_screen = screener.get_screen(request.GET.get('universe'))
+        df_screen = screener.filter_screen(df_screen, **filters)
+        df_screen = screener.sort_screen(df_screen, request.GET.get('sort', '-rsm'))
+        df_screen = df_screen.astype(object).where(df_screen.notna(), None)
+        paginator = Paginator(df_screen.to_dict('records'), page_size)
+        page = paginator.page(request.GET.get('page', 1))
+    except (ValueError, InvalidPage) as e:
+        return HttpResponseBadRequest(str(e))
+
+    return JsonResponse({
+        'count': paginator.count,
+        'num_pages': paginator.num_pages,
+        'page': page.number,
+        'results': page.object_list,
+    })
+
+
+def get_breakouts(request):
+    """
+    Tickers which closed above their prior 1, 3, 12 or 36 month high, or
+    below the low, over the last `days` bars
+    """
+    try:
+        days = int(request.GET.get('days', 1))
+        if not 1 <= days <= MAX_BREAKOUT_DAYS:
+            raise ValueError(f'invalid days {days}')
+        windows = request.GET.getlist('window') or list(breakouts.BREAKOUT_WINDOWS)
+        unknown = set(windows) - set(breakouts.BREAKOUT_WINDOWS)
+        if unknown:
+            raise ValueError(f'invalid window {", ".join(sorted(unknown))}')
+        kind = request.GET.get('kind')
+        if kind not in (None, '', 'breakout', 'breakdown'):
+            raise ValueError(f'invalid kind {kind}')
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    tickers = request.GET.getlist('ticker') or None
+    df_alerts = breakouts.get_breakout_alerts(
+        tickers, days, {window: breakouts.BREAKOUT_WINDOWS[window] for window in windows})
+    if kind:
+        df_alerts = df_alerts[df_alerts['kind'] == kind]
+    df_alerts = df_alerts.astype(object).where(df_alerts.notna(), None)
+    return JsonResponse({
+        'count': len(df_alerts),
+        'results': df_alerts.to_dict('records'),
+    })
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    django.views.decorators.http.condition for async views, which the
+    Django version in use only supports on sync views. The ETag and last
+    modified functions run in the shared executor
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def inner(request, *args, **kwargs):
+            def get_conditions():
+                etag = etag_func(request, *args, **kwargs) if etag_func else None
+                last_modified = (last_modified_func(request, *args, **kwargs)
+                                 if last_modified_func else None)
+                return (quote_etag(etag) if etag is not None else None,
+                        timegm(last_modified.utctimetuple()) if last_modified else None)
+
+            etag, last_modified = await run_in_executor(get_conditions)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+@async_condition(etag_func=portfolio_home_etag, last_modified_func=portfolio_home_last_modified)
+async def get_portfolio_home_async(request):
+    """
+    get_portfolio_home for ASGI, loading the stock and index prices
+    concurrently and rendering off the event loop
+    """
+    key = get_request_chart_key(request)
+    chart = await chart_cache.get_full_chart_async(key[0], key)
+    template = loader.get_template("portfolio_home.html")
+    return HttpResponse(await run_in_executor(template.render, {'chart': chart}, request))
+
+
+@async_condition(etag_func=chart_data_etag, last_modified_func=chart_data_last_modified)
+async def get_chart_data_async(request, ticker):
+    try:
+        points, method, timeframe = get_chart_data_params(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    if timeframe == 'D':
+        df_data = await utils.get_analytical_data_async(ticker)
+    else:
+        df_data = await run_in_executor(utils.get_bar_analytical_data, ticker, timeframe)
+    return JsonResponse({
+        'ticker': ticker,
+        'method': method,
+        'points': points,
+        'timeframe': timeframe,
+        'columns': await run_in_executor(utils.get_chart_data, df_data, points, method),
+    })
+
+
+async def get_portfolio_charts(request):
+    """
+    Chart several tickers, given as a comma separated `tickers` parameter,
+    loading and rendering them in parallel
+    """
+    tickers = request.GET.get('tickers', DEFAULT_TICKER).split(',')
+    tickers = list(dict.fromkeys(ticker for ticker in tickers if ticker))
+    if not 1 <= len(tickers) <= MAX_CHART_TICKERS:
+        return HttpResponseBadRequest(f'between 1 and {MAX_CHART_TICKERS} tickers are charted')
+
+    graphs = await asyncio.gather(*[chart_cache.get_full_chart_async(ticker) for ticker in tickers],
+                                  return_exceptions=True)
+    charts = []
+    for ticker, graph in zip(tickers, graphs):
+        if isinstance(graph, Exception):
+            logger.error(f'Error {graph} charting {ticker}')
+            graph = None
+        charts.append({'ticker': ticker, 'graph': graph})
+    template = loader.get_template("portfolio_charts.html")
+    return HttpResponse(await run_in_executor(template.render, {'charts': charts}, request))
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'assets.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,6 +97,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # seconds a connection waits for a lock before "database is locked"
+            'timeout': 30,
+        },
     }
 }
 
@@ -165,6 +170,64 @@ LOGGING = {
     },
 }
 
+# Price ingestion
+# Number of worker threads fetching quotes and the maximum number of
+# requests per second made to each quote source
+INGESTION_MAX_WORKERS = int(os.getenv('PYSTOCKBOT_INGESTION_MAX_WORKERS', 8))
+INGESTION_RATE_LIMITS = {
+    'yahoo': 5,
+}
+# Update stored prices whose OHLCV changed when they are downloaded again
+PRICE_UPSERT_UPDATE_CHANGED = False
+
+# Columnar price store
+# Memory mapped copy of the price history of each ticker used as a read tier
+# in front of the DB. Rebuild it with `manage.py sync_price_store`
+PRICE_STORE_ENABLED = bool(os.getenv('PYSTOCKBOT_PRICE_STORE', False))
+PRICE_STORE_DIR = os.path.join(BASE_DIR, 'data', 'price_store')
+
+# Weekly ('W') and monthly ('M') bars rebuilt from the daily prices on
+# ingestion. Backfill them with `manage.py build_bars`
+BAR_TIMEFRAMES = ['W', 'M']
+
+# In-process LRU cache of per-ticker price frames
+PRICE_FRAME_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# LRU cache of rendered charts
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# LRU cache of the materialized indicators read by the views
+INDICATOR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# S&P 500 constituents are downloaded at most once per SP500_INFO_TTL seconds
+SP500_INFO_FILE = os.path.join(BASE_DIR, 'data', 'sp500_constituents.csv')
+SP500_INFO_TTL = 24 * 60 * 60
+# seconds the wiki download waits to connect and for each read
+SP500_WIKI_TIMEOUT = 10
+
+# A running ingestion job without a progress heartbeat for this many
+# seconds is failed, so that a killed worker does not block its kind
+INGESTION_JOB_LEASE_SECONDS = 15 * 60
+
+# SQLite tuning applied to every connection, see assets/db.py. WAL lets
+# readers run while the ingestion writer commits
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 30000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Stage timings and request metrics, served in the Prometheus text format
+# at /assets/metrics. Set PYSTOCKBOT_METRICS=0 to turn them off
+METRICS_ENABLED = os.getenv('PYSTOCKBOT_METRICS', '1') != '0'
+
+# Threads the async views run DB reads, pandas and chart rendering on, per
+# worker process. CPU count + 4 when unset
+ASYNC_EXECUTOR_MAX_WORKERS = int(os.getenv('PYSTOCKBOT_ASYNC_EXECUTOR_MAX_WORKERS', 0)) or None
+
 ######### The following section should be at the end of this file #########
 dev_env = False
 if (os.environ.get('PYSTOCKBOT_DEV', False)):